@@ -9,8 +9,29 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from asgiref.sync import sync_to_async
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "composearch.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from search.browser import shutdown_browser_pool  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Serves HTTP requests with Django and handles the ASGI lifespan protocol,
+    which Django does not support, to close the browser pool when the worker shuts down.
+    """
+    if scope["type"] != "lifespan":
+        return await django_application(scope, receive, send)
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await sync_to_async(shutdown_browser_pool, thread_sensitive=False)()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
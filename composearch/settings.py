@@ -45,14 +45,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
-    "django.middleware.cache.UpdateCacheMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "django.middleware.cache.FetchFromCacheMiddleware",
 ]
 
 ROOT_URLCONF = "composearch.urls"
@@ -74,6 +72,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "composearch.wsgi.application"
+ASGI_APPLICATION = "composearch.asgi.application"
 
 
 # Database
@@ -188,18 +187,38 @@ LOGGING = {
         "handlers": ["console"],
         "level": log_level,
     },
+    "loggers": {
+        # Logs every request of the HTTP fetch tier at INFO level
+        "httpx": {
+            "level": "WARNING",
+        },
+    },
 }
 
 if PRODUCTION:
-    CACHES = {
-        "default": {
-            "BACKEND": "django.core.cache.backends.redis.RedisCache",
-            "LOCATION": config("REDIS_URL"),
-        },
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": config("REDIS_URL"),
     }
 else:
-    CACHES = {
-        "default": {
-            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        },
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
+
+# The cached search results are also kept in memory by each worker process for a few seconds,
+# and dropped from all of them when they change, through Redis pub/sub in production
+CACHES = {
+    "default": {
+        "BACKEND": "search.tiered_cache.TieredCache",
+        "LOCATION": "composearch",
+        "OPTIONS": {
+            "REMOTE": "shared",
+            # Seconds a value stays in the in-process tier, 0 disables it
+            "LOCAL_TIMEOUT": config("LOCAL_CACHE_TIMEOUT", cast=float, default=5),
+            "MAX_ENTRIES": config("LOCAL_CACHE_MAX_ENTRIES", cast=int, default=10_000),
+            "MAX_BYTES": config("LOCAL_CACHE_MAX_BYTES", cast=int, default=64 * 1024 * 1024),
+            "INVALIDATION_URL": config("REDIS_URL") if PRODUCTION else "",
+        },
+    },
+    "shared": SHARED_CACHE,
+}
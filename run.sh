@@ -4,4 +4,4 @@ python3 manage.py collectstatic --noinput
 python3 manage.py migrate
 python3 manage.py flush --no-input
 python3 manage.py loaddata distributors.json
-gunicorn composearch.wsgi --timeout 60 --workers 3
\ No newline at end of file
+gunicorn composearch.asgi:application --worker-class uvicorn.workers.UvicornWorker --timeout 60 --workers 3
\ No newline at end of file
@@ -1,16 +1,56 @@
 from django.contrib import admin
 
 from search import models
+from search.circuit_breaker import ADAPTIVE_TIMEOUT_PERCENTILE, circuit_state, latency_percentile, record_success
+from search.distributors import invalidate_distributors
 
 
 class DistributorAdmin(admin.ModelAdmin):
-    actions = ["activate", "deactivate"]
+    actions = ["activate", "deactivate", "close_circuit"]
+    list_display = ["__str__", "fetch_strategy", "circuit", "http_latency", "goto_latency", "wait_for_latency"]
 
+    # Bulk updates send no signals, so the actions invalidate the distributor snapshots themselves
     def activate(self, request, queryset):
         queryset.update(active=True)
+        invalidate_distributors()
 
     def deactivate(self, request, queryset):
         queryset.update(active=False)
+        invalidate_distributors()
+
+    @admin.action(description="Close circuit of selected distributors")
+    def close_circuit(self, request, queryset):
+        for distributor in queryset:
+            record_success(distributor)
+
+    @admin.display(description="Circuit")
+    def circuit(self, distributor):
+        return circuit_state(distributor).value
+
+    def latency(self, distributor, stage):
+        percentile = latency_percentile(distributor, stage)
+        return "-" if percentile is None else f"{percentile:.2f} s"
+
+    @admin.display(description=f"HTTP p{ADAPTIVE_TIMEOUT_PERCENTILE}")
+    def http_latency(self, distributor):
+        return self.latency(distributor, "http")
+
+    @admin.display(description=f"Page load p{ADAPTIVE_TIMEOUT_PERCENTILE}")
+    def goto_latency(self, distributor):
+        return self.latency(distributor, "goto")
+
+    @admin.display(description=f"Price selector p{ADAPTIVE_TIMEOUT_PERCENTILE}")
+    def wait_for_latency(self, distributor):
+        return self.latency(distributor, "wait_for")
 
 
 admin.site.register(models.DistributorSourceModel, DistributorAdmin)
+
+
+class QueryLogAdmin(admin.ModelAdmin):
+    list_display = ["query", "count", "last_searched"]
+    ordering = ["-count"]
+    search_fields = ["query"]
+
+
+admin.site.register(models.QueryLogModel, QueryLogAdmin)
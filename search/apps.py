@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class SearchConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "search"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from search.distributors import invalidate_distributors
+        from search.models import DistributorSourceModel
+        from search.tracing import configure_tracing
+
+        post_save.connect(invalidate_distributors, sender=DistributorSourceModel)
+        post_delete.connect(invalidate_distributors, sender=DistributorSourceModel)
+        configure_tracing()
@@ -0,0 +1,385 @@
+"""Process-wide pool of warm Chromium browsers"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import httpx
+from decouple import config
+from opentelemetry import context as trace_context
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
+
+from search.http_client import create_http_client
+from search.metrics import BROWSER_CONTEXT_SECONDS
+from search.scheduler import Scheduler
+from search.tracing import run_in_context, tracer
+
+BROWSER_POOL_SIZE = config("BROWSER_POOL_SIZE", cast=int, default=2)
+BROWSER_CONTEXTS_PER_BROWSER = config("BROWSER_CONTEXTS_PER_BROWSER", cast=int, default=8)
+BROWSER_MAX_PAGES = config("BROWSER_MAX_PAGES", cast=int, default=200)
+BROWSER_HEALTH_INTERVAL = config("BROWSER_HEALTH_INTERVAL", cast=float, default=30)
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class PooledBrowser:
+    """A running browser together with its bookkeeping inside the pool."""
+
+    browser: Browser
+    pages: int = 0
+    in_use: int = 0
+    retired: bool = False
+    idle_contexts: list[BrowserContext] = field(default_factory=list)
+
+
+class BrowserPool:
+    """
+    Keeps a bounded number of Chromium browsers running on a dedicated event loop thread.
+
+    Searches borrow recycled browser contexts from the pool instead of launching a browser each time.
+    A browser is replaced when it crashes, fails a health check or has served `max_pages` pages.
+    The pool also owns the shared HTTP client and the fetch Scheduler, which live on the same event loop.
+    """
+
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        contexts_per_browser: int = BROWSER_CONTEXTS_PER_BROWSER,
+        max_pages: int = BROWSER_MAX_PAGES,
+        health_interval: float = BROWSER_HEALTH_INTERVAL,
+        launcher: Callable[[], Awaitable[Browser]] | None = None,
+        http_client_factory: Callable[[], httpx.AsyncClient] = create_http_client,
+        scheduler: Scheduler | None = None,
+    ) -> None:
+        self.size = size
+        self.contexts_per_browser = contexts_per_browser
+        self.max_pages = max_pages
+        self.health_interval = health_interval
+        self.scheduler = scheduler or Scheduler()
+        self._launcher = launcher
+        self._http_client_factory = http_client_factory
+        self._http_client: httpx.AsyncClient | None = None
+        self._playwright: Playwright | None = None
+        self._browsers: list[PooledBrowser] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._slots: asyncio.Semaphore | None = None
+        self._launch_lock: asyncio.Lock | None = None
+        self._health_task: asyncio.Task | None = None
+        self._background: set[concurrent.futures.Future] = set()
+
+    @property
+    def browsers(self) -> list[PooledBrowser]:
+        return list(self._browsers)
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    def start(self) -> None:
+        """
+        Starts the pool event loop thread, if it is not running yet.
+        Browsers are launched lazily, on the first borrowed context.
+        """
+        # Checked before taking the lock, as coroutines on the pool loop spawn further coroutines,
+        # and must not block the loop while shutdown holds the lock and waits for it
+        if self.running:
+            return
+        with self._start_lock:
+            if self.running:
+                return
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run_loop, args=(loop, started), name="browser-pool", daemon=True
+            )
+            self._thread.start()
+            started.wait()
+            self._loop = loop
+            asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+
+    def _run_loop(self, loop: asyncio.AbstractEventLoop, started: threading.Event) -> None:
+        asyncio.set_event_loop(loop)
+        loop.call_soon(started.set)
+        loop.run_forever()
+        loop.close()
+
+    async def _setup(self) -> None:
+        self._slots = asyncio.Semaphore(self.size * self.contexts_per_browser)
+        self._launch_lock = asyncio.Lock()
+        if self.health_interval:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def submit(self, func: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Takes a coroutine function and its arguments.
+
+        Runs the coroutine on the pool event loop and returns its result to the calling event loop.
+        """
+        return await asyncio.wrap_future(self._run_coroutine(func, *args))
+
+    def spawn(self, func: Callable[..., Awaitable[Any]], *args: Any) -> concurrent.futures.Future:
+        """
+        Takes a coroutine function and its arguments.
+
+        Runs the coroutine on the pool event loop in the background, so that it outlives the calling
+        event loop. Returns a Future of its result.
+        """
+        future = self._run_coroutine(func, *args)
+        self._background.add(future)
+        future.add_done_callback(self._background.discard)
+        return future
+
+    def _run_coroutine(self, func: Callable[..., Awaitable[Any]], *args: Any) -> concurrent.futures.Future:
+        self.start()
+        # Runs the coroutine in an empty context, so that context variables of the calling request,
+        # such as the thread sensitive executor of asgiref, do not leak into the pool event loop.
+        # Only the trace context is carried over, so that spans on the pool loop nest under the caller's.
+        coroutine = run_in_context(trace_context.get_current(), func, *args)
+        return contextvars.Context().run(asyncio.run_coroutine_threadsafe, coroutine, self._loop)
+
+    async def with_context(self, func: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Takes a coroutine function and its arguments.
+
+        Borrows a browser context from the pool and calls `func(context, *args)` with it.
+        Returns the result of the call.
+        """
+
+        async def borrow():
+            async with self.context() as context:
+                return await func(context, *args)
+
+        return await self.submit(borrow)
+
+    async def with_http_client(self, func: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Takes a coroutine function and its arguments.
+
+        Calls `func(client, *args)` with the shared HTTP client of the pool.
+        Returns the result of the call.
+        """
+
+        async def borrow():
+            if self._http_client is None:
+                self._http_client = self._http_client_factory()
+            return await func(self._http_client, *args)
+
+        return await self.submit(borrow)
+
+    @asynccontextmanager
+    async def context(self) -> AsyncIterator[BrowserContext]:
+        """
+        Borrows a browser context from the pool. Must be used on the pool event loop.
+
+        The context is returned to the pool afterwards, unless an exception was raised while using it.
+        The time to borrow it, including the wait for a free slot, is recorded by source: idle or new.
+        """
+        start_time = time.monotonic()
+        async with self._slots:
+            with tracer.start_as_current_span("browser.context") as span:
+                pooled = await self._acquire_browser()
+                pooled.in_use += 1
+                try:
+                    if pooled.idle_contexts:
+                        context, source = pooled.idle_contexts.pop(), "idle"
+                    else:
+                        context, source = await pooled.browser.new_context(), "new"
+                except Exception:
+                    pooled.in_use -= 1
+                    raise
+                span.set_attribute("browser.context.source", source)
+            BROWSER_CONTEXT_SECONDS.labels(source=source).observe(time.monotonic() - start_time)
+
+            reusable = False
+            try:
+                yield context
+                reusable = True
+            finally:
+                pooled.in_use -= 1
+                pooled.pages += 1
+                await self._release(pooled, context, reusable)
+
+    async def _acquire_browser(self) -> PooledBrowser:
+        """
+        Returns the least loaded healthy browser, launching a new one if none has a free context slot.
+        """
+        async with self._launch_lock:
+            candidates = [
+                pooled
+                for pooled in self._browsers
+                if pooled.in_use < self.contexts_per_browser and pooled.browser.is_connected()
+            ]
+            if candidates:
+                return min(candidates, key=lambda pooled: pooled.in_use)
+            pooled = PooledBrowser(browser=await self._launch())
+            pooled.browser.on("disconnected", lambda _: self._retire(pooled, reason="disconnected"))
+            self._browsers.append(pooled)
+            log.debug(f"Launched browser, {len(self._browsers)} in pool")
+            return pooled
+
+    async def _launch(self) -> Browser:
+        with tracer.start_as_current_span("browser.launch"):
+            if self._launcher:
+                return await self._launcher()
+            try:
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                return await self._playwright.chromium.launch()
+            except Exception as ex:
+                # The playwright driver itself may have died, restart it once
+                log.debug(f"Error launching browser, restarting playwright: {ex}")
+                await self._stop_playwright()
+                self._playwright = await async_playwright().start()
+                return await self._playwright.chromium.launch()
+
+    async def _release(self, pooled: PooledBrowser, context: BrowserContext, reusable: bool) -> None:
+        if pooled.pages >= self.max_pages:
+            self._retire(pooled, reason=f"served {pooled.pages} pages")
+
+        if reusable and not pooled.retired and pooled.browser.is_connected():
+            try:
+                for page in context.pages:
+                    await page.close()
+                await context.clear_cookies()
+                pooled.idle_contexts.append(context)
+            except Exception as ex:
+                log.debug(f"Error recycling browser context: {ex}")
+                await self._close_quietly(context)
+        else:
+            await self._close_quietly(context)
+
+        if pooled.retired and pooled.in_use == 0:
+            await self._close_browser(pooled)
+
+    def _retire(self, pooled: PooledBrowser, reason: str) -> None:
+        """
+        Takes a browser out of rotation. It is closed as soon as its last context is returned.
+        """
+        if pooled.retired:
+            return
+        pooled.retired = True
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        log.debug(f"Retiring browser: {reason}")
+
+    async def _close_browser(self, pooled: PooledBrowser) -> None:
+        for context in pooled.idle_contexts:
+            await self._close_quietly(context)
+        pooled.idle_contexts.clear()
+        await self._close_quietly(pooled.browser)
+
+    async def _close_quietly(self, target: BrowserContext | Browser) -> None:
+        try:
+            await target.close()
+        except Exception as ex:
+            log.debug(f"Error closing {type(target).__name__}: {ex}")
+
+    async def health_check(self) -> None:
+        """
+        Retires every browser that is disconnected or cannot open a new context.
+        """
+        for pooled in list(self._browsers):
+            try:
+                if not pooled.browser.is_connected():
+                    raise ConnectionError("browser is disconnected")
+                probe = await asyncio.wait_for(pooled.browser.new_context(), timeout=self.health_interval or 10)
+                await probe.close()
+            except Exception as ex:
+                self._retire(pooled, reason=f"failed health check: {ex}")
+                if pooled.in_use == 0:
+                    await self._close_browser(pooled)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.health_check()
+            except Exception as ex:
+                log.debug(f"Error in browser health check: {ex}")
+
+    async def _close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+        for pooled in list(self._browsers):
+            self._retire(pooled, reason="pool shutdown")
+            await self._close_browser(pooled)
+        await self._stop_playwright()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def _stop_playwright(self) -> None:
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception as ex:
+                log.debug(f"Error stopping playwright: {ex}")
+            self._playwright = None
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """
+        Closes all browsers and stops the pool event loop thread.
+        Background coroutines still running are cancelled.
+        """
+        with self._start_lock:
+            if not self.running:
+                return
+            self._cancel_background()
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout)
+            except Exception as ex:
+                log.debug(f"Error shutting down browser pool: {ex}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+            self._loop = None
+            self._thread = None
+        # Coroutines spawned while closing never run on the stopped loop, and would leave their callers waiting forever
+        self._cancel_background()
+
+    def _cancel_background(self) -> None:
+        for future in list(self._background):
+            future.cancel()
+
+
+_pool: BrowserPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Returns the browser pool of the current process, creating it on first use.
+
+    A new pool is created after a fork, so every worker process gets its own browsers.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = BrowserPool()
+            _pool_pid = os.getpid()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def shutdown_browser_pool() -> None:
+    """
+    Shuts down the browser pool of the current process, if there is one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown()
+        _pool = None
@@ -0,0 +1,96 @@
+"""Compressed, size-limited encoding of cached values"""
+
+import logging
+import pickle
+import zlib
+from typing import Any
+
+from decouple import config
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from search.metrics import CACHE_ENTRY_BYTES, CACHE_OVERSIZED
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression of cached values: zstd, zlib or none. zstd needs the zstandard package.
+CACHE_COMPRESSION = config("CACHE_COMPRESSION", default="zlib")
+# Values smaller than this many bytes are stored uncompressed, as compressing them saves next to nothing
+CACHE_COMPRESS_MIN_BYTES = config("CACHE_COMPRESS_MIN_BYTES", cast=int, default=1024)
+# Encoded values larger than this many bytes are not stored
+CACHE_MAX_ENTRY_BYTES = config("CACHE_MAX_ENTRY_BYTES", cast=int, default=256 * 1024)
+
+# The first byte of an encoded value tells how it was compressed,
+# so that values stored before a change of CACHE_COMPRESSION can still be read
+CODECS = {"none": b"\x00", "zlib": b"\x01", "zstd": b"\x02"}
+
+log = logging.getLogger(__name__)
+
+if CACHE_COMPRESSION not in CODECS:
+    raise ImproperlyConfigured(f"CACHE_COMPRESSION {CACHE_COMPRESSION} not supported")
+if CACHE_COMPRESSION == "zstd" and zstandard is None:
+    raise ImproperlyConfigured("CACHE_COMPRESSION zstd needs the zstandard package")
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if compression == "zlib":
+        return zlib.compress(data, level=6)
+    return data
+
+
+def decompress(data: bytes, codec: bytes) -> bytes:
+    if codec == CODECS["zstd"]:
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == CODECS["zlib"]:
+        return zlib.decompress(data)
+    return data
+
+
+def encode(value: Any, compression: str = CACHE_COMPRESSION) -> bytes:
+    """
+    Takes a value and the compression to use.
+    Returns the value pickled, compressed unless it is smaller than CACHE_COMPRESS_MIN_BYTES,
+    and prefixed with its codec.
+    """
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) < CACHE_COMPRESS_MIN_BYTES:
+        compression = "none"
+    return CODECS[compression] + compress(data, compression)
+
+
+def decode(data: bytes) -> Any:
+    """
+    Takes a value returned by encode and returns the original value.
+    """
+    return pickle.loads(decompress(data[1:], data[:1]))
+
+
+def set_encoded(key: str, value: Any, timeout: float | None, distributor: str, kind: str) -> bool:
+    """
+    Takes a cache key, a value, its timeout, the name of the distributor it belongs to and the kind of value.
+
+    Stores the encoded value in the cache, unless it is larger than CACHE_MAX_ENTRY_BYTES.
+    Records the stored bytes per distributor and kind, and the values that were too large.
+    Returns True if the value was stored.
+    """
+    data = encode(value)
+    if len(data) > CACHE_MAX_ENTRY_BYTES:
+        log.debug(f"Not caching {kind} of {distributor}: {len(data)} bytes, key: {key}")
+        CACHE_OVERSIZED.labels(distributor=distributor, kind=kind).inc()
+        return False
+    cache.set(key=key, value=data, timeout=timeout)
+    CACHE_ENTRY_BYTES.labels(distributor=distributor, kind=kind).observe(len(data))
+    return True
+
+
+def get_encoded(key: str) -> Any | None:
+    """
+    Takes a cache key and returns the decoded value, or None if it is not in the cache.
+    """
+    data = cache.get(key)
+    return None if data is None else decode(data)
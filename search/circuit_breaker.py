@@ -0,0 +1,154 @@
+"""Circuit breakers and adaptive fetch timeouts per distributor"""
+
+import logging
+import statistics
+import time
+from enum import Enum
+
+from decouple import config
+from django.core.cache import cache
+
+from search.metrics import CIRCUIT_OPENED, CIRCUIT_REJECTED
+from search.models import DistributorSourceModel
+
+# Consecutive failed fetches after which the circuit of a distributor opens
+CIRCUIT_FAILURE_THRESHOLD = config("CIRCUIT_FAILURE_THRESHOLD", cast=int, default=5)
+# Seconds an open circuit skips the distributor before letting a probe fetch through
+CIRCUIT_OPEN_TIMEOUT = config("CIRCUIT_OPEN_TIMEOUT", cast=float, default=60)
+# Seconds a half-open circuit waits for the result of its probe before letting another one through
+CIRCUIT_PROBE_TIMEOUT = config("CIRCUIT_PROBE_TIMEOUT", cast=float, default=30)
+LATENCY_SAMPLES = config("LATENCY_SAMPLES", cast=int, default=50)
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = config("ADAPTIVE_TIMEOUT_MIN_SAMPLES", cast=int, default=10)
+ADAPTIVE_TIMEOUT_PERCENTILE = config("ADAPTIVE_TIMEOUT_PERCENTILE", cast=int, default=95)
+ADAPTIVE_TIMEOUT_FACTOR = config("ADAPTIVE_TIMEOUT_FACTOR", cast=float, default=2)
+ADAPTIVE_TIMEOUT_MIN = config("ADAPTIVE_TIMEOUT_MIN", cast=float, default=1)
+
+log = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a fetch is skipped because the circuit of its distributor is open."""
+
+
+def failures_key(distributor: DistributorSourceModel) -> str:
+    return f"circuit:{distributor.pk}:failures"
+
+
+def opened_key(distributor: DistributorSourceModel) -> str:
+    return f"circuit:{distributor.pk}:opened"
+
+
+def probe_key(distributor: DistributorSourceModel) -> str:
+    return f"circuit:{distributor.pk}:probe"
+
+
+def latency_key(distributor: DistributorSourceModel, stage: str) -> str:
+    return f"latency:{distributor.pk}:{stage}"
+
+
+def circuit_state(distributor: DistributorSourceModel) -> CircuitState:
+    """
+    Takes a DistributorSourceModel.
+
+    Returns the CircuitState of the distributor, shared by all workers through the cache.
+    An open circuit becomes half-open CIRCUIT_OPEN_TIMEOUT seconds after it opened.
+    """
+    opened = cache.get(opened_key(distributor))
+    if opened is None:
+        return CircuitState.CLOSED
+    if time.time() < opened + CIRCUIT_OPEN_TIMEOUT:
+        return CircuitState.OPEN
+    return CircuitState.HALF_OPEN
+
+
+def check_circuit(distributor: DistributorSourceModel) -> None:
+    """
+    Takes a DistributorSourceModel.
+
+    Raises CircuitOpenError if its circuit is open, or if it is half-open and another fetch is already probing it.
+    The probe is an atomic cache add, so across all workers only one fetch probes a half-open circuit.
+    """
+    state = circuit_state(distributor)
+    if state is CircuitState.CLOSED:
+        return
+    if state is CircuitState.HALF_OPEN and cache.add(probe_key(distributor), True, timeout=CIRCUIT_PROBE_TIMEOUT):
+        log.debug(f"Probing half-open circuit of {distributor.name}")
+        return
+    CIRCUIT_REJECTED.labels(distributor=distributor.name).inc()
+    raise CircuitOpenError(distributor.name)
+
+
+def record_success(distributor: DistributorSourceModel) -> None:
+    """
+    Takes a DistributorSourceModel whose fetch succeeded and closes its circuit.
+    Writes to the cache only if the distributor has failures or its circuit is not closed,
+    so that the successful fetches of a healthy distributor cost a single read.
+    """
+    keys = [failures_key(distributor), opened_key(distributor), probe_key(distributor)]
+    state = cache.get_many(keys)
+    if not state:
+        return
+    if opened_key(distributor) in state:
+        log.debug(f"Closing circuit of {distributor.name}")
+    cache.delete_many(keys)
+
+
+def record_failure(distributor: DistributorSourceModel) -> None:
+    """
+    Takes a DistributorSourceModel whose fetch failed.
+
+    Opens its circuit after CIRCUIT_FAILURE_THRESHOLD consecutive failures, or at once if the failed fetch
+    was the probe of a half-open circuit.
+    """
+    key = failures_key(distributor)
+    cache.add(key, 0, timeout=None)
+    failures = cache.incr(key)
+    if failures >= CIRCUIT_FAILURE_THRESHOLD or circuit_state(distributor) is CircuitState.HALF_OPEN:
+        log.debug(f"Opening circuit of {distributor.name} after {failures} failures")
+        cache.set(opened_key(distributor), time.time(), timeout=None)
+        cache.delete(probe_key(distributor))
+        CIRCUIT_OPENED.labels(distributor=distributor.name).inc()
+
+
+def record_latency(distributor: DistributorSourceModel, stage: str, seconds: float) -> None:
+    """
+    Takes a DistributorSourceModel, a fetch stage and its duration in seconds.
+
+    Keeps the last LATENCY_SAMPLES durations of the stage in the cache. Concurrent writers may drop
+    a sample now and then, which does not matter for the percentiles.
+    """
+    key = latency_key(distributor, stage)
+    samples = cache.get(key, [])
+    cache.set(key, [*samples[-LATENCY_SAMPLES + 1 :], seconds], timeout=None)
+
+
+def latency_percentile(distributor: DistributorSourceModel, stage: str) -> float | None:
+    """
+    Takes a DistributorSourceModel and a fetch stage.
+
+    Returns the ADAPTIVE_TIMEOUT_PERCENTILE of the recorded durations of the stage in seconds,
+    or None if fewer than ADAPTIVE_TIMEOUT_MIN_SAMPLES were recorded.
+    """
+    samples = cache.get(latency_key(distributor, stage), [])
+    if len(samples) < max(ADAPTIVE_TIMEOUT_MIN_SAMPLES, 2):
+        return None
+    return statistics.quantiles(samples, n=100)[ADAPTIVE_TIMEOUT_PERCENTILE - 1]
+
+
+def adaptive_timeout(distributor: DistributorSourceModel, stage: str, default: float) -> float:
+    """
+    Takes a DistributorSourceModel, a fetch stage and its default timeout in seconds.
+
+    Returns the timeout of the stage for the distributor: ADAPTIVE_TIMEOUT_FACTOR times its latency percentile,
+    between ADAPTIVE_TIMEOUT_MIN and the default. Until enough durations are recorded, returns the default.
+    """
+    percentile = latency_percentile(distributor, stage)
+    if percentile is None:
+        return default
+    return min(max(percentile * ADAPTIVE_TIMEOUT_FACTOR, ADAPTIVE_TIMEOUT_MIN), default)
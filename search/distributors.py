@@ -0,0 +1,131 @@
+"""In-process snapshot of the active distributors"""
+
+import asyncio
+import concurrent.futures
+import logging
+import time
+import uuid
+
+from cssselect import SelectorError
+from decouple import config
+from django.core.cache import cache
+from django.db import transaction
+
+from search.models import DistributorSourceModel
+from search.parser import compile_selector
+from search.tracing import tracer
+
+# Seconds between checks of the shared version key, i.e. how long other workers may serve an old snapshot
+DISTRIBUTORS_CHECK_INTERVAL = config("DISTRIBUTORS_CHECK_INTERVAL", cast=float, default=2)
+
+DISTRIBUTORS_VERSION_KEY = "distributors:version"
+
+log = logging.getLogger(__name__)
+
+
+def get_distributors_version() -> str:
+    """
+    Returns the shared version of the distributors, creating it if the cache has lost it.
+    """
+    version = cache.get(DISTRIBUTORS_VERSION_KEY)
+    if version is None:
+        cache.add(DISTRIBUTORS_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(DISTRIBUTORS_VERSION_KEY)
+    return version
+
+
+def bump_distributors_version() -> None:
+    """
+    Gives the distributors a new shared version, so that every worker reloads its snapshot.
+    """
+    cache.set(DISTRIBUTORS_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+class DistributorSnapshot:
+    """
+    Keeps the active distributors of the process in memory, with their derived fields computed.
+
+    The snapshot is reloaded from the database only when it was invalidated in this process
+    or when the shared version key in the cache changed, which is checked every DISTRIBUTORS_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, check_interval: float = DISTRIBUTORS_CHECK_INTERVAL) -> None:
+        self.check_interval = check_interval
+        self.version: str | None = None
+        self._distributors: list[DistributorSourceModel] = []
+        self._checked = 0.0
+        self._stale = True
+        # Done once the running load finished, it is shared by the event loops of all requests
+        self._loading: concurrent.futures.Future | None = None
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    async def get(self) -> list[DistributorSourceModel]:
+        """
+        Returns the active distributors, reloading them if their version changed.
+
+        While the snapshot is reloaded, concurrent callers get the previous one.
+        Before the first snapshot is loaded, they wait for it instead of getting no distributors.
+        """
+        now = time.monotonic()
+        if self._stale or now - self._checked >= self.check_interval:
+            self._checked = now
+            version = get_distributors_version()
+            if self._stale or version != self.version:
+                self._stale = False
+                await self.reload(version)
+        loading = self._loading
+        if self.version is None and loading is not None and not loading.done():
+            await asyncio.shield(asyncio.wrap_future(loading))
+            return await self.get()
+        return self._distributors
+
+    async def reload(self, version: str) -> None:
+        """
+        Takes the shared version of the distributors and loads the snapshot of it.
+        If the load fails, the snapshot is left stale, so that the next caller loads it again.
+        """
+        loading = self._loading = concurrent.futures.Future()
+        try:
+            self._distributors = await self.load()
+            self.version = version
+            log.debug(f"Loaded {len(self._distributors)} active distributors, version: {version}")
+        except BaseException:
+            self._stale = True
+            raise
+        finally:
+            loading.set_result(None)
+
+    async def load(self) -> list[DistributorSourceModel]:
+        """
+        Returns the active distributors from the database, with their derived fields computed
+        and their selectors compiled.
+        """
+        with tracer.start_as_current_span("distributors.load"):
+            distributors = [distributor async for distributor in DistributorSourceModel.objects.filter(active=True)]
+        for distributor in distributors:
+            # Computes the cached properties once, instead of on every search
+            distributor.search_url(""), distributor.favicon_url, distributor.request_policy
+            selectors = [selector for selector, _ in distributor.product_selectors.values()]
+            for selector in filter(None, [*selectors, distributor.product_container_selector]):
+                try:
+                    compile_selector(selector)
+                except SelectorError as ex:
+                    log.debug(f"Invalid selector of {distributor.name}: {selector}, {ex}")
+        return distributors
+
+
+# The active distributors of this process
+active_distributors = DistributorSnapshot()
+
+
+def invalidate_distributors(**kwargs) -> None:
+    """
+    Receives the post_save and post_delete signals of DistributorSourceModel.
+
+    Invalidates the snapshot of this process at once and the snapshots of the other workers
+    once the change is committed.
+    """
+    active_distributors.invalidate()
+    transaction.on_commit(bump_distributors_version)
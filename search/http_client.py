@@ -0,0 +1,48 @@
+"""Pooled async HTTP client for distributors with server-rendered search pages"""
+
+import httpx
+from decouple import config
+
+HTTP_TIMEOUT = config("HTTP_TIMEOUT", cast=float, default=10)
+HTTP_MAX_CONNECTIONS = config("HTTP_MAX_CONNECTIONS", cast=int, default=100)
+HTTP_KEEPALIVE_EXPIRY = config("HTTP_KEEPALIVE_EXPIRY", cast=float, default=30)
+HTTP_USER_AGENT = config(
+    "HTTP_USER_AGENT",
+    default="Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36",
+)
+
+
+def create_http_client(**kwargs) -> httpx.AsyncClient:
+    """
+    Returns an AsyncClient with keep-alive connection pooling and HTTP/2 enabled.
+
+    Responses compressed with gzip or deflate are decoded by httpx transparently.
+    The client is bound to the event loop it is first used on.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        headers={
+            "User-Agent": HTTP_USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml",
+        },
+        **kwargs,
+    )
+
+
+async def fetch_http(client: httpx.AsyncClient, url: str, timeout: float = HTTP_TIMEOUT) -> str:
+    """
+    Takes an AsyncClient, an url and the timeout of the request in seconds.
+
+    Returns the html content of the page.
+    Raises an exception if the response status is not successful.
+    """
+    response = await client.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.text
@@ -0,0 +1,97 @@
+"""Queue of fetch jobs consumed by the scraper workers"""
+
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import asdict, dataclass, field, replace
+from functools import lru_cache
+
+import redis
+from decouple import config
+from django.core.cache import cache
+from opentelemetry.propagate import inject
+
+# Redis url of the fetch job queue. If empty, web workers fetch the distributors themselves.
+SCRAPER_QUEUE_URL = config("SCRAPER_QUEUE_URL", default="")
+SCRAPER_QUEUE_NAME = config("SCRAPER_QUEUE_NAME", default="composearch:fetch-jobs")
+# Seconds a search waits for a scraper worker to fetch a result
+SCRAPER_JOB_TIMEOUT = config("SCRAPER_JOB_TIMEOUT", cast=float, default=30)
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FetchJob:
+    """
+    A fetch of the search results of a distributor for a normalized query, refreshing a stale result or not.
+    The trace context of the search that queued it lets the scraper worker continue its trace.
+    """
+
+    distributor_id: int
+    query: str
+    refresh: bool = False
+    trace_context: dict[str, str] = field(default_factory=dict, compare=False)
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def loads(cls, value: str | bytes) -> FetchJob:
+        return cls(**json.loads(value))
+
+
+def job_key(job: FetchJob) -> str:
+    return f"job:{job.distributor_id}:{job.query}"
+
+
+class JobQueue:
+    """
+    First in, first out queue of FetchJobs in a Redis list, shared by the web and scraper workers.
+
+    A job is queued only once until a scraper worker has done it, or until SCRAPER_JOB_TIMEOUT expires.
+    """
+
+    def __init__(self, url: str, name: str = SCRAPER_QUEUE_NAME) -> None:
+        self.name = name
+        self._redis = redis.Redis.from_url(url)
+
+    def put(self, job: FetchJob) -> bool:
+        """
+        Takes a FetchJob and queues it, unless the same job is already queued or being done.
+        Returns True if the job was queued.
+        """
+        if not cache.add(job_key(job), True, timeout=SCRAPER_JOB_TIMEOUT):
+            return False
+        trace_context = {}
+        inject(trace_context)
+        self._redis.lpush(self.name, replace(job, trace_context=trace_context).dumps())
+        log.debug(f"Queued fetch job: {job}")
+        return True
+
+    def get(self, timeout: float) -> FetchJob | None:
+        """
+        Waits up to `timeout` seconds for the next FetchJob and returns it, or None if the queue stayed empty.
+        """
+        item = self._redis.brpop([self.name], timeout=timeout)
+        return FetchJob.loads(item[1]) if item else None
+
+    def pending(self, job: FetchJob) -> bool:
+        """
+        Takes a FetchJob and returns True if it is queued or being done.
+        """
+        return cache.get(job_key(job)) is not None
+
+    def done(self, job: FetchJob) -> None:
+        cache.delete(job_key(job))
+
+    def __len__(self) -> int:
+        return self._redis.llen(self.name)
+
+
+@lru_cache(maxsize=None)
+def get_job_queue() -> JobQueue | None:
+    """
+    Returns the JobQueue of SCRAPER_QUEUE_URL, or None if searches fetch in the web process.
+    """
+    return JobQueue(SCRAPER_QUEUE_URL) if SCRAPER_QUEUE_URL else None
@@ -0,0 +1,70 @@
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from search.models import DistributorSourceModel
+from search.product import Product
+from search.shop_farm import LISTING_SELECTORS, listing_page
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the time to parse a search results page into a Product with each html parser. "
+        "Uses a generated listing page, or saved pages together with the selectors of a distributor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="*", help="Saved search results pages, parsed with --distributor")
+        parser.add_argument("--distributor", help="Name of the distributor whose selectors parse the files")
+        parser.add_argument("--parsers", nargs="+", default=["bs4", "lxml"])
+        parser.add_argument("--products", type=int, default=48, help="Products on the generated page")
+        parser.add_argument("--repeat", type=int, default=50, help="Number of times each page is parsed")
+
+    def handle(self, *args, **options):
+        if options["files"]:
+            if not options["distributor"]:
+                raise CommandError("--distributor is required to parse saved pages")
+            distributor = DistributorSourceModel.objects.filter(name=options["distributor"]).first()
+            if distributor is None:
+                raise CommandError(f"Distributor {options['distributor']} not found")
+            pages = [Path(file).read_text(encoding="utf-8") for file in options["files"]]
+        else:
+            distributor = DistributorSourceModel(
+                name="Benchmark",
+                base_url="https://benchmark.test/",
+                search_string="search?q=%s",
+                currency="EUR",
+                included_vat=20,
+                **LISTING_SELECTORS,
+            )
+            pages = [listing_page(options["products"])]
+
+        self.stdout.write(f"{'parser':>8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8}")
+        baseline = None
+        for parser in options["parsers"]:
+            timings = asyncio.run(self.measure(distributor, pages, parser, options["repeat"]))
+            mean = statistics.mean(timings)
+            quantiles = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+            baseline = baseline or mean
+            self.stdout.write(
+                f"{parser:>8} {mean * 1000:>8.2f} {quantiles[49] * 1000:>8.2f} "
+                f"{quantiles[94] * 1000:>8.2f} {baseline / mean:>7.1f}x"
+            )
+
+    async def measure(
+        self, distributor: DistributorSourceModel, pages: list[str], parser: str, repeat: int
+    ) -> list[float]:
+        """
+        Parses every page `repeat` times with the parser.
+        Returns the time of each parse in seconds.
+        """
+        timings = []
+        for _ in range(repeat):
+            for page in pages:
+                start_time = time.perf_counter()
+                await Product.from_html(distributor, page, parser=parser)
+                timings.append(time.perf_counter() - start_time)
+        return timings
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from search.prices import load_corpus, net_prices, parse_price
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the time to parse the price texts of the price corpus, uncached and memoized, "
+        "and checks the parsed prices, so that regressions in price parsing are caught."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=2000, help="Number of passes over the corpus")
+        parser.add_argument(
+            "--max-ns", type=float, help="Fail if an uncached parse takes longer than this, in nanoseconds per price"
+        )
+
+    def handle(self, *args, **options):
+        corpus = load_corpus()
+        errors = [
+            (text, expected) for text, price_format, expected in corpus if parse_price(text, price_format) != expected
+        ]
+        if errors:
+            raise CommandError(f"Wrong prices parsed: {errors}")
+
+        repeat = options["repeat"]
+        texts = [text for text, _, _ in corpus]
+        formats = [price_format for _, price_format, _ in corpus]
+        results = {
+            "uncached": self.measure(lambda: list(map(parse_price.__wrapped__, texts, formats)), repeat),
+            "memoized": self.measure(lambda: list(map(parse_price, texts, formats)), repeat),
+            "net prices": self.measure(lambda: net_prices(texts, vat=19), repeat),
+        }
+
+        self.stdout.write(f"{len(corpus)} price texts, {repeat} passes")
+        self.stdout.write(f"{'step':>10} {'ns/price':>9}")
+        for step, seconds in results.items():
+            self.stdout.write(f"{step:>10} {seconds / (repeat * len(corpus)) * 1e9:>9.0f}")
+
+        uncached_ns = results["uncached"] / (repeat * len(corpus)) * 1e9
+        if options["max_ns"] and uncached_ns > options["max_ns"]:
+            raise CommandError(f"Uncached price parsing takes {uncached_ns:.0f} ns, over {options['max_ns']:.0f} ns")
+
+    def measure(self, func, repeat: int) -> float:
+        """
+        Calls the function `repeat` times and returns the total time in seconds.
+        """
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return time.perf_counter() - start_time
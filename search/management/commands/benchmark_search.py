@@ -0,0 +1,277 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Iterator
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from search.management.commands.loadtest import percentiles
+from search.models import DistributorSourceModel, FetchStrategy
+from search.search import perform_search
+from search.shop_farm import LISTING_SELECTORS, ShopFarm, shop_profiles
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@contextmanager
+def benchmark_database() -> Iterator[None]:
+    """
+    Runs the benchmark on a fresh test database, so that its distributors never reach real searches.
+    """
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+@contextmanager
+def benchmark_cache() -> Iterator[None]:
+    """
+    Runs the benchmark on an in-process cache of its own, so that it neither serves the results of real searches
+    nor fills the shared cache with those of the mock shops. The in-process tier in front of it is kept,
+    without invalidations published to the other workers.
+    """
+    location = f"benchmark-{uuid.uuid4().hex}"
+    default = settings.CACHES["default"] | {"LOCATION": location}
+    default["OPTIONS"] = default.get("OPTIONS", {}) | {"INVALIDATION_URL": ""}
+    shared = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": location}
+    with override_settings(CACHES={"default": default, "shared": shared}):
+        yield
+
+
+def process_tree(root: int) -> list[tuple[int, str]]:
+    """
+    Takes a process id.
+    Returns the ids and names of the process and all its descendants, read from /proc.
+    """
+    parents, names = {}, {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The name is in parentheses and may contain spaces
+        name, fields = stat[stat.index("(") + 1 : stat.rindex(")")], stat[stat.rindex(")") + 2 :].split()
+        parents[int(entry.name)], names[int(entry.name)] = int(fields[1]), name
+    tree, pending = [], [root]
+    while pending:
+        pid = pending.pop()
+        tree.append((pid, names.get(pid, "")))
+        pending.extend(child for child, parent in parents.items() if parent == pid)
+    return tree
+
+
+def rss_bytes(pid: int) -> int:
+    try:
+        return int(Path(f"/proc/{pid}/statm").read_text().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+class ResourceSampler:
+    """Samples the RSS of the process tree and the number of its Chromium processes, keeping the peaks."""
+
+    def __init__(self, interval: float = 0.1) -> None:
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_chromium = 0
+        self._task: asyncio.Task | None = None
+
+    def sample(self) -> None:
+        tree = process_tree(os.getpid()) if Path("/proc").exists() else []
+        self.peak_rss = max(self.peak_rss, sum(rss_bytes(pid) for pid, _ in tree))
+        self.peak_chromium = max(
+            self.peak_chromium, sum(1 for _, name in tree if "chrom" in name.lower() or "headless" in name.lower())
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.to_thread(self.sample)
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self) -> "ResourceSampler":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._task.cancel()
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts a local farm of mock shops with realistic page sizes and response times, "
+        "drives perform_search and results_view against it at rising concurrency "
+        "and reports latency percentiles, searches per second, peak RSS and Chromium processes. "
+        "Results are written as JSON and can be compared with a baseline run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shops", type=int, default=10, help="Number of mock shops")
+        parser.add_argument("--latency", type=float, default=0.3, help="Median shop response time in seconds")
+        parser.add_argument("--latency-sigma", type=float, default=0.5, help="Spread of the log-normal response time")
+        parser.add_argument("--page-kb", type=int, default=300, help="Median size of the shop pages in KB")
+        parser.add_argument("--fetch-strategy", choices=FetchStrategy.values, default=FetchStrategy.HTTP)
+        parser.add_argument("--targets", nargs="+", choices=["perform_search", "results_view"], default=None)
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 20])
+        parser.add_argument("--requests", type=int, default=50, help="Number of searches per concurrency level")
+        parser.add_argument("--cached", action="store_true", help="Repeat one query, to measure cached searches")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="JSON results file, benchmark-<time>.json by default")
+        parser.add_argument("--compare", help="JSON results file of a baseline run")
+        parser.add_argument(
+            "--max-regression", type=float, default=20, help="Percent of p95 or throughput regression that fails"
+        )
+
+    def handle(self, *args, **options):
+        targets = options["targets"] or ["perform_search", "results_view"]
+        profiles = shop_profiles(
+            options["shops"], options["latency"], options["latency_sigma"], options["page_kb"] * 1024, options["seed"]
+        )
+        with ShopFarm(profiles, seed=options["seed"]) as farm, benchmark_database(), benchmark_cache():
+            levels = asyncio.run(self.run(farm, targets, options))
+
+        results = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "options": {
+                name: options[name]
+                for name in ("shops", "latency", "latency_sigma", "page_kb", "fetch_strategy", "requests", "cached")
+            },
+            "levels": levels,
+        }
+        output = options["output"] or f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+        Path(output).write_text(json.dumps(results, indent=2))
+        self.stdout.write(f"Results written to {output}")
+
+        if options["compare"]:
+            self.compare(json.loads(Path(options["compare"]).read_text()), results, options["max_regression"])
+
+    async def run(self, farm: ShopFarm, targets: list[str], options: dict) -> list[dict]:
+        for profile in farm.profiles.values():
+            await DistributorSourceModel.objects.acreate(
+                name=profile.name,
+                base_url=farm.base_url(profile.name),
+                search_string="search?q=%s",
+                currency="EUR",
+                included_vat=20,
+                fetch_strategy=options["fetch_strategy"],
+                concurrency_limit=100,
+                **LISTING_SELECTORS,
+            )
+
+        host = next((host for host in settings.ALLOWED_HOSTS if host not in ("*", "")), "localhost").lstrip(".")
+        transport = httpx.ASGITransport(app=await asyncio.to_thread(self.asgi_application))
+        levels = []
+
+        self.stdout.write(
+            f"{'target':>14} {'concurrency':>11} {'ok':>5} {'errors':>6} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+            f"{'searches/s':>10} {'peak MB':>8} {'chromium':>8}"
+        )
+        async with httpx.AsyncClient(transport=transport, base_url=f"http://{host}", timeout=120) as client:
+            searches: dict[str, Callable[[str], Awaitable[None]]] = {
+                "perform_search": perform_search,
+                "results_view": lambda query: self.get_results_view(client, query),
+            }
+            for target in targets:
+                for concurrency in options["concurrency"]:
+                    level = await self.run_level(
+                        searches[target], f"benchmark {target} {concurrency}", concurrency, options
+                    )
+                    level = {"target": target, "concurrency": concurrency} | level
+                    levels.append(level)
+                    self.stdout.write(
+                        f"{target:>14} {concurrency:>11} {level['ok']:>5} {level['errors']:>6} "
+                        f"{level['p50']:>7.3f} {level['p95']:>7.3f} {level['p99']:>7.3f} "
+                        f"{level['throughput']:>10.2f} {level['peak_rss_mb']:>8.0f} {level['peak_chromium']:>8}"
+                    )
+        return levels
+
+    @staticmethod
+    def asgi_application():
+        from composearch.asgi import application
+
+        return application
+
+    @staticmethod
+    async def get_results_view(client: httpx.AsyncClient, query: str) -> None:
+        response = await client.get("/search/", params={"query": query})
+        response.raise_for_status()
+
+    async def run_level(
+        self, search: Callable[[str], Awaitable[None]], query: str, concurrency: int, options: dict
+    ) -> dict:
+        """
+        Runs `requests` searches with at most `concurrency` of them at once, each for a new query
+        unless cached searches are measured.
+        Returns the number of successful and failed searches, the latency percentiles, the throughput
+        and the peak RSS and number of Chromium processes.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def measure(number: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                start_time = time.perf_counter()
+                try:
+                    await search(query if options["cached"] else f"{query} {number}")
+                    latencies.append(time.perf_counter() - start_time)
+                except Exception as ex:
+                    errors += 1
+                    self.stderr.write(f"Search failed: {ex!r}")
+
+        with ResourceSampler() as sampler:
+            start_time = time.perf_counter()
+            await asyncio.gather(*[measure(number) for number in range(options["requests"])])
+            elapsed = time.perf_counter() - start_time
+
+        quantiles = percentiles(latencies)
+        return {
+            "ok": len(latencies),
+            "errors": errors,
+            "p50": quantiles[49],
+            "p95": quantiles[94],
+            "p99": quantiles[98],
+            "throughput": len(latencies) / elapsed,
+            "peak_rss_mb": sampler.peak_rss / 2**20,
+            "peak_chromium": sampler.peak_chromium,
+        }
+
+    def compare(self, baseline: dict, results: dict, max_regression: float) -> None:
+        """
+        Takes the results of a baseline run, of this run and the regression percent that fails.
+        Writes the change of the p95 latency and the throughput of every level run by both.
+        Raises CommandError if a level regressed more than `max_regression` percent.
+        """
+        levels = {(level["target"], level["concurrency"]): level for level in baseline["levels"]}
+        regressions = []
+        self.stdout.write(f"{'target':>14} {'concurrency':>11} {'p95':>8} {'searches/s':>10}")
+        for level in results["levels"]:
+            before = levels.get((level["target"], level["concurrency"]))
+            if not before:
+                continue
+            p95 = change(before["p95"], level["p95"])
+            throughput = change(before["throughput"], level["throughput"])
+            self.stdout.write(f"{level['target']:>14} {level['concurrency']:>11} {p95:>+7.1f}% {throughput:>+9.1f}%")
+            if p95 > max_regression or throughput < -max_regression:
+                regressions.append(f"{level['target']} at concurrency {level['concurrency']}")
+        if regressions:
+            raise CommandError(f"Regression of more than {max_regression}%: {', '.join(regressions)}")
+
+
+def change(before: float, after: float) -> float:
+    """
+    Takes a measure of the baseline and of this run and returns its change in percent.
+    """
+    return (after - before) / before * 100 if before else 0.0
@@ -0,0 +1,113 @@
+import asyncio
+import statistics
+import time
+from dataclasses import dataclass, field
+
+from django.core.management.base import BaseCommand, CommandError
+from playwright.async_api import Browser, Request, async_playwright
+
+from search.models import DistributorSourceModel
+from search.search import BROWSER_TIMEOUT, normalize_query
+
+
+@dataclass
+class PageLoad:
+    """Bytes, requests and time of loading a search results page until its price selector appears."""
+
+    seconds: float = 0
+    bytes: int = 0
+    requests: int = 0
+    blocked: int = 0
+    sizes: list[asyncio.Task] = field(default_factory=list)
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads the search results page of each active distributor with and without its request policy "
+        "and reports the bytes and time saved by blocking requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("query", help="Search query of the loaded pages")
+        parser.add_argument("--distributors", nargs="+", help="Names of the distributors, all active by default")
+        parser.add_argument("--repeat", type=int, default=3, help="Number of times each page is loaded")
+
+    def handle(self, *args, **options):
+        distributors = DistributorSourceModel.objects.filter(active=True)
+        if options["distributors"]:
+            distributors = distributors.filter(name__in=options["distributors"])
+        distributors = list(distributors)
+        if not distributors:
+            raise CommandError("No active distributor found")
+        asyncio.run(self.report(distributors, normalize_query(options["query"]), options["repeat"]))
+
+    async def report(self, distributors: list[DistributorSourceModel], query: str, repeat: int) -> None:
+        self.stdout.write(
+            f"{'distributor':<20} {'requests':>9} {'blocked':>8} {'full KB':>9} {'KB':>8} {'saved':>6} "
+            f"{'full ms':>8} {'ms':>8} {'saved':>6}"
+        )
+        async with async_playwright() as playwright:
+            browser = await playwright.chromium.launch()
+            for distributor in distributors:
+                full, blocked = [], []
+                for _ in range(repeat):
+                    full.append(await self.load(browser, distributor, query, blocking=False))
+                    blocked.append(await self.load(browser, distributor, query, blocking=True))
+                self.write_row(distributor, full, blocked)
+            await browser.close()
+
+    async def load(self, browser: Browser, distributor: DistributorSourceModel, query: str, blocking: bool) -> PageLoad:
+        """
+        Loads the search results page of the distributor in a fresh context, so that nothing is cached,
+        with or without its request policy.
+        Returns the PageLoad, with zero seconds if the price selector did not appear.
+        """
+        load = PageLoad()
+
+        def finished(request: Request) -> None:
+            load.requests += 1
+            load.sizes.append(asyncio.create_task(request.sizes()))
+
+        def failed(request: Request) -> None:
+            load.blocked += 1
+
+        context = await browser.new_context()
+        page = await context.new_page()
+        page.on("requestfinished", finished)
+        page.on("requestfailed", failed)
+        if blocking:
+            await page.route("**/*", distributor.request_policy.handle_route)
+        try:
+            start_time = time.perf_counter()
+            await page.goto(distributor.search_url(query), timeout=BROWSER_TIMEOUT)
+            await page.locator(distributor.product_price_selector).first.wait_for(timeout=BROWSER_TIMEOUT)
+            load.seconds = time.perf_counter() - start_time
+            # Waits for the requests still running when the price appeared, they are part of the page weight
+            await page.wait_for_load_state("networkidle", timeout=BROWSER_TIMEOUT)
+        except Exception as ex:
+            self.stderr.write(f"{distributor.name}: {ex}")
+        sizes = await asyncio.gather(*load.sizes, return_exceptions=True)
+        load.bytes = sum(
+            size["responseBodySize"] + size["responseHeadersSize"] for size in sizes if isinstance(size, dict)
+        )
+        await context.close()
+        return load
+
+    def write_row(self, distributor: DistributorSourceModel, full: list[PageLoad], blocked: list[PageLoad]) -> None:
+        full_bytes = statistics.median(load.bytes for load in full) / 1024
+        blocked_bytes = statistics.median(load.bytes for load in blocked) / 1024
+        full_ms = statistics.median(load.seconds for load in full) * 1000
+        blocked_ms = statistics.median(load.seconds for load in blocked) * 1000
+        self.stdout.write(
+            f"{distributor.name[:20]:<20} {statistics.median(load.requests for load in full):>9.0f} "
+            f"{statistics.median(load.blocked for load in blocked):>8.0f} "
+            f"{full_bytes:>9.0f} {blocked_bytes:>8.0f} {saved(full_bytes, blocked_bytes):>6} "
+            f"{full_ms:>8.0f} {blocked_ms:>8.0f} {saved(full_ms, blocked_ms):>6}"
+        )
+
+
+def saved(full: float, blocked: float) -> str:
+    """
+    Takes a measure without and with blocking and returns the share saved by blocking.
+    """
+    return f"{1 - blocked / full:.0%}" if full else "-"
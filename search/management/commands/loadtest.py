@@ -0,0 +1,73 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+from django.core.management.base import BaseCommand
+
+
+def percentiles(latencies: list[float]) -> list[float]:
+    """
+    Takes the latencies of a run in seconds.
+    Returns its 99 percentiles, of which the Nth is at index N - 1, all 0 if there is no latency.
+    """
+    return statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99 or [0] * 99
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends concurrent searches to a running server at rising concurrency levels "
+        "and reports latency and throughput, to find how many concurrent searches a deployment can hold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Search url of the server, e.g. http://127.0.0.1:8000/search/")
+        parser.add_argument("--query", default="test", help="Search query, a counter is appended to avoid the cache")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 3, 10, 30, 100])
+        parser.add_argument("--requests", type=int, default=100, help="Number of searches per concurrency level")
+        parser.add_argument("--timeout", type=float, default=60)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'concurrency':>11} {'ok':>5} {'errors':>6} {'p50 s':>7} {'p95 s':>7} {'searches/s':>10}")
+        for concurrency in options["concurrency"]:
+            stats = asyncio.run(self.run_level(options, concurrency))
+            self.stdout.write(
+                f"{concurrency:>11} {stats['ok']:>5} {stats['errors']:>6} "
+                f"{stats['p50']:>7.2f} {stats['p95']:>7.2f} {stats['throughput']:>10.2f}"
+            )
+
+    async def run_level(self, options: dict, concurrency: int) -> dict:
+        """
+        Sends `requests` searches with at most `concurrency` of them in flight at once.
+        Returns the number of successful and failed searches, the latency percentiles and the throughput.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+        limits = httpx.Limits(max_connections=concurrency)
+
+        async with httpx.AsyncClient(timeout=options["timeout"], limits=limits) as client:
+
+            async def search(number: int) -> None:
+                nonlocal errors
+                async with semaphore:
+                    query = f"{options['query']} {concurrency}-{number}-{time.time()}"
+                    start_time = time.perf_counter()
+                    try:
+                        response = await client.get(options["url"], params={"query": query})
+                        response.raise_for_status()
+                        latencies.append(time.perf_counter() - start_time)
+                    except httpx.HTTPError:
+                        errors += 1
+
+            start_time = time.perf_counter()
+            await asyncio.gather(*[search(number) for number in range(options["requests"])])
+            elapsed = time.perf_counter() - start_time
+
+        quantiles = percentiles(latencies)
+        return {
+            "ok": len(latencies),
+            "errors": errors,
+            "p50": quantiles[49],
+            "p95": quantiles[94],
+            "throughput": len(latencies) / elapsed,
+        }
@@ -0,0 +1,36 @@
+import asyncio
+
+from decouple import config
+from django.core.management.base import BaseCommand, CommandError
+from prometheus_client import start_http_server
+
+from search.browser import get_browser_pool, shutdown_browser_pool
+from search.jobs import get_job_queue
+from search.worker import run_worker
+
+SCRAPER_CONCURRENCY = config("SCRAPER_CONCURRENCY", cast=int, default=16)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a scraper worker, which fetches the search results queued by the web workers in SCRAPER_QUEUE_URL "
+        "and stores them in the cache. Web and scraper workers can be scaled independently."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=SCRAPER_CONCURRENCY, help="Jobs done at a time")
+        parser.add_argument("--metrics-port", type=int, help="Port on which the Prometheus metrics are exported")
+
+    def handle(self, *args, **options):
+        job_queue = get_job_queue()
+        if job_queue is None:
+            raise CommandError("SCRAPER_QUEUE_URL is not set")
+        if options["metrics_port"]:
+            start_http_server(options["metrics_port"])
+        self.stdout.write(f"Scraper worker consuming {job_queue.name}")
+        try:
+            asyncio.run(run_worker(get_browser_pool(), job_queue, options["concurrency"]))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            shutdown_browser_pool()
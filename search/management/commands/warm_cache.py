@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from search.browser import get_browser_pool, shutdown_browser_pool
+from search.warmer import WARMER_CONCURRENCY, WARMER_INTERVAL, WARMER_REFRESH_MARGIN, WARMER_TOP_QUERIES, warm_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Refreshes the cached results of the most searched queries before they expire, "
+        "every --interval seconds, or once with --once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=WARMER_TOP_QUERIES, help="Number of popular queries")
+        parser.add_argument("--interval", type=float, default=WARMER_INTERVAL, help="Seconds between runs")
+        parser.add_argument("--margin", type=float, default=WARMER_REFRESH_MARGIN, help="Refresh margin in seconds")
+        parser.add_argument("--concurrency", type=int, default=WARMER_CONCURRENCY, help="Simultaneous fetches")
+        parser.add_argument("--once", action="store_true", help="Warm the cache once and exit, e.g. from cron")
+
+    def handle(self, *args, **options):
+        try:
+            asyncio.run(self.run(options))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            shutdown_browser_pool()
+
+    async def run(self, options: dict) -> None:
+        pool = get_browser_pool()
+        while True:
+            start_time = time.monotonic()
+            warmed = await warm_cache(pool, options["top"], options["margin"], options["concurrency"])
+            elapsed = time.monotonic() - start_time
+            self.stdout.write(f"Warmed {warmed} results in {elapsed:.1f} s")
+            if options["once"]:
+                return
+            # The worker runs for days, so it drops database connections the way a request would
+            await sync_to_async(close_old_connections)()
+            await asyncio.sleep(max(options["interval"] - elapsed, 0))
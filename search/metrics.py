@@ -0,0 +1,128 @@
+"""Prometheus metrics"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Buckets of the stages of a search, from cache lookups to slow page loads
+STAGE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+
+SCHEDULER_QUEUE_DEPTH = Gauge(
+    "composearch_scheduler_queue_depth",
+    "Number of fetches waiting for a scheduler slot",
+)
+SCHEDULER_ACTIVE_PAGES = Gauge(
+    "composearch_scheduler_active_pages",
+    "Number of browser pages admitted by the scheduler",
+)
+SCHEDULER_WAIT_SECONDS = Histogram(
+    "composearch_scheduler_wait_seconds",
+    "Time fetches waited for a scheduler slot, by outcome: admitted, timeout, or cancelled while waiting",
+    ["distributor", "outcome"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+SCHEDULER_REJECTED = Counter(
+    "composearch_scheduler_rejected_total",
+    "Number of fetches rejected by the scheduler",
+    ["distributor", "reason"],
+)
+CIRCUIT_OPENED = Counter(
+    "composearch_circuit_opened_total",
+    "Number of times the circuit of a distributor opened",
+    ["distributor"],
+)
+CIRCUIT_REJECTED = Counter(
+    "composearch_circuit_rejected_total",
+    "Number of fetches skipped because the circuit of their distributor was open",
+    ["distributor"],
+)
+BLOCKED_REQUESTS = Counter(
+    "composearch_blocked_requests_total",
+    "Number of page requests aborted by the request policy of their distributor",
+    ["distributor", "resource_type"],
+)
+SEARCH_SECONDS = Histogram(
+    "composearch_search_seconds",
+    "Time of searches, until all distributors responded or the search deadline expired",
+    ["outcome"],
+    buckets=STAGE_BUCKETS,
+)
+SEARCH_DEADLINE_MISSED = Counter(
+    "composearch_search_deadline_missed_total",
+    "Number of searches in which a distributor missed the search deadline",
+    ["distributor"],
+)
+SEARCH_RESPONSES = Counter(
+    "composearch_search_responses_total",
+    "Number of search responses looked up in the response cache, by outcome: hit, miss, not_modified, "
+    "or partial and too_few for responses that were not cached",
+    ["outcome"],
+)
+FETCH_RESULTS = Counter(
+    "composearch_fetch_results_total",
+    "Number of distributor results looked up by searches, by cache outcome",
+    ["distributor", "cache"],
+)
+FETCH_RESULT_SECONDS = Histogram(
+    "composearch_fetch_result_seconds",
+    "Time to get the result of a distributor for a search, by cache outcome",
+    ["distributor", "cache"],
+    buckets=STAGE_BUCKETS,
+)
+FETCH_STAGE_SECONDS = Histogram(
+    "composearch_fetch_stage_seconds",
+    "Time of each stage of fetching the results of a distributor",
+    ["distributor", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+PARSE_SECONDS = Histogram(
+    "composearch_parse_seconds",
+    "Time of parsing the results of a distributor, by stage and selector",
+    ["distributor", "stage"],
+    buckets=STAGE_BUCKETS,
+)
+CACHE_ENTRY_BYTES = Histogram(
+    "composearch_cache_entry_bytes",
+    "Encoded size of the values stored in the cache, by distributor and kind of value",
+    ["distributor", "kind"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+CACHE_OVERSIZED = Counter(
+    "composearch_cache_oversized_total",
+    "Number of values not stored in the cache because they exceeded the entry size limit",
+    ["distributor", "kind"],
+)
+CACHE_LOOKUPS = Counter(
+    "composearch_cache_lookups_total",
+    "Number of lookups of the keys kept in the in-process cache tier, by tier and result",
+    ["tier", "result"],
+)
+BROWSER_CONTEXT_SECONDS = Histogram(
+    "composearch_browser_context_seconds",
+    "Time to borrow a browser context from the pool, reusing an idle one or creating a new one",
+    ["source"],
+    buckets=STAGE_BUCKETS,
+)
+
+
+def export_metrics() -> tuple[bytes, str]:
+    """
+    Returns the metrics in the Prometheus text format and its content type.
+
+    With PROMETHEUS_MULTIPROC_DIR set, as with several gunicorn workers, the metrics of all
+    worker processes are collected from the directory, so that any worker answers for all of them.
+    """
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
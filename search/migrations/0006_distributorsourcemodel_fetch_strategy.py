@@ -0,0 +1,26 @@
+# Generated by Django 4.2.2 on 2026-10-17 22:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("search", "0005_remove_distributorsourcemodel_including_vat_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="fetch_strategy",
+            field=models.CharField(
+                choices=[
+                    ("http", "Plain HTTP"),
+                    ("browser", "Headless browser"),
+                    ("auto", "Plain HTTP with headless browser fallback"),
+                ],
+                default="browser",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2026-10-17 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("search", "0006_distributorsourcemodel_fetch_strategy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="cache_hard_timeout",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="cache_soft_timeout",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
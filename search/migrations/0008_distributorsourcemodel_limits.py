@@ -0,0 +1,23 @@
+# Generated by Django 4.2.2 on 2026-10-17 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("search", "0007_distributorsourcemodel_cache_timeouts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="concurrency_limit",
+            field=models.PositiveIntegerField(default=4),
+        ),
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="rate_limit",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.2 on 2026-10-17 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("search", "0008_distributorsourcemodel_limits"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="price_format",
+            field=models.CharField(
+                choices=[
+                    ("auto", "Detect separators"),
+                    ("dot", "1,234.56 (dot decimal separator)"),
+                    ("comma", "1.234,56 (comma decimal separator)"),
+                ],
+                default="auto",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.2 on 2026-10-17 23:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("search", "0009_distributorsourcemodel_price_format"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="allowed_domains",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="block_trackers",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="blocked_domains",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="blocked_resource_types",
+            field=models.CharField(
+                blank=True, default="image,font,media,stylesheet", max_length=256
+            ),
+        ),
+    ]
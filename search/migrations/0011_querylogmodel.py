@@ -0,0 +1,31 @@
+# Generated by Django 4.2.2 on 2026-10-17 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("search", "0010_distributorsourcemodel_request_policy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QueryLogModel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("query", models.CharField(max_length=1024, unique=True)),
+                ("count", models.PositiveIntegerField(db_index=True, default=1)),
+                ("first_searched", models.DateTimeField(auto_now_add=True)),
+                ("last_searched", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("search", "0011_querylogmodel"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="distributorsourcemodel",
+            name="product_container_selector",
+            field=models.CharField(blank=True, default="", max_length=1024),
+        ),
+    ]
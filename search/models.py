@@ -1,5 +1,26 @@
+from functools import cached_property
+from urllib.parse import urljoin
+
 from django.db import models
 
+from search.request_policy import RequestPolicy
+
+
+class FetchStrategy(models.TextChoices):
+    HTTP = "http", "Plain HTTP"
+    BROWSER = "browser", "Headless browser"
+    AUTO = "auto", "Plain HTTP with headless browser fallback"
+
+
+class PriceFormat(models.TextChoices):
+    AUTO = "auto", "Detect separators"
+    DOT_DECIMAL = "dot", "1,234.56 (dot decimal separator)"
+    COMMA_DECIMAL = "comma", "1.234,56 (comma decimal separator)"
+
+
+# Playwright resource types aborted by default, the price selector needs none of them
+DEFAULT_BLOCKED_RESOURCE_TYPES = "image,font,media,stylesheet"
+
 
 class DistributorSourceModel(models.Model):
     name = models.CharField(max_length=100, null=False, blank=False)
@@ -11,7 +32,58 @@ class DistributorSourceModel(models.Model):
     product_url_selector = models.CharField(max_length=1024, null=False, blank=False)
     product_picture_url_selector = models.CharField(max_length=1024, null=False, blank=False)
     product_price_selector = models.CharField(max_length=1024, null=False, blank=False)
+    product_container_selector = models.CharField(max_length=1024, blank=True, default="")
     active = models.BooleanField(default=True)
+    fetch_strategy = models.CharField(max_length=10, choices=FetchStrategy.choices, default=FetchStrategy.BROWSER)
+    price_format = models.CharField(max_length=10, choices=PriceFormat.choices, default=PriceFormat.AUTO)
+    cache_soft_timeout = models.PositiveIntegerField(null=True, blank=True)
+    cache_hard_timeout = models.PositiveIntegerField(null=True, blank=True)
+    concurrency_limit = models.PositiveIntegerField(default=4)
+    rate_limit = models.FloatField(null=True, blank=True)
+    blocked_resource_types = models.CharField(max_length=256, blank=True, default=DEFAULT_BLOCKED_RESOURCE_TYPES)
+    block_trackers = models.BooleanField(default=True)
+    blocked_domains = models.TextField(blank=True, default="")
+    allowed_domains = models.TextField(blank=True, default="")
 
     def __str__(self):
         return f"{self.name} ({self.base_url}){' - INACTIVE' if not self.active else ''}"
+
+    @cached_property
+    def search_url_template(self) -> str:
+        return urljoin(self.base_url, self.search_string)
+
+    @cached_property
+    def favicon_url(self) -> str:
+        return urljoin(self.base_url, "favicon.ico")
+
+    @cached_property
+    def product_selectors(self) -> dict[str, tuple[str, str]]:
+        """
+        Returns a dict of the product fields and the (selector, type) pairs selecting them.
+        """
+        return {
+            "name": (self.product_name_selector, "text"),
+            "price": (self.product_price_selector, "text"),
+            "url": (self.product_url_selector, "href"),
+            "picture_url": (self.product_picture_url_selector, "src"),
+        }
+
+    @cached_property
+    def request_policy(self) -> RequestPolicy:
+        return RequestPolicy.from_distributor(self)
+
+    def search_url(self, query: str) -> str:
+        """
+        Takes a normalized search query and returns the url of the distributor's search results for it.
+        """
+        return self.search_url_template.replace("%s", query)
+
+
+class QueryLogModel(models.Model):
+    query = models.CharField(max_length=1024, unique=True)
+    count = models.PositiveIntegerField(default=1, db_index=True)
+    first_searched = models.DateTimeField(auto_now_add=True)
+    last_searched = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.query} ({self.count})"
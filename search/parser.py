@@ -1,13 +1,87 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import Any
 
+import lxml.html
 from asgiref.sync import sync_to_async
 from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
+from lxml import etree
+from lxml.cssselect import CSSSelector
+from playwright.async_api import BrowserContext, Page
+
+from search.browser import BrowserPool, get_browser_pool
+
+ELEMENT_TYPES = ("text", "href", "src")
+
+Fields = dict[str, tuple[str, str]]
+Row = dict[str, str | None]
+
+# Selects the first `limit` elements of each selector and returns their trimmed texts or attribute values,
+# and the number of elements each selector matched
+SELECT_FIELDS_SCRIPT = """
+([fields, limit]) => {
+    const columns = {}, counts = {};
+    for (const [name, [selector, type]] of Object.entries(fields)) {
+        const elements = Array.from(document.querySelectorAll(selector));
+        columns[name] = elements
+            .slice(0, limit)
+            .map(element => (type === "text" ? element.innerText.trim() : element.getAttribute(type)));
+        counts[name] = elements.length;
+    }
+    return [columns, counts];
+}
+"""
+
+# Selects the first `limit` containers and returns a row of the first element of each selector inside each of them
+SELECT_CONTAINED_FIELDS_SCRIPT = """
+([fields, limit, container]) => Array.from(document.querySelectorAll(container))
+    .slice(0, limit)
+    .map(root => Object.fromEntries(
+        Object.entries(fields).map(([name, [selector, type]]) => {
+            const element = root.querySelector(selector);
+            if (element === null) {
+                return [name, null];
+            }
+            return [name, type === "text" ? element.innerText.trim() : element.getAttribute(type)];
+        })
+    ))
+"""
+
+
+def validate_fields(fields: Fields) -> None:
+    """
+    Takes a dict of field names and (selector, type) pairs.
+    Raises ValueError if a type is not supported.
+    """
+    for _, type in fields.values():
+        if type not in ELEMENT_TYPES:
+            raise ValueError(f"Type {type} not supported")
+
+
+def zip_rows(columns: dict[str, list[str | None]], counts: dict[str, int], limit: int) -> list[Row]:
+    """
+    Takes a dict of field names and the first values selected for them, in document order,
+    a dict of the number of elements each selector matched and a row limit.
+
+    Returns up to `limit` rows, where row N holds the Nth value of every field, or None if a field has fewer values.
+    Unless all selectors matched the same number of elements, only the first row is returned, as a field
+    missing from one result would shift the values of the later results into the wrong rows.
+    """
+    if len(set(counts.values())) > 1:
+        limit = 1
+    count = min(limit, max((len(values) for values in columns.values()), default=0))
+    return [
+        {name: values[index] if index < len(values) else None for name, values in columns.items()}
+        for index in range(count)
+    ]
 
 
 class AbstractParser(ABC):
     _name = ""
+    # Seconds each field took in the last select_fields call, for parsers that select field by field
+    timings: dict[str, float] = {}
 
     @abstractmethod
     async def __aenter__(self):
@@ -29,6 +103,19 @@ class AbstractParser(ABC):
     async def select_element(self, selector: str, type: str, **kwargs) -> str | None:
         raise NotImplementedError
 
+    @abstractmethod
+    async def select_fields(self, fields: Fields, limit: int = 1, container: str = "") -> list[Row]:
+        """
+        Takes a dict of field names and (selector, type) pairs, a row limit and the selector of the element
+        containing each result, if the distributor has one.
+
+        Selects all fields of the loaded content in one pass.
+        With a container selector, returns a row for each of the first `limit` containers, holding the first
+        element of every field inside it, or None if it is missing. Otherwise returns up to `limit` rows,
+        as returned by zip_rows, one for each result on the page.
+        """
+        raise NotImplementedError
+
 
 class Parser(AbstractParser):
     def __init__(self, parser: str) -> None:
@@ -57,6 +144,9 @@ class Parser(AbstractParser):
     async def select_element(self, selector: str, type: str, **kwargs) -> str | None:
         ...
 
+    async def select_fields(self, fields: Fields, limit: int = 1, container: str = "") -> list[Row]:
+        ...
+
 
 class BeautifulSoupParser(AbstractParser):
     _name = "bs4"
@@ -84,34 +174,248 @@ class BeautifulSoupParser(AbstractParser):
             else:
                 raise ValueError(f"Type {type} not supported")
 
+    @sync_to_async
+    def select_fields(self, fields: Fields, limit: int = 1, container: str = "") -> list[Row]:
+        validate_fields(fields)
+        if container:
+            return self.select_contained_fields(fields, limit, container)
+        columns, counts, self.timings = {}, {}, {}
+        for name, (selector, type) in fields.items():
+            start_time = time.perf_counter()
+            elements = self.soup.select(selector)
+            columns[name] = [soup_value(element, type) for element in elements[:limit]]
+            counts[name] = len(elements)
+            self.timings[name] = time.perf_counter() - start_time
+        return zip_rows(columns, counts, limit)
+
+    def select_contained_fields(self, fields: Fields, limit: int, container: str) -> list[Row]:
+        containers = self.soup.select(container, limit=limit)
+        rows, self.timings = [{} for _ in containers], {}
+        for name, (selector, type) in fields.items():
+            start_time = time.perf_counter()
+            for row, root in zip(rows, containers):
+                element = root.select_one(selector)
+                row[name] = soup_value(element, type) if element else None
+            self.timings[name] = time.perf_counter() - start_time
+        return rows
+
+
+def soup_value(element: Any, type: str) -> str | None:
+    """
+    Takes a BeautifulSoup element and the type of the value to select.
+    Returns the trimmed text of the element or the value of the attribute.
+    """
+    if type == "text":
+        return element.text.strip()
+    return element.get(type)
+
+
+@lru_cache(maxsize=1024)
+def compile_selector(selector: str) -> CSSSelector:
+    """
+    Takes a CSS selector string.
+    Returns the selector compiled to XPath, cached, so that every distributor selector is compiled once.
+    """
+    return CSSSelector(selector, translator="html")
+
+
+def parse_html(html_content: str) -> lxml.html.HtmlElement | None:
+    """
+    Takes a html string and returns its lxml tree, or None if it has no content.
+    """
+    try:
+        return lxml.html.fromstring(html_content)
+    except ValueError:
+        # Unicode strings with an encoding declaration are only parsed as bytes
+        return lxml.html.fromstring(html_content.encode("utf-8"))
+    except etree.ParserError:
+        return None
+
+
+class LxmlParser(AbstractParser):
+    """
+    Selects elements with the lxml C HTML parser and compiled CSS selectors.
+
+    Parsing and selecting run in a worker thread, as they take tens of milliseconds for a large page
+    and would otherwise block the event loop, e.g. the fetches of the browser pool.
+    """
+
+    _name = "lxml"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args: Any):
+        pass
+
+    async def load_content(self, html_content: str) -> None:
+        self.tree = await asyncio.to_thread(parse_html, html_content)
+
+    async def select_element(self, selector: str, type: str) -> str | None:
+        if type not in ELEMENT_TYPES:
+            raise ValueError(f"Type {type} not supported")
+        if self.tree is None:
+            return None
+        elements = compile_selector(selector)(self.tree)
+        if elements:
+            return element_value(elements[0], type)
+
+    async def select_fields(self, fields: Fields, limit: int = 1, container: str = "") -> list[Row]:
+        validate_fields(fields)
+        if self.tree is None:
+            return []
+        if container:
+            return await asyncio.to_thread(self._select_contained_fields, fields, limit, container)
+        return await asyncio.to_thread(self._select_fields, fields, limit)
+
+    def _select_fields(self, fields: Fields, limit: int) -> list[Row]:
+        columns, counts, self.timings = {}, {}, {}
+        for name, (selector, type) in fields.items():
+            start_time = time.perf_counter()
+            elements = compile_selector(selector)(self.tree)
+            columns[name] = [element_value(element, type) for element in elements[:limit]]
+            counts[name] = len(elements)
+            self.timings[name] = time.perf_counter() - start_time
+        return zip_rows(columns, counts, limit)
+
+    def _select_contained_fields(self, fields: Fields, limit: int, container: str) -> list[Row]:
+        containers = compile_selector(container)(self.tree)[:limit]
+        rows, self.timings = [{} for _ in containers], {}
+        for name, (selector, type) in fields.items():
+            start_time = time.perf_counter()
+            compiled = compile_selector(selector)
+            for row, root in zip(rows, containers):
+                elements = compiled(root)
+                row[name] = element_value(elements[0], type) if elements else None
+            self.timings[name] = time.perf_counter() - start_time
+        return rows
+
+
+def common_ancestor(elements: list[lxml.html.HtmlElement]) -> lxml.html.HtmlElement:
+    """
+    Takes a non-empty list of elements of one tree.
+    Returns their lowest common ancestor, which may be one of the elements.
+    """
+    path = [elements[0], *elements[0].iterancestors()]
+    for element in elements[1:]:
+        ancestors = {element, *element.iterancestors()}
+        while path[0] not in ancestors:
+            path.pop(0)
+    return path[0]
+
+
+def trim_to_listing(html_content: str, fields: Fields, limit: int = 1, container: str = "") -> str:
+    """
+    Takes a html string, a dict of field names and (selector, type) pairs, a row limit
+    and the selector of the element containing each result, if the distributor has one.
+
+    Returns the html of the product listing region only: the lowest element containing the first `limit`
+    containers, or the first `limit` elements of every field without a container selector, without its children
+    after the last selected element, e.g. further products, and its ancestors without their other children,
+    so that the selectors still find the same fields in the trimmed html.
+    If nothing is found, returns the html unchanged.
+    """
+    tree = parse_html(html_content)
+    if tree is None:
+        return html_content
+    selectors = [container] if container else [selector for selector, _ in fields.values()]
+    elements = [element for selector in selectors for element in compile_selector(selector)(tree)[:limit]]
+    if not elements:
+        return html_content
+
+    node = common_ancestor(elements)
+    selected = set(elements)
+    children = list(node)
+    last = max(
+        (index for index, child in enumerate(children) if any(element in selected for element in child.iter())),
+        default=len(children),
+    )
+    for child in children[last + 1 :]:
+        node.remove(child)
+    while (parent := node.getparent()) is not None:
+        for sibling in list(parent):
+            if sibling is not node:
+                parent.remove(sibling)
+        parent.text = None
+        node = parent
+    return lxml.html.tostring(tree, encoding="unicode")
+
+
+def element_value(element: lxml.html.HtmlElement, type: str) -> str | None:
+    """
+    Takes a lxml element and the type of the value to select.
+    Returns the trimmed text of the element or the value of the attribute.
+    """
+    if type == "text":
+        return element.text_content().strip()
+    return element.get(type)
+
 
 class PlaywrightParser(AbstractParser):
+    """
+    Selects elements with the DOM of a Chromium page.
+
+    If a page is given, the elements are selected on it as it is, e.g. on a search results page
+    that has just been loaded. Otherwise the loaded content is parsed on a new page of a context
+    borrowed from the shared browser pool.
+    """
+
     _name = "playwright"
 
+    def __init__(self, page: Page | None = None, pool: BrowserPool | None = None) -> None:
+        self.page = page
+        self.pool = pool
+        self.html_content = ""
+
     async def __aenter__(self):
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch()
-        self.context = await self.browser.new_context()
+        if self.page is None and self.pool is None:
+            self.pool = get_browser_pool()
         return self
 
     async def __aexit__(self, *args: Any):
-        await self.context.close()
-        await self.browser.close()
-        await self.playwright.stop()
+        pass
 
     async def load_content(self, html_content: str) -> None:
+        if self.page is not None:
+            await self.page.set_content(html_content)
         self.html_content = html_content
 
     async def select_element(self, selector: str, type: str) -> str | None:
-        page = await self.context.new_page()
-        await page.set_content(self.html_content)
-        element = page.locator(selector).first
-        if element:
-            if type == "text":
-                return await element.inner_text()
-            elif type == "href":
-                return await element.get_attribute("href")
-            elif type == "src":
-                return await element.get_attribute("src")
-            else:
-                raise ValueError(f"Type {type} not supported")
+        rows = await self.select_fields({selector: (selector, type)})
+        return rows[0][selector] if rows else None
+
+    async def select_fields(self, fields: Fields, limit: int = 1, container: str = "") -> list[Row]:
+        """
+        Selects all fields in a single round trip to the browser.
+        """
+        validate_fields(fields)
+        if self.page is not None:
+            return await evaluate_fields(self.page, fields, limit, container)
+        return await self.pool.with_context(evaluate_content, self.html_content, fields, limit, container)
+
+
+async def evaluate_fields(page: Page, fields: Fields, limit: int = 1, container: str = "") -> list[Row]:
+    """
+    Takes a Page, a dict of field names and (selector, type) pairs, a row limit and an optional container selector.
+    Returns the rows selected on the page.
+    """
+    if container:
+        return await page.evaluate(SELECT_CONTAINED_FIELDS_SCRIPT, [fields, limit, container])
+    columns, counts = await page.evaluate(SELECT_FIELDS_SCRIPT, [fields, limit])
+    return zip_rows(columns, counts, limit)
+
+
+async def evaluate_content(
+    context: BrowserContext, html_content: str, fields: Fields, limit: int = 1, container: str = ""
+) -> list[Row]:
+    """
+    Takes a BrowserContext, a html string, a dict of field names and (selector, type) pairs, a row limit
+    and an optional container selector.
+    Loads the html string in a new page and returns the rows selected on it.
+    """
+    page = await context.new_page()
+    try:
+        await page.set_content(html_content)
+        return await evaluate_fields(page, fields, limit, container)
+    finally:
+        await page.close()
@@ -0,0 +1,87 @@
+"""Parsing of the price texts found in search results pages"""
+
+import re
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from pathlib import Path
+
+from decouple import config
+from django.conf import settings
+
+from search.models import PriceFormat
+
+PRICE_CACHE_SIZE = config("PRICE_CACHE_SIZE", cast=int, default=4096)
+# Price texts of real search results pages with their expected prices, checked by the tests and the benchmark
+PRICE_CORPUS = Path(settings.BASE_DIR) / "search" / "fixtures" / "prices.tsv"
+
+# Thousands separators of every format, besides its own: any space, including no-break spaces, and apostrophes
+SPACES = r"\s'"
+
+
+def price_pattern(thousands: str, decimal: str) -> re.Pattern:
+    """
+    Takes the character classes of the thousands and the decimal separators.
+
+    Returns a compiled pattern of a price, in which all thousands separators are the same character
+    and the integer part is either grouped by thousands or a plain run of digits.
+    """
+    return re.compile(
+        rf"(?P<sign>[-+])?"
+        rf"(?P<integer>\d{{1,3}}(?P<separator>[{thousands}])\d{{3}}(?:(?P=separator)\d{{3}})*(?!\d)|\d+)"
+        rf"(?:[{decimal}](?P<fraction>\d+))?"
+    )
+
+
+PRICE_PATTERNS = {
+    PriceFormat.AUTO: price_pattern(thousands=f".,{SPACES}", decimal=".,"),
+    PriceFormat.DOT_DECIMAL: price_pattern(thousands=f",{SPACES}", decimal="."),
+    PriceFormat.COMMA_DECIMAL: price_pattern(thousands=f".{SPACES}", decimal=","),
+}
+NON_DIGITS = re.compile(r"\D")
+PERCENT = re.compile(r"\s*%")
+CENTS = Decimal("0.01")
+
+
+@lru_cache(maxsize=PRICE_CACHE_SIZE)
+def parse_price(text: str, price_format: str = PriceFormat.AUTO) -> Decimal | None:
+    """
+    Takes a price text and the PriceFormat of its distributor.
+
+    Returns the first price found in the text, skipping percentages, e.g. of a discount badge.
+    In the auto format a separator followed by exactly three digits is a thousands separator.
+    If no price is found, returns None.
+    """
+    pattern = PRICE_PATTERNS[price_format]
+    match = pattern.search(text)
+    while match and PERCENT.match(text, match.end()):
+        match = pattern.search(text, match.end())
+    if not match:
+        return None
+    sign, integer, _, fraction = match.groups()
+    if match["separator"]:
+        integer = NON_DIGITS.sub("", integer)
+    return Decimal(f"{sign or ''}{integer}.{fraction}" if fraction else f"{sign or ''}{integer}")
+
+
+def net_prices(texts: list[str | None], vat: int, price_format: str = PriceFormat.AUTO) -> list[Decimal | None]:
+    """
+    Takes the price texts of one distributor's results, the VAT percentage included in them and their PriceFormat.
+
+    Returns the net prices rounded half up to cents, in the same order, with None for texts without a price.
+    """
+    divisor = 1 + Decimal(vat) / 100
+    prices = [parse_price(text, price_format) if text else None for text in texts]
+    return [(price / divisor).quantize(CENTS, ROUND_HALF_UP) if price is not None else None for price in prices]
+
+
+def load_corpus(path: Path = PRICE_CORPUS) -> list[tuple[str, str, Decimal | None]]:
+    """
+    Takes the path of a price corpus, with a price text, its price format and the expected price on each line.
+    Returns a list of (text, price format, expected price) tuples.
+    """
+    corpus = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line and not line.startswith("#"):
+            text, price_format, expected = line.split("\t")
+            corpus.append((text, price_format, Decimal(expected) if expected else None))
+    return corpus
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
 import logging
+import time
 from dataclasses import dataclass
 from decimal import Decimal
 from urllib.parse import urljoin
 
+from decouple import config
 from django.templatetags.static import static
+from playwright.async_api import Page
 
-from search.helpers import to_decimal
+from search.metrics import PARSE_SECONDS
+from search.prices import net_prices
 from search.models import DistributorSourceModel
-from search.parser import Parser
+from search.parser import Parser, PlaywrightParser
+from search.tracing import tracer
 
 DEFAULT_PICTURE = static("images/device.png")
+HTML_PARSER = config("HTML_PARSER", default="lxml")
 log = logging.getLogger(__name__)
 
 
@@ -30,7 +36,7 @@ class Product:
 
     @staticmethod
     async def from_html(
-        distributor: DistributorSourceModel, html_content: str, parser="bs4"
+        distributor: DistributorSourceModel, html_content: str, parser=HTML_PARSER
     ) -> Product | None:
         """
         Takes a DistributorSourceModel and a html string.
@@ -38,54 +44,132 @@ class Product:
         Parses the result and returns a Product object.
         If an error occurs or the product could not be parsed, returns None.
         """
-        if not distributor or not html_content:
-            return None
+        products = await Product.list_from_html(distributor, html_content, limit=1, parser=parser)
+        return products[0] if products else None
 
-        async with Parser(parser=parser) as parser:
-            await parser.load_content(html_content)
-            product_name = await parser.select_element(
-                selector=distributor.product_name_selector, type="text"
-            )
-            if product_name:
-                try:
-                    currency = distributor.currency
-                    vat = distributor.included_vat
+    @staticmethod
+    async def list_from_html(
+        distributor: DistributorSourceModel, html_content: str, limit: int = 1, parser=HTML_PARSER
+    ) -> list[Product]:
+        """
+        Takes a DistributorSourceModel, a html string and the maximum number of products.
 
-                    price = await parser.select_element(
-                        selector=distributor.product_price_selector, type="text"
-                    )
-                    price = to_decimal(price)
-                    price /= 1 + Decimal(vat / 100)
-                    price = round(price, 2)
+        Selects all product fields of the first `limit` results in one parser pass.
+        Returns the Product objects that could be parsed, in page order.
 
-                    url = await parser.select_element(selector=distributor.product_url_selector, type="href")
-                    url = url.replace(distributor.base_url, "")
-                    url = url[1:] if url.startswith("/") else url
-                    url = urljoin(distributor.base_url, url)
+        The time of loading the html, of each selector and of converting the rows is recorded,
+        and the parsing is traced in a span.
+        """
+        if not distributor or not html_content:
+            return []
 
-                    picture_url = await parser.select_element(
-                        selector=distributor.product_picture_url_selector, type="src"
-                    )
-                    if picture_url:
-                        picture_url = picture_url.replace(distributor.base_url, "")
-                        picture_url = picture_url[1:] if picture_url.startswith("/") else picture_url
-                        picture_url = urljoin(distributor.base_url, picture_url)
-                    else:
-                        picture_url = DEFAULT_PICTURE
-                    product = Product(
-                        name=product_name,
-                        price=price,
-                        currency=currency,
-                        vat=vat,
-                        url=url,
-                        picture_url=picture_url,
-                        shop=distributor.name,
-                        shop_icon=urljoin(distributor.base_url, "favicon.ico"),
+        attributes = {"distributor.name": distributor.name, "parse.parser": parser, "parse.length": len(html_content)}
+        with tracer.start_as_current_span("parse", attributes=attributes) as span:
+            async with Parser(parser=parser) as parser:
+                with PARSE_SECONDS.labels(distributor=distributor.name, stage="load").time():
+                    await parser.load_content(html_content)
+                try:
+                    rows = await parser.select_fields(
+                        distributor.product_selectors, limit=limit, container=distributor.product_container_selector
                     )
-                    return product
                 except Exception as ex:
                     log.debug(f"ERROR: {distributor.name}: {ex}")
-                    return None
+                    return []
+                for name, seconds in parser.timings.items():
+                    PARSE_SECONDS.labels(distributor=distributor.name, stage=f"select_{name}").observe(seconds)
+                    span.set_attribute(f"parse.select_{name}.seconds", seconds)
+            start_time = time.perf_counter()
+            products = Product.from_rows(distributor, rows)
+            PARSE_SECONDS.labels(distributor=distributor.name, stage="convert").observe(
+                time.perf_counter() - start_time
+            )
+            span.set_attribute("parse.products", len(products))
+        return products
+
+    @staticmethod
+    async def from_page(distributor: DistributorSourceModel, page: Page) -> Product | None:
+        """
+        Takes a DistributorSourceModel and a Page with its loaded search results.
+
+        Selects all product fields on the page in one round trip and returns a Product object.
+        If an error occurs or the product could not be parsed, returns None.
+        """
+        products = await Product.list_from_page(distributor, page, limit=1)
+        return products[0] if products else None
+
+    @staticmethod
+    async def list_from_page(distributor: DistributorSourceModel, page: Page, limit: int = 1) -> list[Product]:
+        """
+        Takes a DistributorSourceModel, a Page with its loaded search results and the maximum number of products.
+
+        Selects all product fields of the first `limit` results on the page in one round trip.
+        Returns the Product objects that could be parsed, in page order.
+        """
+        try:
+            async with PlaywrightParser(page=page) as parser:
+                rows = await parser.select_fields(
+                    distributor.product_selectors, limit=limit, container=distributor.product_container_selector
+                )
+        except Exception as ex:
+            log.debug(f"ERROR: {distributor.name}: {ex}")
+            return []
+        return Product.from_rows(distributor, rows)
+
+    @staticmethod
+    def from_rows(distributor: DistributorSourceModel, rows: list[dict[str, str | None]]) -> list[Product]:
+        """
+        Takes a DistributorSourceModel and the rows of selected product fields.
+
+        Normalizes the prices of all rows in one batch.
+        Returns the Product objects of the rows that could be converted.
+        """
+        if not rows:
+            log.debug(f"Product name not found for {distributor.name}")
+        prices = net_prices([fields["price"] for fields in rows], distributor.included_vat, distributor.price_format)
+        products = [Product.from_fields(distributor, fields, price) for fields, price in zip(rows, prices)]
+        return [product for product in products if product]
+
+    @staticmethod
+    def from_fields(
+        distributor: DistributorSourceModel, fields: dict[str, str | None], price: Decimal | None
+    ) -> Product | None:
+        """
+        Takes a DistributorSourceModel, a dict of the selected product fields and the normalized net price.
+
+        Converts the fields and returns a Product object.
+        If an error occurs or the product name or a positive price is missing, returns None.
+        """
+        product_name = fields["name"]
+        if not product_name:
+            log.debug(f"Product name not found for {distributor.name}")
+            return None
+        if price is None or price <= 0:
+            log.debug(f"ERROR: {distributor.name}: price not found in {fields['price']!r}")
+            return None
+        try:
+            url = fields["url"]
+            url = url.replace(distributor.base_url, "")
+            url = url[1:] if url.startswith("/") else url
+            url = urljoin(distributor.base_url, url)
+
+            picture_url = fields["picture_url"]
+            if picture_url:
+                picture_url = picture_url.replace(distributor.base_url, "")
+                picture_url = picture_url[1:] if picture_url.startswith("/") else picture_url
+                picture_url = urljoin(distributor.base_url, picture_url)
             else:
-                log.debug(f"Product name not found for {distributor.name}")
-                return None
+                picture_url = DEFAULT_PICTURE
+            product = Product(
+                name=product_name,
+                price=price,
+                currency=distributor.currency,
+                vat=distributor.included_vat,
+                url=url,
+                picture_url=picture_url,
+                shop=distributor.name,
+                shop_icon=distributor.favicon_url,
+            )
+            return product
+        except Exception as ex:
+            log.debug(f"ERROR: {distributor.name}: {ex}")
+            return None
@@ -0,0 +1,91 @@
+"""Log of the searched queries, read by the cache warmer"""
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from decouple import config
+from django.db.models import F
+from django.utils import timezone
+
+from search.models import QueryLogModel
+
+QUERY_LOG = config("QUERY_LOG", cast=bool, default=True)
+# Only queries searched within this many days count as popular
+QUERY_LOG_WINDOW_DAYS = config("QUERY_LOG_WINDOW_DAYS", cast=float, default=7)
+# Seconds a response waits for the query log write of its search
+QUERY_LOG_FLUSH_TIMEOUT = config("QUERY_LOG_FLUSH_TIMEOUT", cast=float, default=1)
+
+log = logging.getLogger(__name__)
+
+
+# Longer queries are not logged, as they would not fit the query log and are hardly popular
+QUERY_LOG_MAX_LENGTH = QueryLogModel._meta.get_field("query").max_length
+
+# Query log writes running in the background, referenced until they finish, as the event loop only keeps weak ones
+_pending: set[asyncio.Task] = set()
+
+
+async def log_query(query: str) -> None:
+    """
+    Takes a normalized search query and counts it in the query log.
+    Errors of the database are logged, not raised, as the query log must never fail a search.
+    """
+    if not QUERY_LOG or not query:
+        return
+    if len(query) > QUERY_LOG_MAX_LENGTH:
+        log.debug(f"Query of {len(query)} characters not logged")
+        return
+    try:
+        updated = await QueryLogModel.objects.filter(query=query).aupdate(
+            count=F("count") + 1, last_searched=timezone.now()
+        )
+        if not updated:
+            _, created = await QueryLogModel.objects.aget_or_create(query=query)
+            if not created:
+                # Another request logged the query first
+                await QueryLogModel.objects.filter(query=query).aupdate(count=F("count") + 1)
+    except Exception as ex:
+        log.warning(f"Query {query!r} not logged: {ex}")
+
+
+def record_query(query: str) -> None:
+    """
+    Takes a normalized search query and counts it in the query log in the background,
+    so that the database write does not delay the search.
+    The views await flush_query_log before responding, as under WSGI the event loop of the request
+    is closed with it and would destroy the pending write.
+    """
+    if not QUERY_LOG or not query:
+        return
+    task = asyncio.get_running_loop().create_task(log_query(query))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def flush_query_log(timeout: float | None = None) -> None:
+    """
+    Takes the maximum number of seconds to wait, or None to wait until they finish.
+
+    Waits for the query log writes started on the running event loop.
+    Writes still running after the timeout are left running in the background.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = [task for task in _pending if task.get_loop() is loop]
+    if not tasks:
+        return
+    _, running = await asyncio.wait(tasks, timeout=timeout)
+    if running:
+        log.debug(f"{len(running)} query log writes still running after {timeout} seconds")
+
+
+async def top_queries(limit: int) -> list[str]:
+    """
+    Takes a number of queries.
+
+    Returns the normalized queries searched most often, among those searched within QUERY_LOG_WINDOW_DAYS,
+    most searched first.
+    """
+    since = timezone.now() - timedelta(days=QUERY_LOG_WINDOW_DAYS)
+    queries = QueryLogModel.objects.filter(last_searched__gte=since).order_by("-count", "-last_searched")
+    return [query async for query in queries.values_list("query", flat=True)[:limit]]
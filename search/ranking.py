@@ -0,0 +1,68 @@
+"""Ranking of the products found by a search"""
+
+import heapq
+import math
+import re
+from itertools import count
+
+from decouple import config
+
+from search.product import Product
+
+# How much relevance a product gives up for being ten times as expensive as another
+RANKING_PRICE_WEIGHT = config("RANKING_PRICE_WEIGHT", cast=float, default=0.1)
+
+
+def query_terms(query: str) -> list[str]:
+    """
+    Takes a search query and returns its lowercased words.
+    """
+    return re.findall(r"\w+", query.lower())
+
+
+def relevance(product: Product, terms: list[str]) -> float:
+    """
+    Takes a Product and the words of the search query.
+    Returns the share of the words found as whole words in the product name, from 0 to 1.
+    """
+    if not terms:
+        return 1.0
+    words = set(query_terms(product.name))
+    return sum(term in words for term in terms) / len(terms)
+
+
+def score(product: Product, terms: list[str]) -> float:
+    """
+    Takes a Product and the words of the search query.
+
+    Returns the ranking score of the product: its relevance minus a penalty growing with the logarithm of its price,
+    so that among equally relevant products the cheapest ranks first. Prices below zero count as zero.
+    """
+    return relevance(product, terms) - RANKING_PRICE_WEIGHT * math.log10(max(float(product.price), 0) + 1)
+
+
+class TopProducts:
+    """
+    Keeps the `size` best scored products pushed into it in a min-heap,
+    so that memory stays bounded however many products a search finds.
+    """
+
+    def __init__(self, query: str, size: int) -> None:
+        self.terms = query_terms(query)
+        self.size = size
+        self._heap: list[tuple[float, int, Product]] = []
+        # Breaks score ties by arrival order, products themselves are not comparable
+        self._counter = count()
+
+    def push(self, product: Product) -> None:
+        item = (score(product, self.terms), -next(self._counter), product)
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    def results(self) -> list[Product]:
+        """
+        Returns the kept products, best scored first.
+        """
+        return [product for _, _, product in sorted(self._heap, reverse=True)]
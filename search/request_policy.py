@@ -0,0 +1,122 @@
+"""Blocking of the page requests that searches do not need"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from decouple import config
+from playwright.async_api import Route
+
+from search.metrics import BLOCKED_REQUESTS
+
+if TYPE_CHECKING:
+    from search.models import DistributorSourceModel
+
+REQUEST_BLOCKING = config("REQUEST_BLOCKING", cast=bool, default=True)
+
+# Analytics, advertising and session recording domains, blocked together with their subdomains
+TRACKER_DOMAINS = frozenset(
+    {
+        "google-analytics.com",
+        "googletagmanager.com",
+        "googleadservices.com",
+        "googlesyndication.com",
+        "doubleclick.net",
+        "adservice.google.com",
+        "connect.facebook.net",
+        "bat.bing.com",
+        "clarity.ms",
+        "hotjar.com",
+        "criteo.com",
+        "criteo.net",
+        "taboola.com",
+        "outbrain.com",
+        "adnxs.com",
+        "scorecardresearch.com",
+        "quantserve.com",
+        "analytics.tiktok.com",
+        "snap.licdn.com",
+        "ads.linkedin.com",
+        "mc.yandex.ru",
+        "newrelic.com",
+        "nr-data.net",
+        "segment.io",
+        "cdn.segment.com",
+        "mixpanel.com",
+        "fullstory.com",
+        "mouseflow.com",
+        "crazyegg.com",
+        "onetrust.com",
+        "cookielaw.org",
+        "cookiebot.com",
+    }
+)
+
+SEPARATORS = re.compile(r"[\s,]+")
+
+
+def split_setting(value: str) -> frozenset[str]:
+    """
+    Takes a comma or whitespace separated setting of a distributor and returns its lowercased items.
+    """
+    return frozenset(item for item in SEPARATORS.split(value.strip().lower()) if item)
+
+
+def domain_matches(host: str, domains: frozenset[str]) -> bool:
+    """
+    Takes a host name and a set of domains.
+    Returns True if the host is one of the domains or a subdomain of one of them.
+    """
+    parts = host.split(".")
+    return any(".".join(parts[index:]) in domains for index in range(len(parts)))
+
+
+@dataclass(frozen=True)
+class RequestPolicy:
+    """
+    Decides which requests of a distributor's search results page are aborted.
+
+    Requests to allowed domains always go through. Otherwise requests of the blocked resource types
+    and requests to the blocked domains, including the known trackers if enabled, are aborted.
+    """
+
+    distributor: str
+    resource_types: frozenset[str]
+    denied_domains: frozenset[str]
+    allowed_domains: frozenset[str]
+
+    @classmethod
+    def from_distributor(cls, distributor: DistributorSourceModel) -> RequestPolicy:
+        denied_domains = split_setting(distributor.blocked_domains)
+        if distributor.block_trackers:
+            denied_domains |= TRACKER_DOMAINS
+        return cls(
+            distributor=distributor.name,
+            resource_types=split_setting(distributor.blocked_resource_types),
+            denied_domains=denied_domains,
+            allowed_domains=split_setting(distributor.allowed_domains),
+        )
+
+    def blocks(self, url: str, resource_type: str) -> bool:
+        """
+        Takes the url and the Playwright resource type of a request.
+        Returns True if the request is to be aborted.
+        """
+        host = (urlsplit(url).hostname or "").lower()
+        if domain_matches(host, self.allowed_domains):
+            return False
+        return resource_type in self.resource_types or domain_matches(host, self.denied_domains)
+
+    async def handle_route(self, route: Route) -> None:
+        """
+        Takes an intercepted Playwright Route and aborts or continues it.
+        """
+        request = route.request
+        if self.blocks(request.url, request.resource_type):
+            BLOCKED_REQUESTS.labels(distributor=self.distributor, resource_type=request.resource_type).inc()
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
@@ -0,0 +1,85 @@
+"""Cache of complete search responses, keyed on the normalized query and the distributors version"""
+
+import hashlib
+from dataclasses import astuple, dataclass
+
+from decouple import config
+
+from search.cache_codec import get_encoded, set_encoded
+from search.distributors import active_distributors
+from search.metrics import SEARCH_RESPONSES
+from search.product import Product
+from search.result_cache import CACHE_FORMAT_VERSION
+from search.search import normalize_query
+
+# Seconds a complete search response is cached, 0 disables the cache
+SEARCH_RESPONSE_TIMEOUT = config("SEARCH_RESPONSE_TIMEOUT", cast=float, default=300)
+# Responses with fewer products than this are not cached, as a shop may have failed to answer
+SEARCH_RESPONSE_MIN_RESULTS = config("SEARCH_RESPONSE_MIN_RESULTS", cast=int, default=1)
+
+
+@dataclass(frozen=True)
+class SearchResponse:
+    """The ranked Products found for a normalized query, and the ETag of the page showing them."""
+
+    results: list[Product]
+    etag: str
+
+
+def response_key(query: str, version: str) -> str:
+    return f"response:{CACHE_FORMAT_VERSION}:{version}:{query}"
+
+
+def make_etag(query: str, version: str, results: list[Product]) -> str:
+    """
+    Takes a normalized query, the distributors version and the Products found.
+    Returns a quoted ETag that changes with any of them.
+    """
+    digest = hashlib.sha1(repr((query, version, [astuple(product) for product in results])).encode("utf-8"))
+    return f'"{digest.hexdigest()}"'
+
+
+async def distributors_version() -> str:
+    """
+    Returns the version of the in-process snapshot of the active distributors, to store a response under.
+    """
+    await active_distributors.get()
+    return active_distributors.version
+
+
+async def get_search_response(query: str) -> tuple[SearchResponse | None, str]:
+    """
+    Takes a search query.
+
+    Returns the cached SearchResponse of the normalized query for the version of the in-process snapshot
+    of the active distributors, or None if it is not in the cache, and that version, to store the response under.
+    """
+    version = await distributors_version()
+    if not SEARCH_RESPONSE_TIMEOUT:
+        return None, version
+    response = get_encoded(response_key(normalize_query(query), version))
+    SEARCH_RESPONSES.labels(outcome="hit" if response is not None else "miss").inc()
+    return response, version
+
+
+def set_search_response(
+    query: str, version: str, results: list[Product], timed_out: list[str]
+) -> SearchResponse | None:
+    """
+    Takes a search query, the distributors version read before the search, the Products found
+    and the names of the distributors that missed the search deadline.
+
+    Stores the SearchResponse for SEARCH_RESPONSE_TIMEOUT seconds, unless it is partial, i.e. distributors
+    missed the deadline, or it has fewer than SEARCH_RESPONSE_MIN_RESULTS Products.
+    Returns the stored SearchResponse, or None if it was not stored.
+    """
+    if not SEARCH_RESPONSE_TIMEOUT:
+        return None
+    if timed_out or len(results) < SEARCH_RESPONSE_MIN_RESULTS:
+        SEARCH_RESPONSES.labels(outcome="partial" if timed_out else "too_few").inc()
+        return None
+    query = normalize_query(query)
+    response = SearchResponse(results, make_etag(query, version, results))
+    if not set_encoded(response_key(query, version), response, SEARCH_RESPONSE_TIMEOUT, "all", kind="response"):
+        return None
+    return response
@@ -0,0 +1,195 @@
+"""Cache of parsed search results per distributor and query"""
+
+import hashlib
+import time
+from dataclasses import astuple
+from enum import Enum
+
+from decouple import config
+from django.core.cache import cache
+
+from search.cache_codec import get_encoded, set_encoded
+from search.models import DistributorSourceModel
+from search.parser import trim_to_listing
+from search.product import Product
+from search.tracing import tracer
+
+CACHE_TIMEOUT = config("CACHE_TIMEOUT", cast=float, default=60 * 60)
+CACHE_HARD_TIMEOUT = config("CACHE_HARD_TIMEOUT", cast=float, default=24 * 60 * 60)
+NEGATIVE_CACHE_TIMEOUT = config("NEGATIVE_CACHE_TIMEOUT", cast=float, default=CACHE_TIMEOUT / 10)
+CACHE_RAW_HTML = config("CACHE_RAW_HTML", cast=bool, default=False)
+REFRESH_LOCK_TIMEOUT = config("REFRESH_LOCK_TIMEOUT", cast=float, default=60)
+FETCH_LEASE_TIMEOUT = config("FETCH_LEASE_TIMEOUT", cast=float, default=30)
+
+# Bump when the layout of the cached values changes
+CACHE_FORMAT_VERSION = 5
+
+# A cached negative result, i.e. the distributor has no product for the query
+NO_PRODUCTS = ()
+
+# Fields that change the product parsed from the same page
+SELECTOR_FIELDS = (
+    "base_url",
+    "search_string",
+    "currency",
+    "included_vat",
+    "price_format",
+    "product_name_selector",
+    "product_url_selector",
+    "product_picture_url_selector",
+    "product_price_selector",
+    "product_container_selector",
+)
+
+
+class CacheStatus(Enum):
+    MISS = "miss"
+    FRESH = "fresh"
+    STALE = "stale"
+
+
+def cache_timeouts(distributor: DistributorSourceModel) -> tuple[float, float]:
+    """
+    Takes a DistributorSourceModel.
+
+    Returns its soft timeout, after which a cached result is stale and gets refreshed in the background,
+    and its hard timeout, after which the result is evicted from the cache.
+    """
+    soft_timeout = distributor.cache_soft_timeout
+    hard_timeout = distributor.cache_hard_timeout
+    soft_timeout = CACHE_TIMEOUT if soft_timeout is None else soft_timeout
+    hard_timeout = CACHE_HARD_TIMEOUT if hard_timeout is None else hard_timeout
+    return soft_timeout, max(soft_timeout, hard_timeout)
+
+
+def selector_version(distributor: DistributorSourceModel) -> str:
+    """
+    Takes a DistributorSourceModel.
+
+    Returns a short hash of the fields used to parse its pages,
+    so that cached results are dropped when a selector is edited.
+    """
+    fields = "\0".join(str(getattr(distributor, name)) for name in SELECTOR_FIELDS)
+    return hashlib.blake2b(fields.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def result_key(distributor: DistributorSourceModel, query: str) -> str:
+    return f"result:{CACHE_FORMAT_VERSION}:{distributor.pk}:{selector_version(distributor)}:{query}"
+
+
+def html_key(distributor: DistributorSourceModel, query: str) -> str:
+    return f"html:{CACHE_FORMAT_VERSION}:{distributor.pk}:{query}"
+
+
+def refresh_lock_key(distributor: DistributorSourceModel, query: str) -> str:
+    return f"refresh:{result_key(distributor, query)}"
+
+
+def fetch_lease_key(url: str) -> str:
+    return f"lease:{url}"
+
+
+def get_cached_result(distributor: DistributorSourceModel, query: str) -> tuple[CacheStatus, list[Product]]:
+    """
+    Takes a DistributorSourceModel and a normalized search query.
+
+    Returns a tuple of the CacheStatus of the result and the cached Products.
+    The list is empty on a cache miss or for a cached negative result.
+    """
+    ttl, products = get_cached_result_ttl(distributor, query)
+    if ttl is None:
+        return CacheStatus.MISS, products
+    return (CacheStatus.FRESH if ttl > 0 else CacheStatus.STALE), products
+
+
+def get_cached_result_ttl(distributor: DistributorSourceModel, query: str) -> tuple[float | None, list[Product]]:
+    """
+    Takes a DistributorSourceModel and a normalized search query.
+
+    Returns a tuple of the seconds for which the cached result stays fresh, negative once it is stale
+    or None if it is not in the cache, and the cached Products, read from the cache at once.
+    """
+    key = result_key(distributor, query)
+    with tracer.start_as_current_span("cache.get", attributes={"cache.key": key}) as span:
+        value = get_encoded(key)
+        if value is None:
+            ttl, products = None, []
+            status = CacheStatus.MISS
+        else:
+            ttl, products = value[0] - time.time(), value[1]
+            status = CacheStatus.FRESH if ttl > 0 else CacheStatus.STALE
+        span.set_attribute("cache.status", status.value)
+    return ttl, [Product(*product) for product in products]
+
+
+def set_cached_result(
+    distributor: DistributorSourceModel, query: str, products: list[Product], html_content: str = ""
+) -> None:
+    """
+    Takes a DistributorSourceModel, a normalized search query, the list of found Products and the page html.
+
+    Stores the Products in the cache until the distributor's hard timeout, marked fresh until its soft timeout.
+    A negative result is stored for a much shorter time and is never served stale.
+    The page html is stored only if CACHE_RAW_HTML is enabled, for debugging, trimmed to the region
+    listing the found Products.
+    Values are stored compressed and only up to the entry size limit of the cache codec.
+    """
+    if products:
+        soft_timeout, timeout = cache_timeouts(distributor)
+        value = (time.time() + soft_timeout, tuple(astuple(product) for product in products))
+    else:
+        timeout = NEGATIVE_CACHE_TIMEOUT
+        value = (time.time() + timeout, NO_PRODUCTS)
+    key = result_key(distributor, query)
+    with tracer.start_as_current_span("cache.set", attributes={"cache.key": key, "cache.products": len(products)}):
+        set_encoded(key, value, timeout, distributor.name, kind="result")
+
+        if CACHE_RAW_HTML and html_content:
+            html = trim_to_listing(
+                html_content,
+                distributor.product_selectors,
+                limit=max(len(products), 1),
+                container=distributor.product_container_selector,
+            )
+            set_encoded(html_key(distributor, query), html, timeout, distributor.name, kind="html")
+
+
+def get_cached_html(distributor: DistributorSourceModel, query: str) -> str | None:
+    """
+    Takes a DistributorSourceModel and a normalized search query.
+
+    Returns the page html stored for debugging, or None if it is not in the cache.
+    """
+    return get_encoded(html_key(distributor, query))
+
+
+def acquire_refresh_lock(distributor: DistributorSourceModel, query: str) -> bool:
+    """
+    Takes a DistributorSourceModel and a normalized search query.
+
+    Returns True if the caller may refresh the result. The lock is an atomic cache add,
+    so across all workers sharing the cache only one refresh runs at a time.
+    """
+    return cache.add(refresh_lock_key(distributor, query), True, timeout=REFRESH_LOCK_TIMEOUT)
+
+
+def release_refresh_lock(distributor: DistributorSourceModel, query: str) -> None:
+    cache.delete(refresh_lock_key(distributor, query))
+
+
+def acquire_fetch_lease(url: str) -> bool:
+    """
+    Takes an url.
+
+    Returns True if the caller may fetch the url. Workers that do not get the lease
+    wait for the leaseholder to store its result in the cache instead of fetching the url themselves.
+    """
+    return cache.add(fetch_lease_key(url), True, timeout=FETCH_LEASE_TIMEOUT)
+
+
+def fetch_lease_exists(url: str) -> bool:
+    return cache.get(fetch_lease_key(url)) is not None
+
+
+def release_fetch_lease(url: str) -> None:
+    cache.delete(fetch_lease_key(url))
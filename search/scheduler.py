@@ -0,0 +1,156 @@
+"""Admission control for fetches on the browser pool event loop"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from decouple import config
+
+from search.metrics import SCHEDULER_ACTIVE_PAGES, SCHEDULER_QUEUE_DEPTH, SCHEDULER_REJECTED, SCHEDULER_WAIT_SECONDS
+from search.models import DistributorSourceModel
+
+SCHEDULER_MAX_PAGES = config("SCHEDULER_MAX_PAGES", cast=int, default=16)
+SCHEDULER_MAX_QUEUE = config("SCHEDULER_MAX_QUEUE", cast=int, default=100)
+SCHEDULER_QUEUE_TIMEOUT = config("SCHEDULER_QUEUE_TIMEOUT", cast=float, default=5)
+
+log = logging.getLogger(__name__)
+
+
+class AdmissionError(Exception):
+    """Raised when a fetch cannot get a scheduler slot."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DistributorLimits:
+    """Concurrency and rate limits of one distributor."""
+
+    def __init__(self, concurrency_limit: int, rate_limit: float | None) -> None:
+        self.concurrency_limit = concurrency_limit
+        self.rate_limit = rate_limit
+        self.semaphore = asyncio.Semaphore(max(concurrency_limit, 1))
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+
+
+class Scheduler:
+    """
+    Admits fetches on the browser pool event loop.
+
+    A fetch waits for a slot of its distributor, for the distributor's rate limit
+    and, if it loads a browser page, for one of the `max_pages` global page slots.
+    At most `max_queue` fetches wait at a time, each for at most `queue_timeout` seconds.
+    Fetches that cannot be admitted raise AdmissionError.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = SCHEDULER_MAX_PAGES,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        queue_timeout: float = SCHEDULER_QUEUE_TIMEOUT,
+    ) -> None:
+        self.max_pages = max_pages
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.active_pages = 0
+        self._pages = asyncio.Semaphore(max_pages)
+        self._limits: dict[int, DistributorLimits] = {}
+
+    def limits(self, distributor: DistributorSourceModel) -> DistributorLimits:
+        """
+        Returns the limits of the distributor, replacing them if they were edited since.
+        """
+        limits = self._limits.get(distributor.pk)
+        if (
+            limits is None
+            or limits.concurrency_limit != distributor.concurrency_limit
+            or limits.rate_limit != distributor.rate_limit
+        ):
+            limits = DistributorLimits(distributor.concurrency_limit, distributor.rate_limit)
+            self._limits[distributor.pk] = limits
+        return limits
+
+    @asynccontextmanager
+    async def slot(self, distributor: DistributorSourceModel, page: bool) -> AsyncIterator[None]:
+        """
+        Takes a DistributorSourceModel and whether the fetch loads a browser page.
+
+        Waits for a slot and holds it while the fetch runs.
+        Raises AdmissionError if the wait queue is full or the slot is not free within the queue timeout.
+        """
+        if self.waiting >= self.max_queue:
+            self._reject(distributor, "queue_full")
+
+        limits = self.limits(distributor)
+        acquired: list[asyncio.Semaphore] = []
+
+        async def acquire() -> None:
+            await limits.semaphore.acquire()
+            acquired.append(limits.semaphore)
+            if limits.rate_limiter:
+                await limits.rate_limiter.acquire()
+            if page:
+                await self._pages.acquire()
+                acquired.append(self._pages)
+
+        self.waiting += 1
+        SCHEDULER_QUEUE_DEPTH.inc()
+        start_time = time.monotonic()
+        outcome = "cancelled"
+        try:
+            await asyncio.wait_for(acquire(), timeout=self.queue_timeout)
+            outcome = "admitted"
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            for semaphore in acquired:
+                semaphore.release()
+            self._reject(distributor, "timeout")
+        finally:
+            self.waiting -= 1
+            SCHEDULER_QUEUE_DEPTH.dec()
+            SCHEDULER_WAIT_SECONDS.labels(distributor=distributor.name, outcome=outcome).observe(
+                time.monotonic() - start_time
+            )
+
+        if page:
+            self.active_pages += 1
+            SCHEDULER_ACTIVE_PAGES.inc()
+        try:
+            yield
+        finally:
+            if page:
+                self.active_pages -= 1
+                SCHEDULER_ACTIVE_PAGES.dec()
+            for semaphore in acquired:
+                semaphore.release()
+
+    def _reject(self, distributor: DistributorSourceModel, reason: str) -> None:
+        log.debug(f"Fetch for {distributor.name} not admitted: {reason}")
+        SCHEDULER_REJECTED.labels(distributor=distributor.name, reason=reason).inc()
+        raise AdmissionError(reason)
@@ -1,100 +1,421 @@
 import asyncio
 import logging
-from urllib.parse import quote_plus, urljoin
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator
+from urllib.parse import quote_plus
 
-from asgiref.sync import sync_to_async
 from decouple import config
-from django.core.cache import cache
-from playwright.async_api import Browser, async_playwright
+from opentelemetry import trace
+from opentelemetry.trace import Span
+from playwright.async_api import BrowserContext
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
-from search.models import DistributorSourceModel
+from search.browser import BrowserPool, get_browser_pool
+from search.circuit_breaker import (
+    CircuitOpenError,
+    adaptive_timeout,
+    check_circuit,
+    record_failure,
+    record_latency,
+    record_success,
+)
+from search.distributors import active_distributors
+from search.http_client import HTTP_TIMEOUT, fetch_http
+from search.jobs import SCRAPER_JOB_TIMEOUT, FetchJob, JobQueue, get_job_queue
+from search.metrics import (
+    FETCH_RESULT_SECONDS,
+    FETCH_RESULTS,
+    FETCH_STAGE_SECONDS,
+    SEARCH_DEADLINE_MISSED,
+    SEARCH_SECONDS,
+)
+from search.models import DistributorSourceModel, FetchStrategy
 from search.product import Product
+from search.query_log import record_query
+from search.ranking import TopProducts
+from search.request_policy import REQUEST_BLOCKING
+from search.result_cache import (
+    CACHE_RAW_HTML,
+    FETCH_LEASE_TIMEOUT,
+    CacheStatus,
+    acquire_fetch_lease,
+    acquire_refresh_lock,
+    fetch_lease_exists,
+    get_cached_result,
+    release_fetch_lease,
+    release_refresh_lock,
+    set_cached_result,
+)
+from search.scheduler import AdmissionError
+from search.singleflight import SingleFlight
+from search.tracing import tracer
 
-CACHE_TIMEOUT = config("CACHE_TIMEOUT", cast=float, default=60 * 60)
 BROWSER_TIMEOUT = config("BROWSER_TIMEOUT", cast=float, default=15_000)
+FETCH_POLL_INTERVAL = config("FETCH_POLL_INTERVAL", cast=float, default=0.25)
+PRODUCTS_PER_DISTRIBUTOR = config("PRODUCTS_PER_DISTRIBUTOR", cast=int, default=5)
+SEARCH_MAX_RESULTS = config("SEARCH_MAX_RESULTS", cast=int, default=50)
+# Seconds after which a search returns the products found so far
+SEARCH_DEADLINE = config("SEARCH_DEADLINE", cast=float, default=10)
+
+# Identical concurrent fetches in this process share one call
+in_flight = SingleFlight()
 
 log = logging.getLogger(__name__)
 
 
-async def perform_search(query: str) -> list[Product | None]:
+async def perform_search(query: str, timed_out: list[str] | None = None) -> list[Product]:
     """
     Takes a search query, fetches the urls of all active distributors and performs the search.
+    Takes an optional list, to which the names of the distributors that missed the search deadline are added.
 
-    Returns a list of Product objects, sorted by price.
+    Returns the SEARCH_MAX_RESULTS best ranked Product objects, by relevance to the query and price.
     If an error occurs, returns an empty list.
     """
-    distributors = await get_active_distributors()
-    query = quote_plus(query.encode("utf-8").strip().lower())
+    results = TopProducts(query, size=SEARCH_MAX_RESULTS)
+    async for product in iter_search(query, timed_out):
+        results.push(product)
+    return results.results()
+
+
+async def iter_search(query: str, timed_out: list[str] | None = None) -> AsyncIterator[Product]:
+    """
+    Takes a search query, fetches the urls of all active distributors and performs the search.
+    Takes an optional list, to which the names of the distributors that missed the search deadline are added.
+
+    Yields the Products of each distributor as soon as it has been searched, fastest distributor first.
+    Stops after SEARCH_DEADLINE seconds. The fetches of the distributors that missed the deadline
+    keep running on the browser pool and store their results in the cache for the next search.
+    The search time is recorded by outcome: complete, deadline, or aborted if the search was not iterated
+    to its end. The search is traced in a span, parent of the spans of the fetches.
+    """
+    start_time = time.monotonic()
+    outcome = "aborted"
+    # The span is current only while the fetches are started, as a generator may resume in another context
+    span = tracer.start_span("search", attributes={"search.query": query})
+    with trace.use_span(span):
+        distributors = await get_active_distributors()
+        query = normalize_query(query)
+        record_query(query)
+        deadline = time.monotonic() + SEARCH_DEADLINE
+
+        pool = get_browser_pool()
+        pending = {
+            asyncio.ensure_future(fetch_result(pool, distributor, query)): distributor for distributor in distributors
+        }
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for task in done:
+                del pending[task]
+                for product in task.result():
+                    yield product
+
+        if pending:
+            names = [distributor.name for distributor in pending.values()]
+            log.debug(f"Search deadline expired for: {query}, timed out: {', '.join(names)}")
+            if timed_out is not None:
+                timed_out.extend(names)
+            for name in names:
+                SEARCH_DEADLINE_MISSED.labels(distributor=name).inc()
+            outcome = "deadline"
+        else:
+            outcome = "complete"
+    finally:
+        # Fetches are shared through the browser pool, cancelling a task only stops waiting for its result
+        for task in pending:
+            task.cancel()
+        SEARCH_SECONDS.labels(outcome=outcome).observe(time.monotonic() - start_time)
+        span.set_attribute("search.outcome", outcome)
+        span.end()
+
+
+def normalize_query(query: str) -> str:
+    """
+    Takes a search query and returns it stripped, lowercased and quoted for use in an url.
+    """
+    return quote_plus(query.encode("utf-8").strip().lower())
+
+
+async def get_active_distributors() -> list[DistributorSourceModel]:
+    """
+    Returns a list of all active DistributorSourceModels, from the in-process snapshot.
+    """
+    with tracer.start_as_current_span("distributors.get"):
+        return await active_distributors.get()
+
+
+async def fetch_result(pool: BrowserPool, distributor: DistributorSourceModel, query) -> list[Product]:
+    """
+    Takes a BrowserPool, a DistributorSourceModel and a normalized search query.
+
+    Checks for the parsed result of the distributor and query in the cache.
+    If the result is not in the cache, fetches and caches it.
+    If the cached result is stale, returns it immediately and refreshes it in the background.
+    With a job queue configured, the fetches are queued for the scraper workers instead.
+
+    Returns up to PRODUCTS_PER_DISTRIBUTOR Product objects, in the distributor's order.
+    If the price selector does not appear, returns an empty list.
+    If an exception occurs, returns an empty list.
+
+    The time to get the result is recorded by cache outcome: fresh, stale, or miss if it was fetched,
+    and traced in a span.
+    """
+    start_time = time.monotonic()
+    with tracer.start_as_current_span("fetch_result", attributes={"distributor.name": distributor.name}) as span:
+        # Checks if the result is in the cache. Cached results are already parsed.
+        status, products = get_cached_result(distributor, query)
+        FETCH_STAGE_SECONDS.labels(distributor=distributor.name, stage="cache_lookup").observe(
+            time.monotonic() - start_time
+        )
+        job_queue = get_job_queue()
+        if status is CacheStatus.FRESH:
+            log.debug(f"Using cached result for {distributor.name}: {query}, found: {len(products)}")
+        elif status is CacheStatus.STALE and products:
+            # Stale products are served as they are, while one worker refreshes them in the background.
+            if acquire_refresh_lock(distributor, query):
+                log.debug(f"Refreshing stale result for {distributor.name}: {query}")
+                if job_queue is not None:
+                    job_queue.put(FetchJob(distributor.pk, query, refresh=True))
+                else:
+                    pool.spawn(refresh_result, pool, distributor, query)
+        else:
+            status = CacheStatus.MISS
+            if job_queue is not None:
+                products = await wait_for_job(job_queue, distributor, query)
+            else:
+                products = await update_result(pool, distributor, query)
+        span.set_attributes({"cache.outcome": status.value, "search.products": len(products)})
+
+    FETCH_RESULTS.labels(distributor=distributor.name, cache=status.value).inc()
+    FETCH_RESULT_SECONDS.labels(distributor=distributor.name, cache=status.value).observe(
+        time.monotonic() - start_time
+    )
+    return products
+
+
+async def wait_for_job(job_queue: JobQueue, distributor: DistributorSourceModel, query: str) -> list[Product]:
+    """
+    Takes a JobQueue, a DistributorSourceModel and a normalized search query.
+
+    Queues a fetch of the result for the scraper workers, unless it is queued already,
+    and polls the cache until the result is fresh, the job is done or SCRAPER_JOB_TIMEOUT expires.
+    Returns the cached Products.
+    """
+    job = FetchJob(distributor.pk, query)
+    status, products = CacheStatus.MISS, []
+    with tracer.start_as_current_span("job.wait", attributes={"distributor.name": distributor.name}):
+        job_queue.put(job)
+        deadline = time.monotonic() + SCRAPER_JOB_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(FETCH_POLL_INTERVAL)
+            status, products = get_cached_result(distributor, query)
+            if status is CacheStatus.FRESH or not job_queue.pending(job):
+                break
+    log.debug(f"Waited for fetch job of {distributor.name}: {query}, status: {status.value}")
+    return products
 
-    async with async_playwright() as playwright:
-        browser = await playwright.chromium.launch()
-        tasks = [fetch_result(browser, distributor, query) for distributor in distributors]
-        results = await asyncio.gather(*tasks)
-        await browser.close()
 
-    # Remove None values and sort by price
-    results = filter(None, results)
-    results = sorted(results, key=lambda product: product.price) if results else []
-    return results
+async def refresh_result(pool: BrowserPool, distributor: DistributorSourceModel, query: str) -> None:
+    """
+    Takes a BrowserPool, a DistributorSourceModel and a normalized search query.
+
+    Updates the cached result and releases the refresh lock afterwards.
+    If no product could be fetched, the stale products are kept until its hard timeout
+    and the refresh lock is left to expire, so that the next refresh is delayed.
+    """
+    if await update_result(pool, distributor, query, store_negative=False):
+        release_refresh_lock(distributor, query)
+
 
+async def update_result(
+    pool: BrowserPool, distributor: DistributorSourceModel, query: str, store_negative: bool = True
+) -> list[Product]:
+    """
+    Takes a BrowserPool, a DistributorSourceModel, a normalized search query
+    and whether to cache a negative result.
+
+    Fetches the url and stores the result in the cache. Returns the result.
 
-@sync_to_async
-def get_active_distributors() -> list[DistributorSourceModel | None]:
+    Concurrent updates of the same url share one fetch: within the process through a shared future,
+    across workers through a fetch lease in the cache.
     """
-    Returns a list of all active DistributorSourceModels.
+    url = distributor.search_url(query)
+    return await in_flight.run(url, pool, fetch_and_store, pool, distributor, query, url, store_negative)
+
+
+async def fetch_and_store(
+    pool: BrowserPool, distributor: DistributorSourceModel, query: str, url: str, store_negative: bool
+) -> list[Product]:
     """
-    return list(DistributorSourceModel.objects.filter(active=True))
+    Takes a BrowserPool, a DistributorSourceModel, a normalized search query, its url
+    and whether to cache a negative result.
 
+    If another worker holds the fetch lease of the url, waits for its result.
+    Otherwise fetches the url according to the distributor's fetch strategy and parses the result.
+    The "auto" strategy falls back to the browser only if the plain HTTP response has no product.
 
-async def fetch_result(browser: Browser, distributor: DistributorSourceModel, query) -> Product | None:
+    Stores the result in the cache and returns it. A failed fetch is not stored, so that the next search
+    fetches the url again instead of getting a negative result.
+    If the circuit of the distributor is open or the scheduler does not admit the fetch,
+    returns the stale cached products, if there are any.
     """
-    Takes a Browser, a DistributorSourceModel and a search query.
+    # The cache calls block, so they run in a thread to keep the pool loop free for other fetches.
+    leased = await asyncio.to_thread(acquire_fetch_lease, url)
+    if not leased:
+        status, products = await wait_for_result(distributor, query, url)
+        if status is CacheStatus.FRESH:
+            return products
+        leased = await asyncio.to_thread(acquire_fetch_lease, url)
 
-    Checks for the given url in the cache.
-    If the url is not in the cache, fetches the url and stores the result in the cache.
+    try:
+        await asyncio.to_thread(check_circuit, distributor)
+
+        # Fetches the url and parses the results into Product objects.
+        html_content, products = None, []
+        if distributor.fetch_strategy in (FetchStrategy.HTTP, FetchStrategy.AUTO):
+            html_content, products = await fetch_and_parse(pool, distributor, url, use_browser=False)
+        if not products and distributor.fetch_strategy in (FetchStrategy.BROWSER, FetchStrategy.AUTO):
+            html_content, products = await fetch_and_parse(pool, distributor, url, use_browser=True)
+
+        # If products could be parsed, stores them in the cache,
+        # otherwise stores a negative result in the cache for a much shorter time, unless the fetch failed.
+        if products or (store_negative and html_content is not None):
+            await asyncio.to_thread(set_cached_result, distributor, query, products, html_content)
+    except (CircuitOpenError, AdmissionError):
+        _, products = await asyncio.to_thread(get_cached_result, distributor, query)
+    finally:
+        if leased:
+            await asyncio.to_thread(release_fetch_lease, url)
+
+    return products
 
-    Returns a Product object if the product could be parsed.
-    If the price selector does not appear, returns None.
-    If an exception occurs, returns None.
+
+async def wait_for_result(
+    distributor: DistributorSourceModel, query: str, url: str
+) -> tuple[CacheStatus, list[Product]]:
+    """
+    Takes a DistributorSourceModel, a normalized search query and its url.
+
+    Polls the cache until a fresh result appears, the fetch lease of the url is released
+    or FETCH_LEASE_TIMEOUT expires. Returns the last CacheStatus and Products found.
     """
-    url = urljoin(distributor.base_url, distributor.search_string.replace("%s", query))
-    price_selector = distributor.product_price_selector
+    deadline = time.monotonic() + FETCH_LEASE_TIMEOUT
+    status, products = CacheStatus.MISS, []
+    with tracer.start_as_current_span("lease.wait", attributes={"distributor.name": distributor.name}):
+        while time.monotonic() < deadline:
+            await asyncio.sleep(FETCH_POLL_INTERVAL)
+            status, products = await asyncio.to_thread(get_cached_result, distributor, query)
+            if status is CacheStatus.FRESH or not await asyncio.to_thread(fetch_lease_exists, url):
+                break
+    log.debug(f"Waited for result of url: {url}, status: {status.value}")
+    return status, products
 
-    # Checks if the url is in the cache.
-    cached_content = cache.get(url, None)
 
-    # If the url is in the cache, parses the result.
-    if cached_content:
-        log.debug(f"Using cached url: {url}, length: {len(cached_content)}")
-        return await Product.from_html(distributor=distributor, html_content=cached_content)
+async def fetch_and_parse(
+    pool: BrowserPool, distributor: DistributorSourceModel, url: str, use_browser: bool
+) -> tuple[str | None, list[Product]]:
+    """
+    Takes a BrowserPool, a DistributorSourceModel, an url and whether to load the url in a browser.
 
-    # If the url is not in the cache, fetches the url.
-    context = await browser.new_context()
+    Fetches the url with a browser context or the HTTP client borrowed from the pool,
+    once the pool scheduler admits the fetch.
+    The circuit breaker and the latencies are read and written in a worker thread,
+    as they go to the shared cache and would otherwise block the pool loop.
+    Returns the html content and the parsed Product objects.
+    If an exception occurs, records a failure of the distributor and returns None and an empty list.
+    Raises AdmissionError if the scheduler does not admit the fetch.
+    """
+    async with pool.scheduler.slot(distributor, page=use_browser):
+        try:
+            if use_browser:
+                # The products are selected on the loaded page, the html content is only needed for the cache
+                html_content, products = await pool.with_context(fetch_page, url, distributor)
+                await asyncio.to_thread(record_success, distributor)
+                return html_content, products
+            timeout = await asyncio.to_thread(adaptive_timeout, distributor, "http", HTTP_TIMEOUT)
+            start_time = time.monotonic()
+            with fetch_stage(distributor, "http") as span:
+                span.set_attribute("url.full", url)
+                html_content = await pool.with_http_client(fetch_http, url, timeout)
+            await asyncio.to_thread(record_latency, distributor, "http", time.monotonic() - start_time)
+            await asyncio.to_thread(record_success, distributor)
+            log.debug(f"Fetched url: {url}, length: {len(html_content)}, browser: {use_browser}")
+        except Exception as ex:
+            log.debug(f"Error fetching url: {url}")
+            log.debug(ex)
+            await asyncio.to_thread(record_failure, distributor)
+            return None, []
+
+    if not html_content:
+        return "", []
+    products = await Product.list_from_html(distributor, html_content, limit=PRODUCTS_PER_DISTRIBUTOR)
+    return html_content, products
+
+
+async def fetch_page(
+    context: BrowserContext, url: str, distributor: DistributorSourceModel
+) -> tuple[str, list[Product]]:
+    """
+    Takes a BrowserContext, an url and a DistributorSourceModel.
+
+    Opens the url in a new page, with the requests denied by the distributor's RequestPolicy aborted,
+    and waits for the price selector to appear,
+    then selects the product fields on the loaded page in a single evaluation.
+    Both waits time out after the adaptive timeouts of the distributor, read in a worker thread like the latencies.
+    The time of each stage is recorded: page, goto, wait_for, select and content.
+    Returns the html content of the page, if raw html is cached, and the parsed Product objects.
+    If the price selector does not appear, the page has no product and returns an empty string and an empty list.
+    """
+    goto_timeout = await asyncio.to_thread(adaptive_timeout, distributor, "goto", BROWSER_TIMEOUT / 1000)
+    wait_for_timeout = await asyncio.to_thread(adaptive_timeout, distributor, "wait_for", BROWSER_TIMEOUT / 2000)
     context.set_default_timeout(BROWSER_TIMEOUT)
-    page = await context.new_page()
-    html_content = ""
-    product = None
+    with fetch_stage(distributor, "page"):
+        page = await context.new_page()
+    try:
+        if REQUEST_BLOCKING:
+            await page.route("**/*", distributor.request_policy.handle_route)
+        start_time = time.monotonic()
+        with fetch_stage(distributor, "goto") as span:
+            span.set_attribute("url.full", url)
+            await page.goto(url, timeout=goto_timeout * 1000)
+        await asyncio.to_thread(record_latency, distributor, "goto", time.monotonic() - start_time)
+
+        start_time = time.monotonic()
+        try:
+            with fetch_stage(distributor, "wait_for"):
+                await page.locator(distributor.product_price_selector).first.wait_for(timeout=wait_for_timeout * 1000)
+        except PlaywrightTimeoutError:
+            log.debug(f"Price selector not found on url: {url}")
+            return "", []
+        await asyncio.to_thread(record_latency, distributor, "wait_for", time.monotonic() - start_time)
+
+        with fetch_stage(distributor, "select"):
+            products = await Product.list_from_page(distributor, page, limit=PRODUCTS_PER_DISTRIBUTOR)
+        html_content = ""
+        if CACHE_RAW_HTML:
+            with fetch_stage(distributor, "content"):
+                html_content = await page.content()
+        log.debug(f"Fetched url: {url}, products: {len(products)}, browser: True")
+        return html_content, products
+    finally:
+        await page.close()
+
+
+@contextmanager
+def fetch_stage(distributor: DistributorSourceModel, stage: str) -> Iterator[Span]:
+    """
+    Takes a DistributorSourceModel and the name of a fetch stage.
+
+    Traces the stage in a span, which is yielded, and records its time, also if it fails.
+    """
+    start_time = time.monotonic()
     try:
-        await page.goto(url)
-        price_loaded = page.locator(price_selector).first
-        await price_loaded.wait_for(timeout=BROWSER_TIMEOUT / 2)
-        html_content = await page.content()
-        log.debug(f"Fetched url: {url}, length: {len(html_content)}")
-    except Exception as ex:
-        log.debug(f"Error fetching url: {url}")
-        log.debug(ex)
-
-    await context.close()
-
-    # If the url is fetched successfully, parses the result into a Product object.
-    if html_content:
-        product = await Product.from_html(distributor=distributor, html_content=html_content)
-
-    # If the product could be parsed, stores the result in the cache,
-    # otherwise stores the result in the cache for a much shorter time.
-    if product:
-        cache.set(key=url, value=html_content, timeout=CACHE_TIMEOUT)
-    else:
-        cache.set(key=url, value=html_content, timeout=CACHE_TIMEOUT / 10)
-
-    return product
+        with tracer.start_as_current_span(f"fetch.{stage}", attributes={"distributor.name": distributor.name}) as span:
+            yield span
+    finally:
+        FETCH_STAGE_SECONDS.labels(distributor=distributor.name, stage=stage).observe(time.monotonic() - start_time)
@@ -0,0 +1,184 @@
+"""Local HTTP server farm of mock shops, for benchmarks"""
+
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+LISTING_ITEM = """
+<li class="product-item" data-id="{number}">
+    <div class="product-image"><a href="/products/{number}"><img src="/images/{number}.jpg" alt=""></a></div>
+    <div class="product-info">
+        <h3 class="product-name"><a href="/products/{number}">Product {number} with a long descriptive name</a></h3>
+        <ul class="product-specs"><li>Spec one</li><li>Spec two</li><li>Spec three</li></ul>
+        <div class="product-price"><span class="price">{price} €</span><span class="old-price">{old_price} €</span></div>
+        <button class="add-to-cart" type="button">Add to cart</button>
+    </div>
+</li>
+"""
+
+PADDING_BLOCK = (
+    '<div class="promo"><a href="/promo/{number}"><img src="/images/promo-{number}.jpg" alt="">'
+    "<span>Promotion {number}, free shipping on orders over 50 €, see the conditions</span></a></div>"
+)
+
+# Selectors of the products on listing pages
+LISTING_SELECTORS = dict(
+    product_name_selector=".product-item .product-name a",
+    product_url_selector=".product-item .product-name a",
+    product_picture_url_selector=".product-item .product-image img",
+    product_price_selector=".product-item .product-price .price",
+    product_container_selector=".product-item",
+)
+
+ASSET_TYPES = {
+    ".jpg": ("image/jpeg", 20_000),
+    ".css": ("text/css", 50_000),
+    ".js": ("application/javascript", 100_000),
+    ".woff2": ("font/woff2", 30_000),
+}
+
+
+def listing_page(products: int, page_bytes: int = 0, title: str = "Search") -> str:
+    """
+    Takes a number of products, the size of the page in bytes and its title.
+    Returns the html of a search results page listing them, with navigation, stylesheet, script
+    and footer markup around it, padded with promotion blocks up to the size.
+    """
+    items = "".join(
+        LISTING_ITEM.format(number=number, price=f"{number + 9},99", old_price=f"{number + 19},99")
+        for number in range(products)
+    )
+    navigation = "".join(f'<li><a href="/category/{number}">Category {number}</a></li>' for number in range(60))
+    head = (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title>'
+        '<link rel="stylesheet" href="/static/shop.css"><script src="/static/shop.js" defer></script></head><body>'
+        f'<header><nav><ul class="menu">{navigation}</ul></nav></header>'
+        f'<main><ul class="products">{items}</ul></main>'
+    )
+    tail = f'<footer><ul class="links">{navigation}</ul></footer></body></html>'
+    blocks, size = [], len(head) + len(tail)
+    while size < page_bytes:
+        blocks.append(PADDING_BLOCK.format(number=len(blocks)))
+        size += len(blocks[-1])
+    return head + "".join(blocks) + tail
+
+
+@dataclass(frozen=True)
+class ShopProfile:
+    """A mock shop: its name, the log-normal distribution of its response time and the size of its pages."""
+
+    name: str
+    latency_median: float = 0.3
+    latency_sigma: float = 0.5
+    page_bytes: int = 300_000
+    products: int = 48
+
+    def latency(self, rng: random.Random) -> float:
+        return rng.lognormvariate(0, self.latency_sigma) * self.latency_median
+
+
+def shop_profiles(
+    count: int, latency_median: float, latency_sigma: float, page_bytes: int, seed: int = 0
+) -> list[ShopProfile]:
+    """
+    Takes a number of shops, the median response time in seconds, its spread and the median page size.
+    Returns the ShopProfiles of a farm of shops, each faster or slower and lighter or heavier than the median.
+    """
+    rng = random.Random(seed)
+    return [
+        ShopProfile(
+            name=f"shop-{number}",
+            latency_median=latency_median * rng.lognormvariate(0, 0.5),
+            latency_sigma=latency_sigma,
+            page_bytes=int(page_bytes * rng.uniform(0.5, 1.5)),
+        )
+        for number in range(count)
+    ]
+
+
+class ShopFarm:
+    """
+    Serves the search results pages and assets of mock shops from a local HTTP server on a thread.
+
+    Shop `name` answers at /name/search?q=..., after a response time drawn from its profile.
+    Pages of every shop are generated once and list the same products for every query.
+    """
+
+    def __init__(self, profiles: list[ShopProfile], seed: int = 0) -> None:
+        self.profiles = {profile.name: profile for profile in profiles}
+        self.pages = {
+            profile.name: listing_page(profile.products, profile.page_bytes).encode("utf-8") for profile in profiles
+        }
+        self.requests = 0
+        self.bytes_sent = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def base_url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.port}/{name}/"
+
+    def start(self) -> None:
+        farm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                farm.handle(self)
+
+            def log_message(self, *args):
+                return
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="shop-farm", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "ShopFarm":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        url = urlsplit(request.path)
+        name = url.path.strip("/").split("/")[0]
+        extension = re.search(r"\.\w+$", url.path)
+        profile = self.profiles.get(name)
+
+        if extension and extension.group() in ASSET_TYPES:
+            content_type, size = ASSET_TYPES[extension.group()]
+            body, latency = b"\0" * size, 0.02
+        elif profile and url.path.endswith("/search"):
+            content_type, body = "text/html; charset=utf-8", self.pages[name]
+            with self._lock:
+                latency = profile.latency(self._rng)
+        else:
+            request.send_error(404)
+            return
+
+        time.sleep(latency)
+        # Counted before the response is sent, so a client never sees its response before it is counted
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(body)
+        request.send_response(200)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
@@ -0,0 +1,44 @@
+"""Coalescing of identical concurrent calls into one"""
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable
+
+from search.browser import BrowserPool
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time in the process.
+
+    Callers arriving while a call with the same key is running wait for it and share its result.
+    The call runs on the browser pool event loop, so it is shared across the event loops
+    of all concurrent requests and is not cancelled when one of the callers goes away.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+    async def run(self, key: str, pool: BrowserPool, func: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """
+        Takes a key, a BrowserPool, a coroutine function and its arguments.
+
+        Returns the result of the running call with the same key, or starts a new call and returns its result.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = pool.spawn(func, *args)
+                self._calls[key] = future
+                future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _forget(self, key: str, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
@@ -0,0 +1,32 @@
+import queue
+
+
+class MockPubSub:
+    def __init__(self) -> None:
+        self.channels: set[str] = set()
+        self.messages: queue.Queue = queue.Queue()
+
+    def subscribe(self, *channels: str) -> None:
+        self.channels.update(channels)
+
+    def listen(self):
+        while True:
+            yield self.messages.get()
+
+
+class MockPubSubRedis:
+    """The Redis pub/sub commands used by TieredCache, delivering the messages in memory."""
+
+    def __init__(self) -> None:
+        self.subscribers: list[MockPubSub] = []
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> MockPubSub:
+        pubsub = MockPubSub()
+        self.subscribers.append(pubsub)
+        return pubsub
+
+    def publish(self, channel: str, message: str) -> int:
+        receivers = [pubsub for pubsub in self.subscribers if channel in pubsub.channels]
+        for pubsub in receivers:
+            pubsub.messages.put({"type": "message", "channel": channel.encode(), "data": message.encode()})
+        return len(receivers)
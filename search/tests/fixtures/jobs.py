@@ -0,0 +1,33 @@
+import time
+from collections import deque
+
+from search.jobs import SCRAPER_QUEUE_NAME, JobQueue
+
+
+class MockRedis:
+    """The Redis list commands used by JobQueue, on an in-memory deque."""
+
+    def __init__(self) -> None:
+        self.lists: dict[str, deque] = {}
+
+    def lpush(self, name: str, value: str) -> None:
+        self.lists.setdefault(name, deque()).appendleft(value.encode())
+
+    def brpop(self, names: list[str], timeout: float = 0) -> tuple[bytes, bytes] | None:
+        deadline = time.monotonic() + timeout
+        while True:
+            for name in names:
+                if self.lists.get(name):
+                    return name.encode(), self.lists[name].pop()
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.01)
+
+    def llen(self, name: str) -> int:
+        return len(self.lists.get(name, ()))
+
+
+class MockJobQueue(JobQueue):
+    def __init__(self, name: str = SCRAPER_QUEUE_NAME) -> None:
+        self.name = name
+        self._redis = MockRedis()
@@ -1,6 +1,7 @@
 import asyncio
 from typing import Any
 
+from bs4 import BeautifulSoup
 from playwright.async_api import Browser
 
 WAIT_FOR_TIME = 1
@@ -46,9 +47,11 @@ class MockLocator:
 class MockPage:
     def __init__(self) -> None:
         self.url = ""
+        self.html_content = ""
+        self.routes = []
 
-    async def goto(self, *args) -> Any:
-        self.url = args[0]
+    async def goto(self, url, **kwargs) -> Any:
+        self.url = url
         return True
 
     async def content(self, *args) -> str:
@@ -56,30 +59,85 @@ class MockPage:
         await asyncio.sleep(CONTENT_TIME)
         return return_html[query]
 
+    async def route(self, url, handler) -> None:
+        self.routes.append((url, handler))
+
+    async def set_content(self, html_content, *args) -> None:
+        self.html_content = html_content
+
+    async def evaluate(self, expression, arg) -> list:
+        fields, limit, *container = arg
+        html_content = self.html_content if self.html_content else return_html[self.url.split("?q=")[1]]
+        await asyncio.sleep(CONTENT_TIME)
+        soup = BeautifulSoup(html_content, "html.parser")
+
+        def value(element, type):
+            if element is None:
+                return None
+            return element.text.strip() if type == "text" else element.get(type)
+
+        if container:
+            return [
+                {name: value(root.select_one(selector), type) for name, (selector, type) in fields.items()}
+                for root in soup.select(container[0], limit=limit)
+            ]
+        columns = {name: soup.select(selector) for name, (selector, _) in fields.items()}
+        return [
+            {
+                name: [value(element, fields[name][1]) for element in elements[:limit]]
+                for name, elements in columns.items()
+            },
+            {name: len(elements) for name, elements in columns.items()},
+        ]
+
     def locator(self, *args) -> MockLocator:
         return MockLocator()
 
+    async def close(self, *args) -> None:
+        return
+
 
 class MockContext:
+    def __init__(self) -> None:
+        self.pages = []
+        self.closed = False
+
     async def new_page(self, *args) -> MockPage:
         return MockPage()
 
     def set_default_timeout(self, *args) -> None:
         return
 
-    async def close(self, *args) -> None:
+    async def clear_cookies(self, *args) -> None:
         return
 
+    async def close(self, *args) -> None:
+        self.closed = True
+
 
 class MockBrowser(Browser):
     def __init__(self) -> None:
-        pass
+        self.connected = True
+        self.closed = False
+        self.contexts_created = 0
+        self.handlers = {}
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def on(self, event, handler) -> None:
+        self.handlers[event] = handler
+
+    def crash(self) -> None:
+        self.connected = False
+        self.handlers["disconnected"](self)
 
     async def new_context(self, *args) -> MockContext:
+        self.contexts_created += 1
         return MockContext()
 
     async def close(self, *args) -> None:
-        return
+        self.closed = True
 
 
 class MockChromium:
@@ -0,0 +1,22 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from composearch.asgi import application
+
+
+class TestASGILifespan(TestCase):
+    @patch("composearch.asgi.shutdown_browser_pool")
+    async def test_lifespan(self, shutdown_browser_pool):
+        messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message["type"])
+
+        await application({"type": "lifespan"}, receive, send)
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        shutdown_browser_pool.assert_called_once()
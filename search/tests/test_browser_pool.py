@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+
+from django.test import TestCase
+
+from search.browser import BrowserPool
+from search.tests.fixtures.playwright import MockBrowser
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+async def use_context(context, delay=0):
+    await asyncio.sleep(delay)
+    return context
+
+
+class TestBrowserPool(TestCase):
+    def setUp(self) -> None:
+        self.launched = []
+        self.pool = self.create_pool()
+
+    def tearDown(self) -> None:
+        self.pool.shutdown()
+
+    def create_pool(self, **kwargs) -> BrowserPool:
+        async def launcher():
+            browser = MockBrowser()
+            self.launched.append(browser)
+            return browser
+
+        kwargs.setdefault("health_interval", 0)
+        return BrowserPool(launcher=launcher, **kwargs)
+
+    async def test_browser_is_launched_lazily(self):
+        self.assertEqual(self.launched, [])
+        await self.pool.with_context(use_context)
+        self.assertEqual(len(self.launched), 1)
+
+    async def test_contexts_are_recycled(self):
+        first = await self.pool.with_context(use_context)
+        second = await self.pool.with_context(use_context)
+        self.assertIs(first, second)
+        self.assertFalse(first.closed)
+        self.assertEqual(self.launched[0].contexts_created, 1)
+
+    async def test_context_is_closed_after_error(self):
+        async def fail(context):
+            self.failed_context = context
+            raise RuntimeError("page crashed")
+
+        with self.assertRaises(RuntimeError):
+            await self.pool.with_context(fail)
+        self.assertTrue(self.failed_context.closed)
+
+    async def test_number_of_browsers_is_bounded(self):
+        self.pool.shutdown()
+        self.pool = self.create_pool(size=2, contexts_per_browser=2)
+        await asyncio.gather(*[self.pool.with_context(use_context, 0.1) for _ in range(10)])
+        self.assertEqual(len(self.launched), 2)
+
+    async def test_browser_is_recycled_after_max_pages(self):
+        self.pool.shutdown()
+        self.pool = self.create_pool(max_pages=2)
+        for _ in range(3):
+            await self.pool.with_context(use_context)
+        self.assertEqual(len(self.launched), 2)
+        self.assertTrue(self.launched[0].closed)
+        self.assertFalse(self.launched[1].closed)
+
+    async def test_browser_is_restarted_after_crash(self):
+        await self.pool.with_context(use_context)
+        self.launched[0].crash()
+        await self.pool.with_context(use_context)
+        self.assertEqual(len(self.launched), 2)
+        self.assertEqual(len(self.pool.browsers), 1)
+        self.assertIs(self.pool.browsers[0].browser, self.launched[1])
+
+    async def test_health_check_retires_broken_browser(self):
+        await self.pool.with_context(use_context)
+        self.launched[0].connected = False
+        await self.pool.submit(self.pool.health_check)
+        self.assertEqual(self.pool.browsers, [])
+        self.assertTrue(self.launched[0].closed)
+
+    async def test_shutdown_closes_browsers(self):
+        await self.pool.with_context(use_context)
+        self.assertTrue(self.pool.running)
+        self.pool.shutdown()
+        self.assertFalse(self.pool.running)
+        self.assertTrue(self.launched[0].closed)
+
+    async def test_shutdown_cancels_background_coroutines(self):
+        future = self.pool.spawn(asyncio.sleep, 60)
+        self.pool.shutdown()
+        self.assertTrue(future.cancelled())
+
+    async def test_caller_context_does_not_leak_into_pool(self):
+        async def get_request_id():
+            return request_id.get()
+
+        request_id.set("request")
+        self.assertIsNone(await self.pool.submit(get_request_id))
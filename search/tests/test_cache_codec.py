@@ -0,0 +1,58 @@
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+from prometheus_client import REGISTRY
+
+from search.cache_codec import CODECS, decode, encode, get_encoded, set_encoded, zstandard
+from search.shop_farm import listing_page
+
+
+class TestCacheCodec(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.html = listing_page(products=48, page_bytes=300_000)
+
+    def test_zlib(self):
+        data = encode(self.html, compression="zlib")
+        self.assertEqual(data[:1], CODECS["zlib"])
+        self.assertLess(len(data), len(self.html) / 10)
+        self.assertEqual(decode(data), self.html)
+
+    @skipIf(zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        data = encode(self.html, compression="zstd")
+        self.assertEqual(data[:1], CODECS["zstd"])
+        self.assertLess(len(data), len(self.html) / 10)
+        self.assertEqual(decode(data), self.html)
+
+    def test_small_values_are_not_compressed(self):
+        data = encode((1.5, ("product", 10)), compression="zlib")
+        self.assertEqual(data[:1], CODECS["none"])
+        self.assertEqual(decode(data), (1.5, ("product", 10)))
+
+    def test_set_and_get(self):
+        self.assertTrue(set_encoded("key", self.html, timeout=60, distributor="TestShop", kind="html"))
+        self.assertEqual(get_encoded("key"), self.html)
+        self.assertIsNone(get_encoded("missing"))
+
+    @patch("search.cache_codec.CACHE_MAX_ENTRY_BYTES", 1024)
+    def test_oversized_value_is_not_stored(self):
+        labels = {"distributor": "TestShop", "kind": "html"}
+        oversized = REGISTRY.get_sample_value("composearch_cache_oversized_total", labels) or 0
+
+        self.assertFalse(set_encoded("key", self.html, timeout=60, distributor="TestShop", kind="html"))
+
+        self.assertIsNone(get_encoded("key"))
+        self.assertEqual(REGISTRY.get_sample_value("composearch_cache_oversized_total", labels), oversized + 1)
+
+    def test_stored_bytes_are_recorded(self):
+        labels = {"distributor": "TestShop", "kind": "result"}
+        stored = REGISTRY.get_sample_value("composearch_cache_entry_bytes_sum", labels) or 0
+
+        set_encoded("key", ("value",), timeout=60, distributor="TestShop", kind="result")
+
+        self.assertEqual(
+            REGISTRY.get_sample_value("composearch_cache_entry_bytes_sum", labels), stored + len(cache.get("key"))
+        )
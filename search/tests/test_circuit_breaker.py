@@ -0,0 +1,142 @@
+import time
+from unittest.mock import patch
+
+import httpx
+from django.core.cache import cache
+from django.test import TestCase
+
+from search.browser import BrowserPool
+from search.circuit_breaker import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CircuitOpenError,
+    CircuitState,
+    adaptive_timeout,
+    check_circuit,
+    circuit_state,
+    record_failure,
+    record_latency,
+    record_success,
+)
+from search.http_client import create_http_client
+from search.models import DistributorSourceModel, FetchStrategy
+from search.result_cache import CacheStatus, get_cached_result, set_cached_result
+from search.search import fetch_result
+from search.tests.fixtures.playwright import MockChromium, return_html
+from search.tests.fixtures.products import sample_product, sample_product_0_vat
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+            fetch_strategy=FetchStrategy.HTTP,
+        )
+        self.status = 500
+        self.timeouts = []
+        self.requested_urls = []
+        self.browser = BrowserPool(
+            launcher=MockChromium().launch,
+            http_client_factory=lambda: create_http_client(transport=httpx.MockTransport(self.handle_request)),
+        )
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
+
+    async def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.requested_urls.append(str(request.url))
+        self.timeouts.append(request.extensions["timeout"]["read"])
+        return httpx.Response(self.status, text=return_html["test"])
+
+    async def fail_fetches(self, times: int) -> None:
+        # Each failed fetch is for a new query, so that none of them is served a stale result from the cache
+        for _ in range(times):
+            await fetch_result(self.browser, self.distributor, f"test-{len(self.requested_urls)}")
+
+    async def test_circuit_opens_after_failures(self):
+        await self.fail_fetches(CIRCUIT_FAILURE_THRESHOLD - 1)
+        self.assertIs(circuit_state(self.distributor), CircuitState.CLOSED)
+        await self.fail_fetches(1)
+        self.assertIs(circuit_state(self.distributor), CircuitState.OPEN)
+
+        self.assertEqual(await fetch_result(self.browser, self.distributor, "test"), [])
+        self.assertEqual(len(self.requested_urls), CIRCUIT_FAILURE_THRESHOLD)
+
+    async def test_open_circuit_serves_stale_result(self):
+        set_cached_result(self.distributor, "test", [sample_product_0_vat])
+        with patch("search.result_cache.time.time", return_value=time.time() + 2 * 60 * 60):
+            await self.fail_fetches(CIRCUIT_FAILURE_THRESHOLD)
+            products = await fetch_result(self.browser, self.distributor, "test")
+        self.assertEqual(products, [sample_product_0_vat])
+
+    async def test_failed_fetch_is_not_cached(self):
+        self.assertEqual(await fetch_result(self.browser, self.distributor, "test"), [])
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.MISS, []))
+
+        self.status = 200
+        self.assertEqual(await fetch_result(self.browser, self.distributor, "test"), [sample_product])
+
+    async def test_success_resets_failures(self):
+        await self.fail_fetches(CIRCUIT_FAILURE_THRESHOLD - 1)
+        self.status = 200
+        await fetch_result(self.browser, self.distributor, "test")
+        self.status = 500
+        await self.fail_fetches(CIRCUIT_FAILURE_THRESHOLD - 1)
+        self.assertIs(circuit_state(self.distributor), CircuitState.CLOSED)
+
+    def test_success_of_healthy_distributor_does_not_write(self):
+        with patch.object(cache, "delete_many") as delete_many:
+            record_success(self.distributor)
+        delete_many.assert_not_called()
+
+    @patch("search.circuit_breaker.CIRCUIT_OPEN_TIMEOUT", 0)
+    async def test_half_open_probe_closes_circuit(self):
+        await self.fail_fetches(CIRCUIT_FAILURE_THRESHOLD)
+        self.assertIs(circuit_state(self.distributor), CircuitState.HALF_OPEN)
+        self.status = 200
+        self.assertEqual(await fetch_result(self.browser, self.distributor, "test"), [sample_product])
+        self.assertIs(circuit_state(self.distributor), CircuitState.CLOSED)
+
+    @patch("search.circuit_breaker.CIRCUIT_OPEN_TIMEOUT", 0)
+    async def test_failed_probe_reopens_circuit(self):
+        record_failure(self.distributor)
+        cache.set(f"circuit:{self.distributor.pk}:opened", time.time() - 1)
+        await self.fail_fetches(1)
+        self.assertEqual(len(self.requested_urls), 1)
+        self.assertIsNotNone(cache.get(f"circuit:{self.distributor.pk}:opened"))
+        self.assertIsNone(cache.get(f"circuit:{self.distributor.pk}:probe"))
+
+    @patch("search.circuit_breaker.CIRCUIT_OPEN_TIMEOUT", 0)
+    def test_half_open_circuit_lets_one_probe_through(self):
+        for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+            record_failure(self.distributor)
+        check_circuit(self.distributor)
+        with self.assertRaises(CircuitOpenError):
+            check_circuit(self.distributor)
+
+    def test_adaptive_timeout(self):
+        self.assertEqual(adaptive_timeout(self.distributor, "http", default=10), 10)
+        for _ in range(20):
+            record_latency(self.distributor, "http", 0.5)
+            record_latency(self.distributor, "goto", 0.1)
+            record_latency(self.distributor, "wait_for", 20)
+        self.assertEqual(adaptive_timeout(self.distributor, "http", default=10), 1)
+        self.assertEqual(adaptive_timeout(self.distributor, "goto", default=10), 1)
+        self.assertEqual(adaptive_timeout(self.distributor, "wait_for", default=10), 10)
+
+    @patch("search.circuit_breaker.ADAPTIVE_TIMEOUT_MIN", 0.1)
+    async def test_adaptive_timeout_of_request(self):
+        for _ in range(20):
+            record_latency(self.distributor, "http", 0.01)
+        self.status = 200
+        await fetch_result(self.browser, self.distributor, "test")
+        self.assertEqual(self.timeouts, [0.1])
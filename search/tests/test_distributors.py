@@ -1,5 +1,15 @@
+import asyncio
+from unittest.mock import patch
+
+from django.core.cache import cache
 from django.test import TestCase
 
+from search.distributors import (
+    DistributorSnapshot,
+    active_distributors,
+    bump_distributors_version,
+    get_distributors_version,
+)
 from search.models import DistributorSourceModel
 from search.search import get_active_distributors
 
@@ -33,3 +43,74 @@ class TestGetActiveDistributors(TestCase):
 
     async def test_get_distributors(self):
         self.assertEqual(await get_active_distributors(), [self.distributor, self.distributor_0_vat])
+
+
+class TestDistributorSnapshot(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.snapshot = DistributorSnapshot(check_interval=60)
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/shop/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+        )
+
+    async def test_snapshot_is_reused(self):
+        distributors = await self.snapshot.get()
+        with patch.object(self.snapshot, "load") as load:
+            self.assertIs(await self.snapshot.get(), distributors)
+        load.assert_not_called()
+
+    async def test_concurrent_callers_wait_for_the_first_snapshot(self):
+        self.assertEqual(await asyncio.gather(self.snapshot.get(), self.snapshot.get()), [[self.distributor]] * 2)
+
+    async def test_failed_load_is_retried(self):
+        with patch.object(self.snapshot, "load", side_effect=RuntimeError("database is down")):
+            with self.assertRaises(RuntimeError):
+                await self.snapshot.get()
+        self.assertEqual(await self.snapshot.get(), [self.distributor])
+
+    async def test_derived_fields(self):
+        [distributor] = await self.snapshot.get()
+        self.assertEqual(distributor.search_url("a+b"), "https://test.com/shop/search?q=a+b")
+        self.assertEqual(distributor.favicon_url, "https://test.com/shop/favicon.ico")
+        self.assertEqual(distributor.product_selectors["url"], ("a", "href"))
+
+    async def test_invalidate(self):
+        await self.snapshot.get()
+        await DistributorSourceModel.objects.filter(pk=self.distributor.pk).aupdate(active=False)
+        self.assertEqual(len(await self.snapshot.get()), 1)
+        self.snapshot.invalidate()
+        self.assertEqual(await self.snapshot.get(), [])
+
+    async def test_save_and_delete_invalidate_the_process_snapshot(self):
+        await active_distributors.get()
+        self.distributor.active = False
+        await self.distributor.asave()
+        self.assertEqual(await active_distributors.get(), [])
+        self.distributor.active = True
+        await self.distributor.asave()
+        self.assertEqual(await active_distributors.get(), [self.distributor])
+        await self.distributor.adelete()
+        self.assertEqual(await active_distributors.get(), [])
+
+    async def test_version_bumped_by_another_worker(self):
+        await self.snapshot.get()
+        await DistributorSourceModel.objects.filter(pk=self.distributor.pk).aupdate(active=False)
+        bump_distributors_version()
+        self.assertEqual(len(await self.snapshot.get()), 1)
+        self.snapshot.check_interval = 0
+        self.assertEqual(await self.snapshot.get(), [])
+
+    def test_commit_bumps_version(self):
+        version = get_distributors_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.distributor.save()
+        self.assertNotEqual(get_distributors_version(), version)
@@ -1,15 +1,30 @@
+import asyncio
 import time
+from unittest.mock import patch
 
+import httpx
+from django.core.cache import cache
 from django.test import TestCase
 
-from search.models import DistributorSourceModel
+from search.browser import BrowserPool
+from search.http_client import create_http_client
+from search.models import DistributorSourceModel, FetchStrategy
+from search.result_cache import (
+    CacheStatus,
+    acquire_fetch_lease,
+    acquire_refresh_lock,
+    get_cached_result,
+    release_fetch_lease,
+    set_cached_result,
+)
 from search.search import fetch_result
-from search.tests.fixtures.playwright import CONTENT_TIME, WAIT_FOR_TIME, MockBrowser
-from search.tests.fixtures.products import sample_product, sample_product_2
+from search.tests.fixtures.playwright import CONTENT_TIME, WAIT_FOR_TIME, MockChromium, return_html
+from search.tests.fixtures.products import sample_product, sample_product_0_vat, sample_product_2
 
 
 class TestFetchResult(TestCase):
     def setUp(self) -> None:
+        cache.clear()
         self.distributor = DistributorSourceModel.objects.create(
             name="TestShop",
             base_url="https://test.com/",
@@ -22,28 +37,228 @@ class TestFetchResult(TestCase):
             product_price_selector="div > span",
             active=True,
         )
-        self.browser = MockBrowser()
+        self.browser = BrowserPool(launcher=MockChromium().launch)
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
 
     async def test_fetch_result(self):
-        product = await fetch_result(self.browser, self.distributor, "test")
-        self.assertEqual(product, sample_product)
+        products = await fetch_result(self.browser, self.distributor, "test")
+        self.assertEqual(products, [sample_product])
 
     async def test_fetch_result_no_query(self):
-        product = await fetch_result(self.browser, self.distributor, "")
-        self.assertIsNone(product)
+        products = await fetch_result(self.browser, self.distributor, "")
+        self.assertEqual(products, [])
 
     async def test_fetch_result_not_from_cache(self):
         start_time = time.time()
-        product = await fetch_result(self.browser, self.distributor, "test2")
+        products = await fetch_result(self.browser, self.distributor, "test2")
         end_time = time.time()
-        self.assertEqual(product, sample_product_2)
+        self.assertEqual(products, [sample_product_2])
         self.assertGreaterEqual(end_time - start_time, CONTENT_TIME + WAIT_FOR_TIME)
 
     async def test_fetch_result_from_cache(self):
-        product = await fetch_result(self.browser, self.distributor, "test")
+        products = await fetch_result(self.browser, self.distributor, "test")
         # Second time should be faster
         start_time = time.time()
-        product = await fetch_result(self.browser, self.distributor, "test")
+        products = await fetch_result(self.browser, self.distributor, "test")
+        end_time = time.time()
+        self.assertEqual(products, [sample_product])
+        self.assertLess(end_time - start_time, CONTENT_TIME + WAIT_FOR_TIME)
+
+    async def test_fetch_result_from_cache_is_not_parsed(self):
+        await fetch_result(self.browser, self.distributor, "test")
+        with patch("search.product.Product.from_rows") as from_rows:
+            products = await fetch_result(self.browser, self.distributor, "test")
+        self.assertEqual(products, [sample_product])
+        from_rows.assert_not_called()
+
+
+class TestFetchStrategy(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+        )
+        self.requested_urls = []
+        self.browser = BrowserPool(
+            launcher=MockChromium().launch,
+            http_client_factory=lambda: create_http_client(transport=httpx.MockTransport(self.handle_request)),
+        )
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.requested_urls.append(str(request.url))
+        query = request.url.params["q"]
+        if query.startswith("server-rendered"):
+            return httpx.Response(200, text=return_html["test"])
+        return httpx.Response(200, text="<html><body><div id='app'></div></body></html>")
+
+    async def test_fetch_result_http(self):
+        self.distributor.fetch_strategy = FetchStrategy.HTTP
+        products = await fetch_result(self.browser, self.distributor, "server-rendered-http")
+        self.assertEqual(products, [sample_product])
+        self.assertEqual(self.requested_urls, ["https://test.com/search?q=server-rendered-http"])
+        self.assertEqual(self.browser.browsers, [])
+
+    async def test_fetch_result_http_needs_javascript(self):
+        self.distributor.fetch_strategy = FetchStrategy.HTTP
+        products = await fetch_result(self.browser, self.distributor, "test-http")
+        self.assertEqual(products, [])
+        self.assertEqual(self.browser.browsers, [])
+
+    async def test_fetch_result_negative_result_is_cached(self):
+        self.distributor.fetch_strategy = FetchStrategy.HTTP
+        self.assertEqual(await fetch_result(self.browser, self.distributor, "test-negative"), [])
+        self.assertEqual(await fetch_result(self.browser, self.distributor, "test-negative"), [])
+        self.assertEqual(len(self.requested_urls), 1)
+
+    async def test_fetch_result_auto_without_fallback(self):
+        self.distributor.fetch_strategy = FetchStrategy.AUTO
+        start_time = time.time()
+        products = await fetch_result(self.browser, self.distributor, "server-rendered-auto")
         end_time = time.time()
-        self.assertEqual(product, sample_product)
+        self.assertEqual(products, [sample_product])
         self.assertLess(end_time - start_time, CONTENT_TIME + WAIT_FOR_TIME)
+        self.assertEqual(self.browser.browsers, [])
+
+    async def test_fetch_result_auto_with_fallback(self):
+        self.distributor.fetch_strategy = FetchStrategy.AUTO
+        products = await fetch_result(self.browser, self.distributor, "test2")
+        self.assertEqual(products, [sample_product_2])
+        self.assertEqual(self.requested_urls, ["https://test.com/search?q=test2"])
+        self.assertEqual(len(self.browser.browsers), 1)
+
+
+class TestStaleWhileRevalidate(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+            fetch_strategy=FetchStrategy.HTTP,
+            cache_soft_timeout=0,
+        )
+        self.requested_urls = []
+        self.browser = BrowserPool(
+            launcher=MockChromium().launch,
+            http_client_factory=lambda: create_http_client(transport=httpx.MockTransport(self.handle_request)),
+        )
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
+
+    async def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.requested_urls.append(str(request.url))
+        # Keeps the refresh in flight while the concurrent searches read the stale result
+        await asyncio.sleep(0.1)
+        return httpx.Response(200, text=return_html["test"])
+
+    async def wait_for_refresh(self):
+        for _ in range(50):
+            if not self.browser._background:
+                return
+            await asyncio.sleep(0.1)
+
+    async def test_stale_result_is_returned_and_refreshed(self):
+        set_cached_result(self.distributor, "test", [sample_product_0_vat])
+        products = await fetch_result(self.browser, self.distributor, "test")
+        self.assertEqual(products, [sample_product_0_vat])
+        await self.wait_for_refresh()
+        self.assertEqual(len(self.requested_urls), 1)
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.STALE, [sample_product]))
+
+    async def test_stale_result_is_refreshed_once(self):
+        set_cached_result(self.distributor, "test", [sample_product_0_vat])
+        products = await asyncio.gather(*[fetch_result(self.browser, self.distributor, "test") for _ in range(5)])
+        self.assertEqual(products, [[sample_product_0_vat]] * 5)
+        await self.wait_for_refresh()
+        self.assertEqual(len(self.requested_urls), 1)
+
+    async def test_stale_result_is_not_refreshed_while_locked(self):
+        set_cached_result(self.distributor, "test", [sample_product_0_vat])
+        acquire_refresh_lock(self.distributor, "test")
+        products = await fetch_result(self.browser, self.distributor, "test")
+        self.assertEqual(products, [sample_product_0_vat])
+        await self.wait_for_refresh()
+        self.assertEqual(self.requested_urls, [])
+
+
+class TestRequestCoalescing(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+            fetch_strategy=FetchStrategy.HTTP,
+        )
+        self.requested_urls = []
+        self.browser = BrowserPool(
+            launcher=MockChromium().launch,
+            http_client_factory=lambda: create_http_client(transport=httpx.MockTransport(self.handle_request)),
+        )
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
+
+    async def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.requested_urls.append(str(request.url))
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, text=return_html["test"])
+
+    async def test_concurrent_searches_share_one_fetch(self):
+        products = await asyncio.gather(*[fetch_result(self.browser, self.distributor, "test") for _ in range(5)])
+        self.assertEqual(products, [[sample_product]] * 5)
+        self.assertEqual(len(self.requested_urls), 1)
+
+    async def test_search_waits_for_other_worker(self):
+        url = "https://test.com/search?q=test"
+        self.assertTrue(acquire_fetch_lease(url))
+
+        async def other_worker():
+            await asyncio.sleep(0.5)
+            set_cached_result(self.distributor, "test", [sample_product_2])
+            release_fetch_lease(url)
+
+        products, _ = await asyncio.gather(fetch_result(self.browser, self.distributor, "test"), other_worker())
+        self.assertEqual(products, [sample_product_2])
+        self.assertEqual(self.requested_urls, [])
+
+    async def test_search_fetches_after_other_worker_failed(self):
+        url = "https://test.com/search?q=test"
+        self.assertTrue(acquire_fetch_lease(url))
+
+        async def other_worker():
+            await asyncio.sleep(0.5)
+            release_fetch_lease(url)
+
+        products, _ = await asyncio.gather(fetch_result(self.browser, self.distributor, "test"), other_worker())
+        self.assertEqual(products, [sample_product])
+        self.assertEqual(len(self.requested_urls), 1)
@@ -16,3 +16,5 @@ class TestToDecimal(TestCase):
         self.assertEqual(to_decimal("Price: 1.23 EUR"), Decimal("1.23"))
         self.assertEqual(to_decimal("1.234.56"), Decimal("1234.56"))
         self.assertEqual(to_decimal("not a float"), None)
+        self.assertEqual(to_decimal("1234.56"), Decimal("1234.56"))
+        self.assertEqual(to_decimal("1,234,567.89"), Decimal("1234567.89"))
@@ -0,0 +1,90 @@
+import httpx
+from django.core.cache import cache
+from django.test import TestCase
+from prometheus_client import REGISTRY
+
+from search.browser import BrowserPool
+from search.http_client import create_http_client
+from search.models import DistributorSourceModel, FetchStrategy
+from search.search import fetch_result
+from search.tests.fixtures.playwright import MockChromium, return_html
+from search.tests.fixtures.products import sample_product
+
+
+def sample_value(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestFetchMetrics(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+            fetch_strategy=FetchStrategy.HTTP,
+        )
+        self.browser = BrowserPool(
+            launcher=MockChromium().launch,
+            http_client_factory=lambda: create_http_client(
+                transport=httpx.MockTransport(lambda request: httpx.Response(200, text=return_html["test"]))
+            ),
+        )
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
+
+    async def test_fetch_result_records_cache_outcome(self):
+        misses = sample_value("composearch_fetch_results_total", distributor="TestShop", cache="miss")
+        hits = sample_value("composearch_fetch_results_total", distributor="TestShop", cache="fresh")
+
+        self.assertEqual(await fetch_result(self.browser, self.distributor, "test"), [sample_product])
+        self.assertEqual(await fetch_result(self.browser, self.distributor, "test"), [sample_product])
+
+        self.assertEqual(
+            sample_value("composearch_fetch_results_total", distributor="TestShop", cache="miss"), misses + 1
+        )
+        self.assertEqual(
+            sample_value("composearch_fetch_results_total", distributor="TestShop", cache="fresh"), hits + 1
+        )
+
+    async def test_fetch_result_records_stages(self):
+        stages = ("cache_lookup", "http")
+        parse_stages = ("load", "select_name", "select_url", "select_picture_url", "select_price", "convert")
+        before = {
+            stage: sample_value("composearch_fetch_stage_seconds_count", distributor="TestShop", stage=stage)
+            for stage in stages
+        } | {
+            stage: sample_value("composearch_parse_seconds_count", distributor="TestShop", stage=stage)
+            for stage in parse_stages
+        }
+
+        await fetch_result(self.browser, self.distributor, "test")
+
+        for stage in stages:
+            self.assertEqual(
+                sample_value("composearch_fetch_stage_seconds_count", distributor="TestShop", stage=stage),
+                before[stage] + 1,
+            )
+        for stage in parse_stages:
+            self.assertEqual(
+                sample_value("composearch_parse_seconds_count", distributor="TestShop", stage=stage),
+                before[stage] + 1,
+            )
+
+
+class TestMetricsView(TestCase):
+    async def test_metrics_view(self):
+        response = await self.async_client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn("max-age=0", response["Cache-Control"])
+        self.assertContains(response, "composearch_fetch_stage_seconds")
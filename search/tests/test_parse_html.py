@@ -1,4 +1,7 @@
+from unittest.mock import patch
+
 from django.test import TestCase
+from .fixtures.playwright import MockPage
 from .fixtures.products import sample_product, sample_product_0_vat
 
 from search.models import DistributorSourceModel
@@ -6,6 +9,8 @@ from search.product import DEFAULT_PICTURE, Product
 
 
 class TestParseHTML(TestCase):
+    parser = "bs4"
+
     def setUp(self) -> None:
         self.distributor = DistributorSourceModel.objects.create(
             name="TestShop",
@@ -98,34 +103,106 @@ class TestParseHTML(TestCase):
         """
 
     async def test_parse_html_normal_html(self):
-        product = await Product.from_html(self.distributor, self.html)
+        product = await Product.from_html(self.distributor, self.html, parser=self.parser)
         self.assertEqual(product, sample_product)
 
     async def test_parse_html_0_vat(self):
-        product = await Product.from_html(self.distributor_0_vat, self.html)
+        product = await Product.from_html(self.distributor_0_vat, self.html, parser=self.parser)
         self.assertEqual(product, sample_product_0_vat)
 
     async def test_parse_html_no_name(self):
-        product = await Product.from_html(self.distributor, self.html_no_name)
+        product = await Product.from_html(self.distributor, self.html_no_name, parser=self.parser)
         self.assertIsNone(product)
 
     async def test_parse_html_no_url(self):
-        product = await Product.from_html(self.distributor, self.html_no_url)
+        product = await Product.from_html(self.distributor, self.html_no_url, parser=self.parser)
         self.assertIsNone(product)
 
     async def test_parse_html_no_picture(self):
-        product = await Product.from_html(self.distributor, self.html_no_picture)
+        product = await Product.from_html(self.distributor, self.html_no_picture, parser=self.parser)
         self.assertIsNotNone(product)
         self.assertEqual(product.picture_url, DEFAULT_PICTURE)
 
     async def test_parse_html_no_price(self):
-        product = await Product.from_html(self.distributor, self.html_no_price)
+        product = await Product.from_html(self.distributor, self.html_no_price, parser=self.parser)
+        self.assertIsNone(product)
+
+    async def test_parse_html_discount_badge(self):
+        html = self.html.replace("9.99</span>", "-10% 9.99</span>")
+        product = await Product.from_html(self.distributor, html, parser=self.parser)
+        self.assertEqual(product, sample_product)
+
+    async def test_parse_html_negative_price(self):
+        html = self.html.replace("9.99</span>", "-9.99</span>")
+        product = await Product.from_html(self.distributor, html, parser=self.parser)
         self.assertIsNone(product)
 
     async def test_parse_html_no_product(self):
-        product = await Product.from_html(self.distributor, self.html_no_product)
+        product = await Product.from_html(self.distributor, self.html_no_product, parser=self.parser)
         self.assertIsNone(product)
 
     async def test_parse_html_no_result(self):
-        product = await Product.from_html(self.distributor, "")
+        product = await Product.from_html(self.distributor, "", parser=self.parser)
         self.assertIsNone(product)
+
+    @patch("search.tests.fixtures.playwright.CONTENT_TIME", 0)
+    async def test_parse_page_in_one_evaluation(self):
+        page = MockPage()
+        await page.set_content(self.html)
+        with patch.object(page, "evaluate", wraps=page.evaluate) as evaluate:
+            product = await Product.from_page(self.distributor, page)
+        self.assertEqual(product, sample_product)
+        self.assertEqual(evaluate.call_count, 1)
+
+    @patch("search.tests.fixtures.playwright.CONTENT_TIME", 0)
+    async def test_parse_page_no_name(self):
+        page = MockPage()
+        await page.set_content(self.html_no_name)
+        product = await Product.from_page(self.distributor, page)
+        self.assertIsNone(product)
+
+    async def test_parse_html_top_products(self):
+        html = self.html.replace("</body>", self.html.split("<body>")[1])
+        products = await Product.list_from_html(self.distributor, html, limit=3, parser=self.parser)
+        self.assertEqual(products, [sample_product, sample_product])
+
+    async def test_parse_html_top_products_in_containers(self):
+        def body(html):
+            return html.split("<body>")[1].split("</body>")[0]
+
+        html = f"<html><body><section>{body(self.html_no_picture)}</section><section>{body(self.html)}</section>"
+        products = await Product.list_from_html(self.distributor, html, limit=3, parser=self.parser)
+        # Without a container selector, the picture of the second product cannot be told apart from the first one's
+        self.assertEqual(len(products), 1)
+
+        self.distributor.product_container_selector = "section"
+        products = await Product.list_from_html(self.distributor, html, limit=3, parser=self.parser)
+        self.assertEqual([product.picture_url for product in products], [DEFAULT_PICTURE, sample_product.picture_url])
+
+
+class TestParseHTMLLxml(TestParseHTML):
+    """Runs the same cases with the lxml parser, which must select the same products as bs4."""
+
+    parser = "lxml"
+
+    async def test_parse_html_parity(self):
+        html = """
+        <html>
+            <head><meta charset="utf-8"></head>
+            <body>
+                <ul>
+                    <li class="item"><DIV ID="name"> Test   product <b>A</b> </DIV></li>
+                    <li class="item"><a href="/test-product">Test product</a></li>
+                </ul>
+                <img src="test-product.jpg" alt="">
+                <div><span class="price">1 299,00 €</span></div>
+                <div><span class="price">9.99</span></div>
+            </body>
+        </html>
+        """
+        for html_content in (html, self.html, self.html_no_picture, self.html_no_product):
+            with self.subTest(html_content=html_content):
+                self.assertEqual(
+                    await Product.from_html(self.distributor, html_content, parser="lxml"),
+                    await Product.from_html(self.distributor, html_content, parser="bs4"),
+                )
@@ -1,5 +1,9 @@
+from unittest.mock import patch
+
 from django.test import TestCase
-from search.parser import Parser, AbstractParser, BeautifulSoupParser, PlaywrightParser
+from search.tests.fixtures.playwright import MockPage
+from search.parser import Parser, AbstractParser, BeautifulSoupParser, LxmlParser, PlaywrightParser, compile_selector
+from search.parser import trim_to_listing
 
 
 class TestParser(TestCase):
@@ -77,3 +81,154 @@ class TestParser(TestCase):
             )
             with self.assertRaises(ValueError):
                 await parser.select_element("a", "invalid")
+
+    # Select fields on a page
+    @patch("search.tests.fixtures.playwright.CONTENT_TIME", 0)
+    async def test_parser_playwright_select_fields_on_page(self):
+        page = MockPage()
+        async with PlaywrightParser(page=page) as parser:
+            await parser.load_content(
+                '<html><a href="https://example.com">link</a><img src="https://example.com/img.jpg"></html>'
+            )
+            rows = await parser.select_fields(
+                {"text": ("a", "text"), "href": ("a", "href"), "src": ("img", "src"), "missing": ("p", "text")}
+            )
+            self.assertEqual(
+                rows,
+                [{"text": "link", "href": "https://example.com", "src": "https://example.com/img.jpg", "missing": None}],
+            )
+            self.assertIsNone(parser.pool)
+
+    async def test_parser_playwright_select_fields_invalid_type(self):
+        async with PlaywrightParser(page=MockPage()) as parser:
+            with self.assertRaises(ValueError):
+                await parser.select_fields({"a": ("a", "invalid")})
+
+    @patch("search.tests.fixtures.playwright.CONTENT_TIME", 0)
+    async def test_parser_select_fields_top_rows(self):
+        html = """
+        <ul>
+            <li><a href="/1">First</a><span>1.00</span></li>
+            <li><a href="/2">Second</a><span>2.00</span></li>
+            <li><a href="/3">Third</a><span>3.00</span></li>
+        </ul>
+        """
+        fields = {"name": ("li a", "text"), "url": ("li a", "href"), "price": ("li span", "text")}
+        expected = [
+            {"name": "First", "url": "/1", "price": "1.00"},
+            {"name": "Second", "url": "/2", "price": "2.00"},
+        ]
+        for parser in (BeautifulSoupParser(), LxmlParser(), PlaywrightParser(page=MockPage())):
+            with self.subTest(parser=parser.name()):
+                async with parser:
+                    await parser.load_content(html)
+                    self.assertEqual(await parser.select_fields(fields, limit=2), expected)
+                    rows = await parser.select_fields(fields, limit=5)
+                    self.assertEqual(rows, expected + [{"name": "Third", "url": "/3", "price": "3.00"}])
+
+    @patch("search.tests.fixtures.playwright.CONTENT_TIME", 0)
+    async def test_parser_select_fields_in_containers(self):
+        html = """
+        <ul>
+            <li><a href="/1">First</a><img src="/1.jpg"><span>1.00</span></li>
+            <li><a href="/2">Second</a><span>2.00</span></li>
+            <li><a href="/3">Third</a><img src="/3.jpg"><span>3.00</span></li>
+        </ul>
+        """
+        fields = {"name": ("a", "text"), "picture_url": ("img", "src"), "price": ("span", "text")}
+        expected = [
+            {"name": "First", "picture_url": "/1.jpg", "price": "1.00"},
+            {"name": "Second", "picture_url": None, "price": "2.00"},
+            {"name": "Third", "picture_url": "/3.jpg", "price": "3.00"},
+        ]
+        for parser in (BeautifulSoupParser(), LxmlParser(), PlaywrightParser(page=MockPage())):
+            with self.subTest(parser=parser.name()):
+                async with parser:
+                    await parser.load_content(html)
+                    self.assertEqual(await parser.select_fields(fields, limit=5, container="li"), expected)
+                    self.assertEqual(await parser.select_fields(fields, limit=2, container="li"), expected[:2])
+                    # Without a container, the pictures cannot be matched to their products
+                    self.assertEqual(await parser.select_fields(fields, limit=5), expected[:1])
+
+    # lxml parser
+    async def test_parser_lxml(self):
+        async with Parser("lxml") as parser:
+            self.assertEqual(parser.name(), "lxml")
+            self.assertIsInstance(parser, LxmlParser)
+
+    async def test_parser_lxml_select_element(self):
+        async with Parser("lxml") as parser:
+            await parser.load_content(
+                '<html><a href="https://example.com">link</a><img src="https://example.com/img.jpg"></html>'
+            )
+            self.assertEqual(await parser.select_element("a", "text"), "link")
+            self.assertEqual(await parser.select_element("a", "href"), "https://example.com")
+            self.assertEqual(await parser.select_element("img", "src"), "https://example.com/img.jpg")
+            self.assertIsNone(await parser.select_element("p", "text"))
+            with self.assertRaises(ValueError):
+                await parser.select_element("a", "invalid")
+
+    async def test_parser_lxml_empty_content(self):
+        async with Parser("lxml") as parser:
+            await parser.load_content("")
+            self.assertIsNone(await parser.select_element("a", "text"))
+
+    def test_compiled_selectors_are_cached(self):
+        self.assertIs(compile_selector("div > span.price"), compile_selector("div > span.price"))
+
+    async def test_trim_to_listing(self):
+        html = """
+        <html><body><nav><a href="/menu">Menu</a></nav>
+        <ul>
+            <li><a href="/1">First</a><span>1.00</span></li>
+            <li><a href="/2">Second</a><span>2.00</span></li>
+            <li><a href="/3">Third</a><span>3.00</span></li>
+        </ul>
+        <footer>Footer</footer></body></html>
+        """
+        fields = {"name": ("li a", "text"), "url": ("li a", "href"), "price": ("li span", "text")}
+        trimmed = trim_to_listing(html, fields, limit=2)
+        self.assertNotIn("Menu", trimmed)
+        self.assertNotIn("Third", trimmed)
+        self.assertNotIn("Footer", trimmed)
+        async with LxmlParser() as parser:
+            await parser.load_content(trimmed)
+            self.assertEqual(
+                await parser.select_fields(fields, limit=5),
+                [{"name": "First", "url": "/1", "price": "1.00"}, {"name": "Second", "url": "/2", "price": "2.00"}],
+            )
+
+    def test_trim_to_listing_ignores_declared_charset(self):
+        html = """
+        <html><head><meta charset="windows-1251"></head><body>
+        <ul><li><a href="/1">Телефон</a><span>1.00</span></li><li><a href="/2">Чехол</a><span>2.00</span></li></ul>
+        </body></html>
+        """
+        trimmed = trim_to_listing(html, {"name": ("li a", "text")})
+        self.assertIn("Телефон", trimmed)
+        self.assertNotIn("Чехол", trimmed)
+
+    async def test_trim_to_listing_with_container(self):
+        html = """
+        <html><body><nav><a href="/menu">Menu</a></nav>
+        <ul>
+            <li><a href="/1">First</a><span>1.00</span></li>
+            <li><a href="/2">Second</a></li>
+            <li><a href="/3">Third</a><span>3.00</span></li>
+        </ul>
+        <footer>Footer</footer></body></html>
+        """
+        fields = {"name": ("a", "text"), "price": ("span", "text")}
+        trimmed = trim_to_listing(html, fields, limit=2, container="li")
+        self.assertNotIn("Menu", trimmed)
+        self.assertNotIn("Third", trimmed)
+        async with LxmlParser() as parser:
+            await parser.load_content(trimmed)
+            self.assertEqual(
+                await parser.select_fields(fields, limit=5, container="li"),
+                [{"name": "First", "price": "1.00"}, {"name": "Second", "price": None}],
+            )
+
+    def test_trim_to_listing_without_match(self):
+        html = "<html><body><p>No products</p></body></html>"
+        self.assertEqual(trim_to_listing(html, {"name": ("li a", "text")}), html)
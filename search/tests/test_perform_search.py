@@ -1,17 +1,52 @@
+import asyncio
+from dataclasses import replace
+from decimal import Decimal
 from unittest.mock import patch
 
+from django.core.cache import cache
 from django.test import TestCase
 from playwright.async_api import BrowserContext
 
+from search.browser import BrowserPool
 from search.models import DistributorSourceModel
 from search.product import Product
-from search.search import perform_search
+from search.ranking import score
+from search.result_cache import CacheStatus, get_cached_result
+from search.search import iter_search, perform_search
 
-from .fixtures.products import sample_product
+from .fixtures.playwright import CONTENT_TIME, WAIT_FOR_TIME, MockChromium
+from .fixtures.products import sample_product, sample_product_2
 
 
-async def mock_fetch_result(browser: BrowserContext, distributor: DistributorSourceModel, query) -> Product:
-    return sample_product
+async def mock_fetch_result(browser: BrowserContext, distributor: DistributorSourceModel, query) -> list[Product]:
+    return [sample_product]
+
+
+async def mock_fetch_result_by_shop(
+    browser: BrowserContext, distributor: DistributorSourceModel, query
+) -> list[Product]:
+    # The cheaper product comes from the slower shop
+    if distributor.name == "SlowShop":
+        await asyncio.sleep(0.5)
+        return [sample_product]
+    if distributor.name == "FastShop":
+        return [sample_product_2]
+    return []
+
+
+def offer(name: str, price: str) -> Product:
+    return replace(sample_product, name=name, price=Decimal(price))
+
+
+async def mock_fetch_result_offers(
+    browser: BrowserContext, distributor: DistributorSourceModel, query
+) -> list[Product]:
+    return [
+        offer("Phone case for Phone X", "5.00"),
+        offer("Phone X 128GB", "900.00"),
+        offer("Phone X 64GB", "700.00"),
+        offer("Phone Xperia 64GB", "400.00"),
+    ]
 
 
 class TestPerformSearch(TestCase):
@@ -33,3 +68,86 @@ class TestPerformSearch(TestCase):
     async def test_perform_search(self, mock_fetch_result):
         products = await perform_search("test")
         self.assertEqual(products, [sample_product])
+
+    @patch("search.search.fetch_result", side_effect=mock_fetch_result_offers)
+    async def test_perform_search_ranks_by_relevance_and_price(self, mock_fetch_result):
+        products = await perform_search("phone x 64gb")
+        self.assertEqual(
+            [product.name for product in products],
+            ["Phone X 64GB", "Phone case for Phone X", "Phone Xperia 64GB", "Phone X 128GB"],
+        )
+
+    def test_negative_prices_are_ranked_as_free(self):
+        self.assertEqual(score(offer("Phone X", "-10"), ["phone"]), score(offer("Phone X", "0"), ["phone"]))
+
+    @patch("search.search.SEARCH_MAX_RESULTS", 2)
+    @patch("search.search.fetch_result", side_effect=mock_fetch_result_offers)
+    async def test_perform_search_keeps_top_results(self, mock_fetch_result):
+        products = await perform_search("phone x")
+        self.assertEqual([product.name for product in products], ["Phone case for Phone X", "Phone X 64GB"])
+
+
+class TestIterSearch(TestCase):
+    def setUp(self) -> None:
+        for name in ("SlowShop", "FastShop", "EmptyShop"):
+            DistributorSourceModel.objects.create(
+                name=name,
+                base_url="https://test.com/",
+                search_string="search?q=%s",
+                currency="EUR",
+                included_vat=10,
+                product_name_selector="#name",
+                product_url_selector="a",
+                product_picture_url_selector="img",
+                product_price_selector="div > span",
+                active=True,
+            )
+
+    @patch("search.search.fetch_result", side_effect=mock_fetch_result_by_shop)
+    async def test_iter_search_yields_fastest_first(self, mock_fetch_result):
+        products = [product async for product in iter_search("test")]
+        self.assertEqual(products, [sample_product_2, sample_product])
+
+    @patch("search.search.fetch_result", side_effect=mock_fetch_result_by_shop)
+    async def test_perform_search_sorts_by_price(self, mock_fetch_result):
+        products = await perform_search("test")
+        self.assertEqual(products, [sample_product, sample_product_2])
+
+    @patch("search.search.SEARCH_DEADLINE", 0.2)
+    @patch("search.search.fetch_result", side_effect=mock_fetch_result_by_shop)
+    async def test_perform_search_returns_partial_results_at_deadline(self, mock_fetch_result):
+        timed_out = []
+        products = await perform_search("test", timed_out)
+        self.assertEqual(products, [sample_product_2])
+        self.assertEqual(timed_out, ["SlowShop"])
+
+
+class TestSearchDeadline(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+        )
+        self.browser = BrowserPool(launcher=MockChromium().launch)
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
+
+    @patch("search.search.SEARCH_DEADLINE", 0.5)
+    async def test_timed_out_fetch_fills_the_cache(self):
+        with patch("search.search.get_browser_pool", return_value=self.browser):
+            timed_out = []
+            self.assertEqual(await perform_search("test", timed_out), [])
+        self.assertEqual(timed_out, ["TestShop"])
+
+        await asyncio.sleep(CONTENT_TIME + WAIT_FOR_TIME)
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.FRESH, [sample_product]))
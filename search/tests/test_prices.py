@@ -0,0 +1,46 @@
+from decimal import Decimal
+from unittest import TestCase
+
+from search.models import PriceFormat
+from search.prices import load_corpus, net_prices, parse_price
+
+
+class TestParsePrice(TestCase):
+    def test_price_corpus(self):
+        for text, price_format, expected in load_corpus():
+            with self.subTest(text=text, price_format=price_format):
+                self.assertEqual(parse_price(text, price_format), expected)
+
+    def test_price_format_decides_ambiguous_separators(self):
+        self.assertEqual(parse_price("1,234", PriceFormat.AUTO), Decimal("1234"))
+        self.assertEqual(parse_price("1,234", PriceFormat.COMMA_DECIMAL), Decimal("1.234"))
+        self.assertEqual(parse_price("1.234", PriceFormat.DOT_DECIMAL), Decimal("1.234"))
+        self.assertEqual(parse_price("1.234", PriceFormat.COMMA_DECIMAL), Decimal("1234"))
+
+    def test_mixed_thousands_separators_are_not_grouped(self):
+        self.assertEqual(parse_price("1,234.567", PriceFormat.AUTO), Decimal("1234.567"))
+        self.assertEqual(parse_price("1.234,567", PriceFormat.AUTO), Decimal("1234.567"))
+
+    def test_parsed_prices_are_memoized(self):
+        parse_price.cache_clear()
+        parse_price("9,99 €", PriceFormat.COMMA_DECIMAL)
+        parse_price("9,99 €", PriceFormat.COMMA_DECIMAL)
+        self.assertEqual(parse_price.cache_info().hits, 1)
+
+
+class TestNetPrices(TestCase):
+    def test_net_prices(self):
+        self.assertEqual(
+            net_prices(["9.99", "1 234,50 EUR", "not a price", None, ""], vat=10),
+            [Decimal("9.08"), Decimal("1122.27"), None, None, None],
+        )
+
+    def test_net_prices_0_vat(self):
+        self.assertEqual(net_prices(["9.99"], vat=0), [Decimal("9.99")])
+
+    def test_net_prices_vat_is_exact(self):
+        # 1.1055 / 1.1 is exactly 1.005, with a float VAT of 0.1000000000000000055 it was rounded down
+        self.assertEqual(net_prices(["1.1055"], vat=10), [Decimal("1.01")])
+
+    def test_net_prices_price_format(self):
+        self.assertEqual(net_prices(["1.234"], vat=0, price_format=PriceFormat.DOT_DECIMAL), [Decimal("1.23")])
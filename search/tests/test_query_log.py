@@ -0,0 +1,54 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+
+from search.models import QueryLogModel
+from search.query_log import QUERY_LOG_MAX_LENGTH, flush_query_log, log_query, top_queries
+from search.search import perform_search
+
+
+async def mock_fetch_result(browser, distributor, query) -> list:
+    return []
+
+
+class TestQueryLog(TestCase):
+    async def test_log_query(self):
+        for query in ("phone", "phone", "laptop"):
+            await log_query(query)
+        self.assertEqual((await QueryLogModel.objects.aget(query="phone")).count, 2)
+        self.assertEqual((await QueryLogModel.objects.aget(query="laptop")).count, 1)
+
+    async def test_empty_query_is_not_logged(self):
+        await log_query("")
+        self.assertEqual(await QueryLogModel.objects.acount(), 0)
+
+    async def test_too_long_query_is_not_logged(self):
+        await log_query("a" * (QUERY_LOG_MAX_LENGTH + 1))
+        self.assertEqual(await QueryLogModel.objects.acount(), 0)
+
+    async def test_database_errors_are_not_raised(self):
+        with patch("search.query_log.QueryLogModel.objects.filter", side_effect=RuntimeError("database is down")):
+            with self.assertLogs("search.query_log", level="WARNING"):
+                await log_query("phone")
+
+    @patch("search.search.fetch_result", side_effect=mock_fetch_result)
+    async def test_search_logs_normalized_query(self, mock_fetch_result):
+        await perform_search(" Phone X ")
+        await perform_search("phone x")
+        await flush_query_log()
+        self.assertEqual((await QueryLogModel.objects.aget(query="phone+x")).count, 2)
+
+    @patch("search.views.STREAM_RESULTS", False)
+    def test_query_is_logged_before_the_request_loop_is_closed(self):
+        # The sync test client runs the view on an event loop closed after the response, as under WSGI
+        self.client.get("/search/", {"query": "Phone"})
+        self.assertEqual(QueryLogModel.objects.get(query="phone").count, 1)
+
+    async def test_top_queries(self):
+        for query, count in (("phone", 5), ("laptop", 10), ("mouse", 1), ("old", 100)):
+            await QueryLogModel.objects.acreate(query=query, count=count)
+        await QueryLogModel.objects.filter(query="old").aupdate(last_searched=timezone.now() - timedelta(days=30))
+        self.assertEqual(await top_queries(2), ["laptop", "phone"])
+        self.assertEqual(await top_queries(10), ["laptop", "phone", "mouse"])
@@ -0,0 +1,75 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.test import TestCase
+
+from search.models import DistributorSourceModel
+from search.search import fetch_page
+from search.tests.fixtures.playwright import MockContext, MockPage
+from search.tests.fixtures.products import sample_product
+
+
+class TestRequestPolicy(TestCase):
+    def setUp(self) -> None:
+        self.distributor = DistributorSourceModel(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+        )
+
+    def test_default_policy(self):
+        policy = self.distributor.request_policy
+        self.assertTrue(policy.blocks("https://test.com/product.jpg", "image"))
+        self.assertTrue(policy.blocks("https://test.com/style.css", "stylesheet"))
+        self.assertTrue(policy.blocks("https://fonts.test.com/font.woff2", "font"))
+        self.assertTrue(policy.blocks("https://www.google-analytics.com/analytics.js", "script"))
+        self.assertFalse(policy.blocks("https://test.com/search?q=test", "document"))
+        self.assertFalse(policy.blocks("https://test.com/app.js", "script"))
+        self.assertFalse(policy.blocks("https://api.test.com/products?q=test", "fetch"))
+
+    def test_distributor_policy(self):
+        self.distributor.blocked_resource_types = "image, media"
+        self.distributor.block_trackers = False
+        self.distributor.blocked_domains = "chat.test.net\nreviews.com"
+        self.distributor.allowed_domains = "static.test.com"
+        policy = self.distributor.request_policy
+        self.assertFalse(policy.blocks("https://test.com/style.css", "stylesheet"))
+        self.assertFalse(policy.blocks("https://www.google-analytics.com/analytics.js", "script"))
+        self.assertTrue(policy.blocks("https://widget.reviews.com/widget.js", "script"))
+        self.assertTrue(policy.blocks("https://chat.test.net/chat.js", "script"))
+        self.assertFalse(policy.blocks("https://notreviews.com/widget.js", "script"))
+        self.assertFalse(policy.blocks("https://static.test.com/price.png", "image"))
+
+    async def test_handle_route(self):
+        route = MagicMock(abort=AsyncMock(), continue_=AsyncMock())
+        route.request.url, route.request.resource_type = "https://test.com/product.jpg", "image"
+        await self.distributor.request_policy.handle_route(route)
+        route.abort.assert_awaited_once()
+
+        route = MagicMock(abort=AsyncMock(), continue_=AsyncMock())
+        route.request.url, route.request.resource_type = "https://test.com/search?q=test", "document"
+        await self.distributor.request_policy.handle_route(route)
+        route.continue_.assert_awaited_once()
+        route.abort.assert_not_awaited()
+
+    @patch("search.tests.fixtures.playwright.CONTENT_TIME", 0)
+    async def test_fetch_page_routes_requests(self):
+        page = MockPage()
+        with patch.object(MockContext, "new_page", AsyncMock(return_value=page)):
+            _, products = await fetch_page(MockContext(), "https://test.com/search?q=test", self.distributor)
+        self.assertEqual(products, [sample_product])
+        self.assertEqual(page.routes, [("**/*", self.distributor.request_policy.handle_route)])
+
+    @patch("search.search.REQUEST_BLOCKING", False)
+    @patch("search.tests.fixtures.playwright.CONTENT_TIME", 0)
+    async def test_fetch_page_without_request_blocking(self):
+        page = MockPage()
+        with patch.object(MockContext, "new_page", AsyncMock(return_value=page)):
+            await fetch_page(MockContext(), "https://test.com/search?q=test", self.distributor)
+        self.assertEqual(page.routes, [])
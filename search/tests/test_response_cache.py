@@ -0,0 +1,113 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from search.distributors import active_distributors, bump_distributors_version
+from search.models import QueryLogModel
+from search.query_log import flush_query_log
+from search.tests.fixtures.products import sample_product, sample_product_2
+from search.tests.test_views import (
+    mock_iter_search,
+    mock_iter_search_timed_out,
+    mock_perform_search,
+    mock_perform_search_timed_out,
+)
+
+
+async def mock_perform_search_no_results(query, timed_out=None):
+    return []
+
+
+class TestResponseCache(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        active_distributors.invalidate()
+        # The full results page is rendered unless a test enables streaming, whatever the environment sets
+        stream_results = patch("search.views.STREAM_RESULTS", False)
+        stream_results.start()
+        self.addCleanup(stream_results.stop)
+
+    @patch("search.views.perform_search", side_effect=mock_perform_search)
+    async def test_response_is_cached_for_the_normalized_query(self, mock_perform_search):
+        response = await self.async_client.get("/search/", {"query": "iPhone"})
+        other_response = await self.async_client.get("/search/", {"query": " iphone "})
+
+        mock_perform_search.assert_called_once()
+        self.assertContains(other_response, sample_product_2.name)
+        self.assertContains(other_response, 'Search results for " iphone "')
+        self.assertEqual(response["ETag"], other_response["ETag"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        # The mocked search does not log the query, the cached response does
+        await flush_query_log()
+        self.assertEqual((await QueryLogModel.objects.aget(query="iphone")).count, 1)
+
+    @patch("search.views.perform_search", side_effect=mock_perform_search)
+    async def test_conditional_request_is_not_modified(self, mock_perform_search):
+        response = await self.async_client.get("/search/", {"query": "test"})
+
+        not_modified = await self.async_client.get(
+            "/search/", {"query": "test"}, headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+        self.assertEqual(not_modified.content, b"")
+
+        modified = await self.async_client.get("/search/", {"query": "test"}, headers={"if-none-match": '"other"'})
+        self.assertEqual(modified.status_code, 200)
+        mock_perform_search.assert_called_once()
+
+    @patch("search.views.perform_search", side_effect=mock_perform_search_timed_out)
+    async def test_partial_response_is_not_cached(self, mock_perform_search):
+        response = await self.async_client.get("/search/", {"query": "test"})
+        await self.async_client.get("/search/", {"query": "test"})
+
+        self.assertEqual(mock_perform_search.call_count, 2)
+        self.assertNotIn("ETag", response)
+        self.assertIn("no-store", response["Cache-Control"])
+
+    @patch("search.views.perform_search", side_effect=mock_perform_search_no_results)
+    async def test_response_with_too_few_results_is_not_cached(self, mock_perform_search):
+        await self.async_client.get("/search/", {"query": "test"})
+        await self.async_client.get("/search/", {"query": "test"})
+
+        self.assertEqual(mock_perform_search.call_count, 2)
+
+    @patch("search.views.perform_search", side_effect=mock_perform_search)
+    async def test_distributor_changes_invalidate_responses(self, mock_perform_search):
+        response = await self.async_client.get("/search/", {"query": "test"})
+        bump_distributors_version()
+        active_distributors.invalidate()
+        other_response = await self.async_client.get("/search/", {"query": "test"})
+
+        self.assertEqual(mock_perform_search.call_count, 2)
+        self.assertNotEqual(response["ETag"], other_response["ETag"])
+        self.assertContains(other_response, sample_product.name)
+
+    async def stream(self, query: str) -> bytes:
+        response = await self.async_client.get("/search/stream/", {"query": query})
+        return b"".join([chunk async for chunk in response.streaming_content])
+
+    @patch("search.views.STREAM_RESULTS", True)
+    @patch("search.views.iter_search", side_effect=mock_iter_search)
+    async def test_streamed_response_is_cached(self, mock_iter_search):
+        response = await self.async_client.get("/search/", {"query": "test"})
+        self.assertContains(response, "/search/stream/")
+        self.assertNotIn("ETag", response)
+        await self.stream("test")
+
+        cached_response = await self.async_client.get("/search/", {"query": "test"})
+        self.assertContains(cached_response, sample_product_2.name)
+        self.assertNotContains(cached_response, "/search/stream/")
+        not_modified = await self.async_client.get(
+            "/search/", {"query": "test"}, headers={"if-none-match": cached_response["ETag"]}
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        mock_iter_search.assert_called_once()
+
+    @patch("search.views.STREAM_RESULTS", True)
+    @patch("search.views.iter_search", side_effect=mock_iter_search_timed_out)
+    async def test_partial_streamed_response_is_not_cached(self, mock_iter_search):
+        await self.stream("test")
+        response = await self.async_client.get("/search/", {"query": "test"})
+        self.assertContains(response, "/search/stream/")
@@ -0,0 +1,124 @@
+import os
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from search.models import DistributorSourceModel
+from search.product import Product
+from search.result_cache import (
+    CacheStatus,
+    acquire_refresh_lock,
+    cache_timeouts,
+    get_cached_html,
+    get_cached_result,
+    get_cached_result_ttl,
+    release_refresh_lock,
+    result_key,
+    selector_version,
+    set_cached_result,
+)
+from search.tests.fixtures.playwright import return_html
+from search.shop_farm import LISTING_SELECTORS, listing_page
+from search.tests.fixtures.products import sample_product
+
+
+class TestResultCache(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+        )
+
+    def test_result_not_in_cache(self):
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.MISS, []))
+
+    def test_product_is_cached(self):
+        set_cached_result(self.distributor, "test", [sample_product])
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.FRESH, [sample_product]))
+
+    def test_negative_result_is_cached(self):
+        set_cached_result(self.distributor, "test", [])
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.FRESH, []))
+
+    def test_product_becomes_stale_after_soft_timeout(self):
+        self.distributor.cache_soft_timeout = 0
+        set_cached_result(self.distributor, "test", [sample_product])
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.STALE, [sample_product]))
+
+    @patch("search.result_cache.CACHE_TIMEOUT", 60)
+    @patch("search.result_cache.CACHE_HARD_TIMEOUT", 600)
+    def test_cache_timeouts(self):
+        self.assertEqual(cache_timeouts(self.distributor), (60, 600))
+        self.distributor.cache_soft_timeout = 10
+        self.distributor.cache_hard_timeout = 20
+        self.assertEqual(cache_timeouts(self.distributor), (10, 20))
+        self.distributor.cache_hard_timeout = 5
+        self.assertEqual(cache_timeouts(self.distributor), (10, 10))
+
+    def test_cached_result_ttl(self):
+        self.assertEqual(get_cached_result_ttl(self.distributor, "test"), (None, []))
+        set_cached_result(self.distributor, "test", [sample_product])
+        ttl, products = get_cached_result_ttl(self.distributor, "test")
+        self.assertAlmostEqual(ttl, 60 * 60, delta=5)
+        self.assertEqual(products, [sample_product])
+
+    def test_refresh_lock(self):
+        self.assertTrue(acquire_refresh_lock(self.distributor, "test"))
+        self.assertFalse(acquire_refresh_lock(self.distributor, "test"))
+        release_refresh_lock(self.distributor, "test")
+        self.assertTrue(acquire_refresh_lock(self.distributor, "test"))
+
+    def test_selector_change_invalidates_result(self):
+        set_cached_result(self.distributor, "test", [sample_product])
+        version = selector_version(self.distributor)
+        self.distributor.product_price_selector = "#price"
+        self.assertNotEqual(selector_version(self.distributor), version)
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.MISS, []))
+
+    def test_container_selector_change_invalidates_result(self):
+        version = selector_version(self.distributor)
+        self.distributor.product_container_selector = ".product"
+        self.assertNotEqual(selector_version(self.distributor), version)
+
+    def test_result_key(self):
+        key = result_key(self.distributor, "test")
+        self.assertIn(f":{self.distributor.pk}:", key)
+        self.assertTrue(key.endswith(":test"))
+
+    def test_html_is_not_cached_by_default(self):
+        set_cached_result(self.distributor, "test", [sample_product], return_html["test"])
+        self.assertIsNone(get_cached_html(self.distributor, "test"))
+
+    @patch("search.result_cache.CACHE_RAW_HTML", True)
+    def test_html_is_cached(self):
+        set_cached_result(self.distributor, "test", [sample_product], return_html["test"])
+        self.assertIn("Test product", get_cached_html(self.distributor, "test"))
+
+    @patch("search.result_cache.CACHE_RAW_HTML", True)
+    async def test_html_is_trimmed_to_listing(self):
+        for name, selector in LISTING_SELECTORS.items():
+            setattr(self.distributor, name, selector)
+        html_content = listing_page(products=48, page_bytes=300_000)
+        products = await Product.list_from_html(self.distributor, html_content, limit=5)
+        set_cached_result(self.distributor, "test", products, html_content)
+
+        html = get_cached_html(self.distributor, "test")
+        self.assertLess(len(html), len(html_content) / 50)
+        self.assertEqual(await Product.list_from_html(self.distributor, html, limit=5), products)
+
+    @patch("search.result_cache.CACHE_RAW_HTML", True)
+    @patch("search.cache_codec.CACHE_MAX_ENTRY_BYTES", 1024)
+    def test_oversized_html_is_not_cached(self):
+        set_cached_result(self.distributor, "test", [], f"<html><body>{os.urandom(4096).hex()}</body></html>")
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.FRESH, []))
+        self.assertIsNone(get_cached_html(self.distributor, "test"))
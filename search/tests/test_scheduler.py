@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import httpx
+from django.core.cache import cache
+from django.test import TestCase
+from prometheus_client import REGISTRY
+
+from search.browser import BrowserPool
+from search.http_client import create_http_client
+from search.models import DistributorSourceModel, FetchStrategy
+from search.result_cache import CacheStatus, get_cached_result
+from search.scheduler import AdmissionError, Scheduler
+from search.search import fetch_result
+from search.tests.fixtures.playwright import MockChromium, return_html
+
+
+class TestScheduler(TestCase):
+    def setUp(self) -> None:
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+            concurrency_limit=2,
+        )
+        self.scheduler = Scheduler(max_pages=3, max_queue=10, queue_timeout=5)
+        self.running = 0
+        self.max_running = 0
+
+    async def fetch(self, page=False, duration=0.1):
+        async with self.scheduler.slot(self.distributor, page=page):
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            await asyncio.sleep(duration)
+            self.running -= 1
+
+    async def test_distributor_concurrency_limit(self):
+        await asyncio.gather(*[self.fetch() for _ in range(6)])
+        self.assertEqual(self.max_running, 2)
+
+    async def test_global_page_limit(self):
+        self.distributor.concurrency_limit = 10
+        await asyncio.gather(*[self.fetch(page=True) for _ in range(6)])
+        self.assertEqual(self.max_running, 3)
+        self.assertEqual(self.scheduler.active_pages, 0)
+
+    async def test_rate_limit(self):
+        self.distributor.rate_limit = 10
+        start_time = time.monotonic()
+        await asyncio.gather(*[self.fetch(duration=0) for _ in range(4)])
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.3)
+
+    async def test_queue_full(self):
+        self.scheduler.max_queue = 2
+        running = [asyncio.create_task(self.fetch()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        results = await asyncio.gather(*[self.fetch() for _ in range(4)], *running, return_exceptions=True)
+        rejected = [result for result in results if isinstance(result, AdmissionError)]
+        self.assertEqual(len(rejected), 2)
+        self.assertEqual(rejected[0].reason, "queue_full")
+
+    async def test_queue_timeout(self):
+        labels = {"distributor": "TestShop", "outcome": "timeout"}
+        timeouts = REGISTRY.get_sample_value("composearch_scheduler_wait_seconds_count", labels) or 0
+        self.scheduler.queue_timeout = 0.1
+        results = await asyncio.gather(*[self.fetch(duration=0.3) for _ in range(3)], return_exceptions=True)
+        self.assertEqual([type(result) for result in results], [type(None), type(None), AdmissionError])
+        self.assertEqual(results[2].reason, "timeout")
+        self.assertEqual(self.scheduler.waiting, 0)
+        self.assertEqual(REGISTRY.get_sample_value("composearch_scheduler_wait_seconds_count", labels), timeouts + 1)
+
+    async def test_slots_are_released_after_timeout(self):
+        self.scheduler.queue_timeout = 0.1
+        await asyncio.gather(*[self.fetch(duration=0.3) for _ in range(3)], return_exceptions=True)
+        await asyncio.gather(*[self.fetch() for _ in range(2)])
+        self.assertEqual(self.max_running, 2)
+
+
+class TestAdmissionControl(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+            fetch_strategy=FetchStrategy.HTTP,
+        )
+        self.browser = BrowserPool(
+            launcher=MockChromium().launch,
+            http_client_factory=lambda: create_http_client(transport=httpx.MockTransport(self.handle_request)),
+            scheduler=Scheduler(max_queue=0),
+        )
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text=return_html["test"])
+
+    async def test_rejected_fetch_is_not_cached(self):
+        products = await fetch_result(self.browser, self.distributor, "test")
+        self.assertEqual(products, [])
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.MISS, []))
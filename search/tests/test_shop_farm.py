@@ -0,0 +1,67 @@
+import httpx
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from search.management.commands.benchmark_search import Command, benchmark_cache, change
+from search.shop_farm import ShopFarm, shop_profiles
+
+
+class TestShopFarm(TestCase):
+    def setUp(self) -> None:
+        self.profiles = shop_profiles(2, latency_median=0.01, latency_sigma=0.1, page_bytes=100_000)
+        self.farm = ShopFarm(self.profiles)
+        self.farm.start()
+        self.addCleanup(self.farm.stop)
+
+    def test_serves_search_page_of_shop(self):
+        profile = self.profiles[0]
+
+        response = httpx.get(self.farm.base_url(profile.name) + "search?q=test")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(len(response.content), profile.page_bytes)
+        self.assertEqual(response.text.count('class="product-item"'), profile.products)
+        self.assertEqual(self.farm.requests, 1)
+        self.assertEqual(self.farm.bytes_sent, len(response.content))
+
+    def test_serves_assets(self):
+        response = httpx.get(self.farm.base_url(self.profiles[0].name) + "static/shop.css")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], "text/css")
+
+    def test_unknown_shop_not_found(self):
+        response = httpx.get(self.farm.base_url("unknown") + "search?q=test")
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_shop_profiles_are_reproducible(self):
+        self.assertEqual(self.profiles, shop_profiles(2, latency_median=0.01, latency_sigma=0.1, page_bytes=100_000))
+        self.assertNotEqual(self.profiles[0].page_bytes, self.profiles[1].page_bytes)
+
+
+class TestBenchmarkCompare(TestCase):
+    def results(self, p95: float, throughput: float) -> dict:
+        return {"levels": [{"target": "perform_search", "concurrency": 5, "p95": p95, "throughput": throughput}]}
+
+    def test_change(self):
+        self.assertEqual(change(2.0, 2.5), 25.0)
+        self.assertEqual(change(0, 1.0), 0.0)
+
+    def test_compare_within_max_regression(self):
+        Command().compare(self.results(1.0, 10), self.results(1.1, 9), max_regression=20)
+
+    def test_compare_fails_on_regression(self):
+        with self.assertRaisesMessage(CommandError, "perform_search at concurrency 5"):
+            Command().compare(self.results(1.0, 10), self.results(1.5, 10), max_regression=20)
+
+        with self.assertRaisesMessage(CommandError, "perform_search at concurrency 5"):
+            Command().compare(self.results(1.0, 10), self.results(1.0, 7), max_regression=20)
+
+    def test_benchmark_cache_is_isolated(self):
+        cache.set("result:test", b"real")
+        with benchmark_cache():
+            self.assertIsNone(cache.get("result:test"))
+            cache.set("result:test", b"benchmark")
+        self.assertEqual(cache.get("result:test"), b"real")
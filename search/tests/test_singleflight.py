@@ -0,0 +1,69 @@
+import asyncio
+import concurrent.futures
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from search.browser import BrowserPool
+from search.singleflight import SingleFlight
+
+
+class TestSingleFlight(TestCase):
+    def setUp(self) -> None:
+        self.pool = BrowserPool(health_interval=0)
+        self.in_flight = SingleFlight()
+        self.calls = 0
+
+    def tearDown(self) -> None:
+        self.pool.shutdown()
+
+    async def slow_call(self, value):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        return value
+
+    async def failing_call(self):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        raise RuntimeError("fetch failed")
+
+    async def test_concurrent_calls_are_coalesced(self):
+        results = await asyncio.gather(*[self.in_flight.run("key", self.pool, self.slow_call, i) for i in range(5)])
+        self.assertEqual(results, [0] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertNotIn("key", self.in_flight)
+
+    async def test_different_keys_are_not_coalesced(self):
+        results = await asyncio.gather(
+            self.in_flight.run("key", self.pool, self.slow_call, 1),
+            self.in_flight.run("other", self.pool, self.slow_call, 2),
+        )
+        self.assertEqual(results, [1, 2])
+        self.assertEqual(self.calls, 2)
+
+    async def test_sequential_calls_are_not_coalesced(self):
+        await self.in_flight.run("key", self.pool, self.slow_call, 1)
+        await self.in_flight.run("key", self.pool, self.slow_call, 2)
+        self.assertEqual(self.calls, 2)
+
+    async def test_exception_is_shared(self):
+        results = await asyncio.gather(
+            *[self.in_flight.run("key", self.pool, self.failing_call) for _ in range(3)], return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(self.calls, 1)
+
+    async def test_cancelled_caller_does_not_cancel_call(self):
+        task = asyncio.create_task(self.in_flight.run("key", self.pool, self.slow_call, 1))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        self.assertEqual(await self.in_flight.run("key", self.pool, self.slow_call, 2), 1)
+        self.assertEqual(self.calls, 1)
+
+    async def test_call_finished_before_it_is_registered(self):
+        finished = concurrent.futures.Future()
+        finished.set_result(1)
+        with patch.object(self.pool, "spawn", return_value=finished):
+            result = await asyncio.wait_for(self.in_flight.run("key", self.pool, self.slow_call, 1), timeout=1)
+        self.assertEqual(result, 1)
+        self.assertNotIn("key", self.in_flight)
@@ -0,0 +1,119 @@
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache, caches
+from django.test import TestCase
+from prometheus_client import REGISTRY
+
+from search.tests.fixtures.cache import MockPubSubRedis
+from search.tiered_cache import LocalTier, TieredCache
+
+
+def lookups(tier: str, result: str) -> float:
+    return REGISTRY.get_sample_value("composearch_cache_lookups_total", {"tier": tier, "result": result}) or 0
+
+
+class TestLocalTier(TestCase):
+    def test_evicts_least_recently_used(self):
+        tier = LocalTier(max_entries=2, max_bytes=1024)
+        tier.set("a", 1, timeout=60, generation=0)
+        tier.set("b", 2, timeout=60, generation=0)
+        tier.get("a")
+        tier.set("c", 3, timeout=60, generation=0)
+
+        self.assertEqual((tier.get("a"), tier.get("b"), tier.get("c")), (1, None, 3))
+
+    def test_evicts_to_max_bytes(self):
+        tier = LocalTier(max_entries=100, max_bytes=1000)
+        for key in "abc":
+            tier.set(key, b"x" * 400, timeout=60, generation=0)
+
+        self.assertEqual(len(tier), 2)
+        self.assertLessEqual(tier.nbytes, 1000)
+        self.assertIsNone(tier.get("a"))
+        tier.set("big", b"x" * 2000, timeout=60, generation=0)
+        self.assertIsNone(tier.get("big"))
+
+    def test_values_expire(self):
+        tier = LocalTier(max_entries=10, max_bytes=1024)
+        tier.set("a", 1, timeout=60, generation=0)
+        with patch("search.tiered_cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(tier.get("a"))
+        self.assertEqual(tier.nbytes, 0)
+
+    def test_values_read_before_an_invalidation_are_not_stored(self):
+        tier = LocalTier(max_entries=10, max_bytes=1024)
+        generation = tier.generation
+        tier.discard("a")
+        tier.set("a", 1, timeout=60, generation=generation)
+
+        self.assertIsNone(tier.get("a"))
+
+
+class TestTieredCache(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_hot_keys_are_served_from_the_local_tier(self):
+        cache.set("result:test", b"products")
+        local_hits, remote_hits = lookups("local", "hit"), lookups("remote", "hit")
+
+        with patch.object(caches["shared"], "get", wraps=caches["shared"].get) as remote_get:
+            self.assertEqual(cache.get("result:test"), b"products")
+            self.assertEqual(cache.get("result:test"), b"products")
+
+        self.assertEqual(remote_get.call_count, 1)
+        self.assertEqual(lookups("local", "hit"), local_hits + 1)
+        self.assertEqual(lookups("remote", "hit"), remote_hits + 1)
+
+    def test_writes_invalidate_the_local_tier(self):
+        cache.set("result:test", b"old")
+        cache.get("result:test")
+        cache.set("result:test", b"new")
+        self.assertEqual(cache.get("result:test"), b"new")
+
+        cache.delete("result:test")
+        self.assertIsNone(cache.get("result:test"))
+
+    def test_misses_are_not_kept(self):
+        self.assertIsNone(cache.get("result:test"))
+        caches["shared"].set("result:test", b"products")
+        self.assertEqual(cache.get("result:test"), b"products")
+
+    def test_other_keys_go_to_the_shared_cache(self):
+        cache.add("lease:test", True)
+        self.assertTrue(cache.get("lease:test"))
+        caches["shared"].delete("lease:test")
+        self.assertIsNone(cache.get("lease:test"))
+
+    def test_batches_of_other_keys_go_to_the_shared_cache_at_once(self):
+        cache.set_many({"result:test": b"products", "circuit:1:failures": 2, "circuit:1:opened": True})
+        cache.get("result:test")
+
+        with patch.object(caches["shared"], "get_many", wraps=caches["shared"].get_many) as remote_get_many:
+            values = cache.get_many(["result:test", "circuit:1:failures", "circuit:1:opened", "circuit:2:opened"])
+        remote_get_many.assert_called_once_with(
+            ["circuit:1:failures", "circuit:1:opened", "circuit:2:opened"], version=None
+        )
+        self.assertEqual(values, {"result:test": b"products", "circuit:1:failures": 2, "circuit:1:opened": True})
+
+        cache.delete_many(["result:test", "circuit:1:failures", "circuit:1:opened"])
+        self.assertEqual(cache.get_many(["result:test", "circuit:1:failures", "circuit:1:opened"]), {})
+
+    def test_writes_of_other_processes_are_invalidated(self):
+        client = MockPubSubRedis()
+        options = {"REMOTE": "shared", "INVALIDATION_URL": "redis://test"}
+        with patch("search.tiered_cache.redis.Redis.from_url", return_value=client):
+            worker = TieredCache("test-worker", {"OPTIONS": options})
+            other_worker = TieredCache("test-other-worker", {"OPTIONS": options})
+        while not all(pubsub.channels for pubsub in client.subscribers):
+            time.sleep(0.01)
+
+        other_worker.set("result:test", b"old")
+        self.assertEqual(worker.get("result:test"), b"old")
+        other_worker.set("result:test", b"new")
+
+        deadline = time.monotonic() + 1
+        while len(worker.local) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(worker.get("result:test"), b"new")
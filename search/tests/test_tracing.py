@@ -0,0 +1,117 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+from django.core.cache import cache
+from django.test import TestCase
+
+from search.browser import BrowserPool
+from search.http_client import create_http_client
+from search.jobs import FetchJob
+from search.models import DistributorSourceModel, FetchStrategy
+from search.tests.fixtures.jobs import MockJobQueue
+from search.tests.fixtures.playwright import MockChromium, return_html
+from search.tracing import FileSpanExporter, configure_tracing, tracer
+from search.worker import do_job
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+class TestTracing(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.exporter = FileSpanExporter(str(Path(cls.directory.name) / "traces.jsonl"))
+        configure_tracing(cls.exporter)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.exporter.shutdown()
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        cache.clear()
+        Path(self.exporter.path).write_text("")
+        # The full results page is rendered unless a test enables streaming, whatever the environment sets
+        stream_results = patch("search.views.STREAM_RESULTS", False)
+        stream_results.start()
+        self.addCleanup(stream_results.stop)
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+            fetch_strategy=FetchStrategy.HTTP,
+        )
+        self.browser = BrowserPool(
+            launcher=MockChromium().launch,
+            http_client_factory=lambda: create_http_client(
+                transport=httpx.MockTransport(lambda request: httpx.Response(200, text=return_html["test"]))
+            ),
+        )
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
+
+    def spans(self) -> dict[str, dict]:
+        lines = Path(self.exporter.path).read_text().splitlines()
+        return {span["name"]: span for span in map(json.loads, lines)}
+
+    def assertChildOf(self, span: dict, parent: dict) -> None:
+        self.assertEqual(span["context"]["trace_id"], parent["context"]["trace_id"])
+        self.assertEqual(span["parent_id"], parent["context"]["span_id"])
+
+    async def test_search_spans(self):
+        with patch("search.search.get_browser_pool", return_value=self.browser):
+            response = await self.async_client.get("/search/", {"query": "test"})
+        self.assertEqual(response.status_code, 200)
+
+        spans = self.spans()
+        self.assertIsNone(spans["results_view"]["parent_id"])
+        self.assertEqual(spans["results_view"]["attributes"]["search.results"], 1)
+        self.assertChildOf(spans["search"], spans["results_view"])
+        self.assertChildOf(spans["distributors.get"], spans["search"])
+        self.assertChildOf(spans["fetch_result"], spans["search"])
+        self.assertEqual(spans["fetch_result"]["attributes"]["distributor.name"], "TestShop")
+        self.assertEqual(spans["fetch_result"]["attributes"]["cache.outcome"], "miss")
+        # The fetch runs on the browser pool event loop and still nests under the search
+        self.assertEqual(spans["fetch.http"]["context"]["trace_id"], spans["results_view"]["context"]["trace_id"])
+        self.assertEqual(spans["parse"]["attributes"]["parse.products"], 1)
+        self.assertEqual(spans["cache.set"]["context"]["trace_id"], spans["results_view"]["context"]["trace_id"])
+
+    async def test_search_continues_trace_of_request(self):
+        with patch("search.search.get_browser_pool", return_value=self.browser):
+            await self.async_client.get("/search/", {"query": "test"}, headers={"traceparent": TRACEPARENT})
+
+        spans = self.spans()
+        self.assertEqual(spans["results_view"]["context"]["trace_id"], "0x0af7651916cd43dd8448eb211c80319c")
+        self.assertEqual(spans["results_view"]["parent_id"], "0xb7ad6b7169203331")
+
+    async def test_job_continues_trace_of_search(self):
+        job_queue = MockJobQueue()
+        with tracer.start_as_current_span("job.wait"):
+            job_queue.put(FetchJob(self.distributor.pk, "test"))
+        job = job_queue.get(timeout=0)
+        self.assertIn("traceparent", job.trace_context)
+
+        await do_job(self.browser, job_queue, job)
+
+        spans = self.spans()
+        self.assertChildOf(spans["job"], spans["job.wait"])
+        self.assertEqual(spans["job"]["kind"], "SpanKind.CONSUMER")
+        self.assertEqual(spans["fetch.http"]["context"]["trace_id"], spans["job.wait"]["context"]["trace_id"])
+
+    def test_trace_context_is_not_part_of_job_identity(self):
+        job = FetchJob.loads(FetchJob(1, "test", trace_context={"traceparent": TRACEPARENT}).dumps())
+        self.assertEqual(job, FetchJob(1, "test"))
+        self.assertEqual(job.trace_context, {"traceparent": TRACEPARENT})
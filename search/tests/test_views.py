@@ -0,0 +1,78 @@
+import json
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from search.tests.fixtures.products import sample_product, sample_product_2
+
+
+async def mock_iter_search(query, timed_out=None):
+    for product in (sample_product_2, sample_product):
+        yield product
+
+
+async def mock_iter_search_timed_out(query, timed_out=None):
+    yield sample_product
+    timed_out.append("SlowShop")
+
+
+async def mock_perform_search(query, timed_out=None):
+    return [sample_product, sample_product_2]
+
+
+async def mock_perform_search_timed_out(query, timed_out=None):
+    timed_out.append("SlowShop")
+    return [sample_product]
+
+
+class TestViews(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        # The full results page is rendered unless a test enables streaming, whatever the environment sets
+        stream_results = patch("search.views.STREAM_RESULTS", False)
+        stream_results.start()
+        self.addCleanup(stream_results.stop)
+
+    @patch("search.views.perform_search", side_effect=mock_perform_search)
+    async def test_results_view(self, mock_perform_search):
+        response = await self.async_client.get("/search/", {"query": "test"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, sample_product.name)
+        self.assertContains(response, sample_product_2.name)
+
+    @patch("search.views.perform_search", side_effect=mock_perform_search_timed_out)
+    async def test_results_view_timed_out(self, mock_perform_search):
+        response = await self.async_client.get("/search/", {"query": "test"})
+        self.assertContains(response, sample_product.name)
+        self.assertContains(response, "SlowShop did not respond in time.")
+
+    @patch("search.views.STREAM_RESULTS", True)
+    @patch("search.views.perform_search", side_effect=mock_perform_search)
+    async def test_results_view_stream_mode(self, mock_perform_search):
+        response = await self.async_client.get("/search/", {"query": "test"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "/search/stream/")
+        mock_perform_search.assert_not_called()
+
+    @patch("search.views.iter_search", side_effect=mock_iter_search)
+    async def test_results_stream_view(self, mock_iter_search):
+        response = await self.async_client.get("/search/stream/", {"query": "test"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        lines = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([line["name"] for line in lines], [sample_product_2.name, sample_product.name])
+        self.assertEqual(lines[1]["price"], str(sample_product.price))
+
+    @patch("search.views.iter_search", side_effect=mock_iter_search_timed_out)
+    async def test_results_stream_view_timed_out(self, mock_iter_search):
+        response = await self.async_client.get("/search/stream/", {"query": "test"})
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        lines = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(lines[0]["name"], sample_product.name)
+        self.assertEqual(lines[1], {"timed_out": ["SlowShop"]})
+
+    async def test_results_stream_view_no_query(self):
+        response = await self.async_client.get("/search/stream/")
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(content, b"")
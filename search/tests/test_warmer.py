@@ -0,0 +1,70 @@
+import time
+from unittest.mock import patch
+
+import httpx
+from django.core.cache import cache
+from django.test import TestCase
+
+from search.browser import BrowserPool
+from search.http_client import create_http_client
+from search.models import DistributorSourceModel, FetchStrategy, QueryLogModel
+from search.result_cache import CacheStatus, get_cached_result, set_cached_result
+from search.tests.fixtures.playwright import MockChromium, return_html
+from search.tests.fixtures.products import sample_product, sample_product_0_vat
+from search.warmer import warm_cache
+
+
+class TestWarmCache(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+            fetch_strategy=FetchStrategy.HTTP,
+        )
+        for query, count in (("test", 10), ("test-negative", 5), ("rare", 1)):
+            QueryLogModel.objects.create(query=query, count=count)
+        self.requested_urls = []
+        self.browser = BrowserPool(
+            launcher=MockChromium().launch,
+            http_client_factory=lambda: create_http_client(transport=httpx.MockTransport(self.handle_request)),
+        )
+
+    def tearDown(self) -> None:
+        self.browser.shutdown()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.requested_urls.append(str(request.url))
+        return httpx.Response(200, text=return_html.get(request.url.params["q"], ""))
+
+    async def test_warm_top_queries(self):
+        self.assertEqual(await warm_cache(self.browser, top=2, margin=60), 2)
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.FRESH, [sample_product]))
+        self.assertEqual(get_cached_result(self.distributor, "rare"), (CacheStatus.MISS, []))
+
+    async def test_fresh_results_are_not_warmed(self):
+        await warm_cache(self.browser, top=2, margin=60)
+        self.assertEqual(await warm_cache(self.browser, top=2, margin=60), 0)
+        self.assertEqual(len(self.requested_urls), 2)
+
+    async def test_results_are_refreshed_before_they_expire(self):
+        set_cached_result(self.distributor, "test", [sample_product_0_vat])
+        with patch("search.result_cache.time.time", return_value=time.time() + 60 * 60 - 30):
+            self.assertEqual(await warm_cache(self.browser, top=1, margin=60), 1)
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.FRESH, [sample_product]))
+
+    async def test_stale_products_are_kept_if_refresh_finds_nothing(self):
+        set_cached_result(self.distributor, "test-negative", [sample_product_0_vat])
+        with patch("search.result_cache.time.time", return_value=time.time() + 2 * 60 * 60):
+            await warm_cache(self.browser, top=2, margin=60)
+            self.assertEqual(
+                get_cached_result(self.distributor, "test-negative"), (CacheStatus.STALE, [sample_product_0_vat])
+            )
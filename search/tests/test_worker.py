@@ -0,0 +1,106 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import httpx
+from django.core.cache import cache
+from django.test import TestCase
+
+from search.browser import BrowserPool
+from search.http_client import create_http_client
+from search.jobs import FetchJob
+from search.models import DistributorSourceModel, FetchStrategy
+from search.result_cache import CacheStatus, acquire_refresh_lock, get_cached_result, set_cached_result
+from search.search import fetch_result
+from search.tests.fixtures.jobs import MockJobQueue
+from search.tests.fixtures.playwright import MockChromium, return_html
+from search.tests.fixtures.products import sample_product, sample_product_0_vat
+from search.worker import do_job, run_worker
+
+
+class TestScraperWorker(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.distributor = DistributorSourceModel.objects.create(
+            name="TestShop",
+            base_url="https://test.com/",
+            search_string="search?q=%s",
+            currency="EUR",
+            included_vat=10,
+            product_name_selector="#name",
+            product_url_selector="a",
+            product_picture_url_selector="img",
+            product_price_selector="div > span",
+            active=True,
+            fetch_strategy=FetchStrategy.HTTP,
+        )
+        self.job_queue = MockJobQueue()
+        self.requested_urls = []
+        # The web process has its own pool, which must not fetch anything
+        self.web_pool = BrowserPool(launcher=MockChromium().launch, http_client_factory=self.no_http_client)
+        self.worker_pool = BrowserPool(
+            launcher=MockChromium().launch,
+            http_client_factory=lambda: create_http_client(transport=httpx.MockTransport(self.handle_request)),
+        )
+
+    def tearDown(self) -> None:
+        self.web_pool.shutdown()
+        self.worker_pool.shutdown()
+
+    def no_http_client(self) -> httpx.AsyncClient:
+        raise AssertionError("The web process fetched a page")
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.requested_urls.append(str(request.url))
+        return httpx.Response(200, text=return_html[request.url.params["q"]])
+
+    async def test_job_is_queued_once(self):
+        job = FetchJob(self.distributor.pk, "test")
+        self.assertTrue(self.job_queue.put(job))
+        self.assertFalse(self.job_queue.put(job))
+        self.assertEqual(len(self.job_queue), 1)
+        self.assertEqual(self.job_queue.get(timeout=0), job)
+        self.assertTrue(self.job_queue.pending(job))
+        self.job_queue.done(job)
+        self.assertFalse(self.job_queue.pending(job))
+
+    async def test_do_job(self):
+        job = FetchJob(self.distributor.pk, "test")
+        self.job_queue.put(job)
+        await do_job(self.worker_pool, self.job_queue, self.job_queue.get(timeout=0))
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.FRESH, [sample_product]))
+        self.assertFalse(self.job_queue.pending(job))
+
+    async def test_job_of_inactive_distributor_is_dropped(self):
+        self.distributor.active = False
+        await self.distributor.asave()
+        await do_job(self.worker_pool, self.job_queue, FetchJob(self.distributor.pk, "test"))
+        self.assertEqual(self.requested_urls, [])
+
+    async def test_search_waits_for_worker(self):
+        worker = asyncio.create_task(run_worker(self.worker_pool, self.job_queue, concurrency=2, poll_timeout=0.1))
+        try:
+            with patch("search.search.get_job_queue", return_value=self.job_queue):
+                searches = [fetch_result(self.web_pool, self.distributor, "test") for _ in range(3)]
+                results = await asyncio.gather(*searches)
+        finally:
+            worker.cancel()
+        self.assertEqual(results, [[sample_product]] * 3)
+        self.assertEqual(self.requested_urls, ["https://test.com/search?q=test"])
+        self.assertEqual(self.web_pool.browsers, [])
+
+    async def test_stale_result_is_refreshed_by_worker(self):
+        set_cached_result(self.distributor, "test", [sample_product_0_vat])
+        stale_time = time.time() + 2 * 60 * 60
+        with patch("search.result_cache.time.time", return_value=stale_time), patch(
+            "search.search.get_job_queue", return_value=self.job_queue
+        ):
+            products = await fetch_result(self.web_pool, self.distributor, "test")
+        self.assertEqual(products, [sample_product_0_vat])
+        job = self.job_queue.get(timeout=0)
+        self.assertEqual(job, FetchJob(self.distributor.pk, "test", refresh=True))
+
+        await do_job(self.worker_pool, self.job_queue, job)
+        self.assertEqual(get_cached_result(self.distributor, "test"), (CacheStatus.FRESH, [sample_product]))
+        # The worker released the refresh lock
+        self.assertTrue(acquire_refresh_lock(self.distributor, "test"))
@@ -0,0 +1,270 @@
+"""Two-tier cache backend: a bounded in-process LRU in front of the shared cache"""
+
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable
+
+import redis
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from search.metrics import CACHE_LOOKUPS
+
+# Message published on the invalidation channel when the whole cache is cleared
+CLEAR_ALL = "*"
+
+log = logging.getLogger(__name__)
+
+
+class LocalTier:
+    """
+    Keeps cache values of the process in memory, pickled, each until its own timeout.
+
+    Bounded by the number of entries and their total size, evicting the least recently used first.
+    Every invalidation bumps the generation, so that a value read from the shared cache before
+    a concurrent invalidation is not stored afterwards.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.nbytes = 0
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires, data = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return default
+            self._entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key: str, value: Any, timeout: float, generation: int) -> None:
+        """
+        Takes a key, a value, the seconds it stays in the tier and the generation read before
+        the value was fetched. Stores the value unless the tier was invalidated since.
+        """
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + timeout, data)
+            self.nbytes += len(data)
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self.generation += 1
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= len(entry[1])
+
+
+class InvalidationListener(threading.Thread):
+    """
+    Drops the keys written by the other worker processes from the local tier,
+    as they are published on a Redis pub/sub channel.
+
+    The whole tier is cleared whenever the subscription is (re)established,
+    as invalidations published while it was down are lost.
+    """
+
+    def __init__(self, client: redis.Redis, channel: str, tier: LocalTier) -> None:
+        super().__init__(name=f"cache-invalidation-{channel}", daemon=True)
+        self.client = client
+        self.channel = channel
+        self.tier = tier
+
+    def run(self) -> None:
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.tier.clear()
+                for message in pubsub.listen():
+                    self.handle(message)
+            except redis.RedisError as e:
+                log.warning(f"Cache invalidation channel {self.channel} lost: {e}")
+                self.tier.clear()
+                time.sleep(1)
+
+    def handle(self, message: dict) -> None:
+        if message.get("type") != "message":
+            return
+        key = message["data"].decode() if isinstance(message["data"], bytes) else message["data"]
+        if key == CLEAR_ALL:
+            self.tier.clear()
+        else:
+            self.tier.discard(key)
+
+
+_tiers: dict[str, LocalTier] = {}
+_listeners: dict[str, tuple[int, InvalidationListener]] = {}
+_tiers_lock = threading.Lock()
+
+
+def get_local_tier(name: str, max_entries: int, max_bytes: int) -> LocalTier:
+    """
+    Returns the local tier of the given name, creating it on first use.
+
+    Django creates a cache backend per thread, the tier is shared by all of them.
+    """
+    with _tiers_lock:
+        if name not in _tiers:
+            _tiers[name] = LocalTier(max_entries, max_bytes)
+        return _tiers[name]
+
+
+def start_invalidation_listener(name: str, client: redis.Redis, channel: str, tier: LocalTier) -> None:
+    """
+    Starts the invalidation listener of the local tier of the given name, unless it runs in this process.
+    A new listener is started after a fork, as threads do not survive it.
+    """
+    with _tiers_lock:
+        pid, listener = _listeners.get(name, (None, None))
+        if listener is None or pid != os.getpid():
+            listener = InvalidationListener(client, channel, tier)
+            listener.start()
+            _listeners[name] = (os.getpid(), listener)
+
+
+class TieredCache(BaseCache):
+    """
+    Serves the keys starting with one of LOCAL_KEY_PREFIXES from an in-process LRU for up to LOCAL_TIMEOUT seconds,
+    in front of the shared cache named by REMOTE. All other keys and all writes go to the shared cache.
+
+    Every write drops the key from the local tier and, with INVALIDATION_URL set, publishes it on the Redis
+    INVALIDATION_CHANNEL, so that the other worker processes drop it too. Without it, as with LocMemCache
+    in development, invalidation is local to the process.
+    """
+
+    def __init__(self, location: str, params: dict) -> None:
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._remote_alias = options.get("REMOTE", "shared")
+        self._local_timeout = float(options.get("LOCAL_TIMEOUT", 5))
+        self._key_prefixes = tuple(options.get("LOCAL_KEY_PREFIXES", ("result:", "response:")))
+        self._channel = options.get("INVALIDATION_CHANNEL", "composearch:cache-invalidation")
+        self._tier = get_local_tier(location, self._max_entries, int(options.get("MAX_BYTES", 64 * 1024 * 1024)))
+        self._publisher = None
+        if options.get("INVALIDATION_URL") and self._local_timeout > 0:
+            self._publisher = redis.Redis.from_url(options["INVALIDATION_URL"])
+            start_invalidation_listener(location, self._publisher, self._channel, self._tier)
+
+    @property
+    def remote(self) -> BaseCache:
+        return caches[self._remote_alias]
+
+    @property
+    def local(self) -> LocalTier:
+        return self._tier
+
+    def is_local(self, key: str) -> bool:
+        return self._local_timeout > 0 and key.startswith(self._key_prefixes)
+
+    def get(self, key: str, default: Any = None, version: int | None = None) -> Any:
+        if not self.is_local(key):
+            return self.remote.get(key, default, version=version)
+
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self._tier.get(local_key, self._missing_key)
+        if value is not self._missing_key:
+            CACHE_LOOKUPS.labels(tier="local", result="hit").inc()
+            return value
+        CACHE_LOOKUPS.labels(tier="local", result="miss").inc()
+
+        generation = self._tier.generation
+        value = self.remote.get(key, self._missing_key, version=version)
+        if value is self._missing_key:
+            CACHE_LOOKUPS.labels(tier="remote", result="miss").inc()
+            return default
+        CACHE_LOOKUPS.labels(tier="remote", result="hit").inc()
+        self._tier.set(local_key, value, self._local_timeout, generation)
+        return value
+
+    def get_many(self, keys: Iterable[str], version: int | None = None) -> dict[str, Any]:
+        keys = list(keys)
+        remote_keys = [key for key in keys if not self.is_local(key)]
+        values = self.remote.get_many(remote_keys, version=version) if remote_keys else {}
+        for key in keys:
+            if self.is_local(key):
+                value = self.get(key, self._missing_key, version=version)
+                if value is not self._missing_key:
+                    values[key] = value
+        return values
+
+    def set(self, key: str, value: Any, timeout: float | None = DEFAULT_TIMEOUT, version: int | None = None) -> None:
+        self.remote.set(key, value, timeout=timeout, version=version)
+        self._invalidate(key, version)
+
+    def add(self, key: str, value: Any, timeout: float | None = DEFAULT_TIMEOUT, version: int | None = None) -> bool:
+        added = self.remote.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._invalidate(key, version)
+        return added
+
+    def touch(self, key: str, timeout: float | None = DEFAULT_TIMEOUT, version: int | None = None) -> bool:
+        return self.remote.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key: str, version: int | None = None) -> bool:
+        deleted = self.remote.delete(key, version=version)
+        self._invalidate(key, version)
+        return deleted
+
+    def delete_many(self, keys: Iterable[str], version: int | None = None) -> None:
+        keys = list(keys)
+        self.remote.delete_many(keys, version=version)
+        for key in keys:
+            self._invalidate(key, version)
+
+    def incr(self, key: str, delta: int = 1, version: int | None = None) -> int:
+        value = self.remote.incr(key, delta, version=version)
+        self._invalidate(key, version)
+        return value
+
+    def clear(self) -> None:
+        self.remote.clear()
+        self._tier.clear()
+        self._publish(CLEAR_ALL)
+
+    def _invalidate(self, key: str, version: int | None) -> None:
+        if self.is_local(key):
+            local_key = self.make_and_validate_key(key, version=version)
+            self._tier.discard(local_key)
+            self._publish(local_key)
+
+    def _publish(self, message: str) -> None:
+        if self._publisher is None:
+            return
+        try:
+            self._publisher.publish(self._channel, message)
+        except redis.RedisError as e:
+            log.warning(f"Cache invalidation of {message} not published: {e}")
@@ -0,0 +1,105 @@
+"""Tracing of searches with OpenTelemetry"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Sequence
+
+from decouple import config
+from opentelemetry import context, trace
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+# Where finished spans are exported: none, otlp or file
+TRACING_EXPORTER = config("TRACING_EXPORTER", default="none")
+TRACING_OTLP_ENDPOINT = config("TRACING_OTLP_ENDPOINT", default="http://localhost:4318/v1/traces")
+# JSON lines file of the spans, for the file exporter
+TRACING_FILE = config("TRACING_FILE", default="traces.jsonl")
+# Share of the searches that are traced, unless the traceparent header of the request decided it
+TRACING_SAMPLE_RATIO = config("TRACING_SAMPLE_RATIO", cast=float, default=1)
+TRACING_SERVICE_NAME = config("TRACING_SERVICE_NAME", default="composearch")
+
+# Until tracing is configured, spans of this tracer are not recorded and cost next to nothing
+tracer = trace.get_tracer("composearch")
+
+log = logging.getLogger(__name__)
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        with self._lock:
+            if self._file.closed:
+                return SpanExportResult.FAILURE
+            self._file.write("".join(span.to_json(indent=None) + "\n" for span in spans))
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+async def run_in_context(ctx: context.Context, func: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+    """
+    Takes a trace context, a coroutine function and its arguments.
+    Awaits the coroutine with the trace context attached, so that its spans nest under the spans of the context.
+    """
+    token = context.attach(ctx)
+    try:
+        return await func(*args)
+    finally:
+        context.detach(token)
+
+
+def create_exporter(exporter: str) -> SpanExporter | None:
+    """
+    Takes the name of an exporter: none, otlp or file.
+    Returns the SpanExporter configured for it, or None if spans are not exported.
+    """
+    if exporter == "none":
+        return None
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter(endpoint=TRACING_OTLP_ENDPOINT)
+    if exporter == "file":
+        return FileSpanExporter(TRACING_FILE)
+    raise ValueError(f"Tracing exporter {exporter} not supported")
+
+
+def configure_tracing(exporter: str | SpanExporter = TRACING_EXPORTER) -> TracerProvider | None:
+    """
+    Takes the name of an exporter or a SpanExporter.
+
+    Installs the process-wide TracerProvider, if none is installed yet, and adds the exporter to it.
+    The OTLP exporter sends spans in batches from a background thread, the others export each span
+    as it ends.
+    Returns the TracerProvider, or None if spans are not exported.
+    """
+    span_exporter = create_exporter(exporter) if isinstance(exporter, str) else exporter
+    if span_exporter is None:
+        return None
+
+    provider = trace.get_tracer_provider()
+    if not isinstance(provider, TracerProvider):
+        provider = TracerProvider(
+            resource=Resource.create({SERVICE_NAME: TRACING_SERVICE_NAME}),
+            sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+        )
+        trace.set_tracer_provider(provider)
+    if exporter == "otlp":
+        provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    else:
+        provider.add_span_processor(SimpleSpanProcessor(span_exporter))
+    log.debug(f"Tracing to {span_exporter.__class__.__name__}")
+    return provider
@@ -5,4 +5,6 @@ from . import views
 urlpatterns = [
     path('', views.home_view, name='home'),
     path('search/', views.results_view, name='results'),
+    path('search/stream/', views.results_stream_view, name='results_stream'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
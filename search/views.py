@@ -1,9 +1,26 @@
+import json
 import logging
 import time
+from dataclasses import asdict
 
+from decouple import config
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.views.decorators.cache import never_cache
+from opentelemetry.context import Context
+from opentelemetry.propagate import extract
+from opentelemetry.trace import SpanKind
 
-from search.search import perform_search
+from search.metrics import SEARCH_RESPONSES, export_metrics
+from search.query_log import QUERY_LOG_FLUSH_TIMEOUT, flush_query_log, record_query
+from search.ranking import TopProducts, query_terms, score
+from search.response_cache import distributors_version, get_search_response, set_search_response
+from search.search import SEARCH_MAX_RESULTS, iter_search, normalize_query, perform_search
+from search.tracing import tracer
+
+STREAM_RESULTS = config("STREAM_RESULTS", cast=bool, default=False)
 
 log = logging.getLogger(__name__)
 
@@ -13,12 +30,116 @@ def home_view(request):
 
 
 async def results_view(request):
-    start_time = time.time()
+    """
+    Renders the search results page, traced in the root span of the search.
+    The span continues the trace of the request's traceparent header, if there is one.
+
+    Complete responses are served from the search response cache, with an ETag,
+    and conditional requests for an unchanged response are answered with 304 Not Modified.
+    Partial responses are not cached by the browser either.
+    In streaming mode, a search whose response is not cached is rendered as a page loading its results
+    from results_stream_view, which caches the complete response.
+    """
     query = request.GET.get("query")
-    if query:
-        results = await perform_search(query)
-    else:
-        results = []
-    end_time = time.time()
-    log.debug(f"Search took {end_time - start_time:.2f} seconds")
-    return render(request, "search/results.html", {"results": results, "query": query})
+
+    with tracer.start_as_current_span(
+        "results_view", context=extract(request.headers), kind=SpanKind.SERVER, attributes={"search.query": query or ""}
+    ) as span:
+        start_time = time.time()
+        timed_out = []
+        cached = None
+        if query:
+            cached, version = await get_search_response(query)
+            if cached is None and STREAM_RESULTS:
+                # The page loads the results itself, from results_stream_view
+                response = render(request, "search/results.html", {"query": query, "stream": True})
+                add_never_cache_headers(response)
+                return response
+            if cached is not None:
+                # Served searches still count as popular for the cache warmer
+                record_query(normalize_query(query))
+                await flush_query_log(QUERY_LOG_FLUSH_TIMEOUT)
+                not_modified = get_conditional_response(request, etag=cached.etag)
+                if not_modified is not None:
+                    SEARCH_RESPONSES.labels(outcome="not_modified").inc()
+                    span.set_attribute("search.not_modified", True)
+                    return cache_headers(not_modified, cached.etag)
+                results = cached.results
+            else:
+                results = await perform_search(query, timed_out)
+                await flush_query_log(QUERY_LOG_FLUSH_TIMEOUT)
+                cached = set_search_response(query, version, results, timed_out)
+        else:
+            results = []
+        end_time = time.time()
+        log.debug(f"Search took {end_time - start_time:.2f} seconds")
+        span.set_attributes({"search.results": len(results), "search.timed_out": timed_out})
+        response = render(request, "search/results.html", {"results": results, "query": query, "timed_out": timed_out})
+        if cached is None:
+            add_never_cache_headers(response)
+            return response
+        return cache_headers(response, cached.etag)
+
+
+def cache_headers(response: HttpResponse, etag: str) -> HttpResponse:
+    """
+    Takes a response and its ETag.
+    Returns the response with the ETag, to be revalidated by the browser on every use.
+    """
+    response["ETag"] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+async def results_stream_view(request):
+    """
+    Streams the search results as newline delimited JSON, one Product per line with its ranking score,
+    in the order in which the distributors respond.
+    If distributors missed the search deadline, the last line lists their names under "timed_out".
+    """
+    query = request.GET.get("query")
+    response = StreamingHttpResponse(
+        stream_results(query, extract(request.headers)), content_type="application/x-ndjson"
+    )
+    response["Cache-Control"] = "no-cache"
+    # Disables response buffering in nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def stream_results(query: str | None, parent: Context | None = None):
+    """
+    Takes a search query and the trace context of the request.
+    Yields the lines of the streamed results, traced in the root span of the search.
+
+    Once all results are streamed, the best ranked of them are stored in the search response cache,
+    so that the next request for the query is answered by results_view at once.
+    """
+    with tracer.start_as_current_span(
+        "results_stream_view", context=parent, kind=SpanKind.SERVER, attributes={"search.query": query or ""}
+    ):
+        start_time = time.time()
+        if query:
+            terms = query_terms(query)
+            timed_out = []
+            results = TopProducts(query, size=SEARCH_MAX_RESULTS)
+            version = await distributors_version()
+            async for product in iter_search(query, timed_out):
+                results.push(product)
+                result = asdict(product) | {"score": score(product, terms)}
+                yield json.dumps(result, cls=DjangoJSONEncoder) + "\n"
+            if timed_out:
+                yield json.dumps({"timed_out": timed_out}) + "\n"
+            set_search_response(query, version, results.results(), timed_out)
+            await flush_query_log(QUERY_LOG_FLUSH_TIMEOUT)
+        end_time = time.time()
+        log.debug(f"Search took {end_time - start_time:.2f} seconds")
+
+
+@never_cache
+def metrics_view(request):
+    """
+    Exports the Prometheus metrics of the search stages, labelled by distributor and cache outcome.
+    """
+    content, content_type = export_metrics()
+    return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,55 @@
+"""Background refresh of the cached results of popular queries"""
+
+import asyncio
+import logging
+
+from decouple import config
+
+from search.browser import BrowserPool
+from search.models import DistributorSourceModel
+from search.query_log import top_queries
+from search.result_cache import get_cached_result_ttl
+from search.search import get_active_distributors, update_result
+
+WARMER_TOP_QUERIES = config("WARMER_TOP_QUERIES", cast=int, default=100)
+WARMER_INTERVAL = config("WARMER_INTERVAL", cast=float, default=5 * 60)
+# Results fresh for less than this many seconds are refreshed, more than WARMER_INTERVAL keeps them always fresh
+WARMER_REFRESH_MARGIN = config("WARMER_REFRESH_MARGIN", cast=float, default=2 * WARMER_INTERVAL)
+WARMER_CONCURRENCY = config("WARMER_CONCURRENCY", cast=int, default=8)
+
+log = logging.getLogger(__name__)
+
+
+async def warm_cache(
+    pool: BrowserPool,
+    top: int = WARMER_TOP_QUERIES,
+    margin: float = WARMER_REFRESH_MARGIN,
+    concurrency: int = WARMER_CONCURRENCY,
+) -> int:
+    """
+    Takes a BrowserPool, the number of popular queries to warm, the refresh margin in seconds
+    and the maximum number of simultaneous fetches.
+
+    Fetches the results of the `top` most searched queries from all active distributors,
+    unless they are cached and stay fresh for more than `margin` seconds.
+    Cached negative results are left until they expire. Fetches go through the pool scheduler,
+    so they respect the concurrency and rate limits of the distributors.
+
+    Returns the number of fetched results.
+    """
+    queries = await top_queries(top)
+    distributors = await get_active_distributors()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(distributor: DistributorSourceModel, query: str) -> bool:
+        ttl, products = await asyncio.to_thread(get_cached_result_ttl, distributor, query)
+        if ttl is not None and ttl > 0 and (not products or ttl > margin):
+            return False
+        async with semaphore:
+            # Stale products are kept if the refresh finds nothing
+            await update_result(pool, distributor, query, store_negative=ttl is None)
+        return True
+
+    warmed = await asyncio.gather(*[warm(distributor, query) for query in queries for distributor in distributors])
+    log.debug(f"Warmed {sum(warmed)} results of {len(queries)} queries")
+    return sum(warmed)
@@ -0,0 +1,68 @@
+"""Scraper worker doing the fetch jobs queued by the web workers"""
+
+import asyncio
+import logging
+
+from opentelemetry.propagate import extract
+from opentelemetry.trace import SpanKind
+
+from search.browser import BrowserPool
+from search.jobs import FetchJob, JobQueue
+from search.search import get_active_distributors, refresh_result, update_result
+from search.tracing import tracer
+
+log = logging.getLogger(__name__)
+
+
+async def do_job(pool: BrowserPool, job_queue: JobQueue, job: FetchJob) -> None:
+    """
+    Takes a BrowserPool, a JobQueue and a FetchJob.
+
+    Fetches the result of the job and stores it in the cache, where the waiting searches find it.
+    Jobs of distributors that are no longer active are dropped.
+    The job is traced in a span continuing the trace of the search that queued it.
+    """
+    attributes = {"job.distributor_id": job.distributor_id, "job.refresh": job.refresh}
+    try:
+        with tracer.start_as_current_span(
+            "job", context=extract(job.trace_context), kind=SpanKind.CONSUMER, attributes=attributes
+        ):
+            distributors = {distributor.pk: distributor for distributor in await get_active_distributors()}
+            distributor = distributors.get(job.distributor_id)
+            if distributor is None:
+                log.debug(f"Dropped fetch job of inactive distributor: {job}")
+            elif job.refresh:
+                await refresh_result(pool, distributor, job.query)
+            else:
+                await update_result(pool, distributor, job.query)
+    except Exception as ex:
+        log.debug(f"Error doing fetch job: {job}")
+        log.debug(ex)
+    finally:
+        job_queue.done(job)
+
+
+async def run_worker(pool: BrowserPool, job_queue: JobQueue, concurrency: int, poll_timeout: float = 1) -> None:
+    """
+    Takes a BrowserPool, a JobQueue, the maximum number of jobs done at a time
+    and the seconds each wait for a job lasts.
+
+    Takes jobs from the queue and does them, until cancelled.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    running: set[asyncio.Task] = set()
+    try:
+        while True:
+            await slots.acquire()
+            job = await asyncio.to_thread(job_queue.get, poll_timeout)
+            if job is None:
+                slots.release()
+                continue
+            task = asyncio.create_task(do_job(pool, job_queue, job))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+    finally:
+        # Running jobs are finished, queued ones stay for the other workers
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)